@@ -33,8 +33,11 @@ from flask_migrate import Migrate, init as migrate_init
 
 from backend.extensions import db, socketio
 from backend.utils.audit import log_info
+from backend.utils.sqlite_tuning import install_sqlite_pragmas, report_sqlite_settings
 from backend.models import *
 from backend.mqtt_service import start_mqtt_client, stop_mqtt_client, init_mqtt_system
+from backend.archive_service import start_archiver
+from backend.retention_service import start_retention
 
 # Import seeding function (adds predefined users)
 from backend.routes.auth_routes import seed_default_users
@@ -117,6 +120,11 @@ def create_app():
     db.init_app(app)
     Migrate(app, db)
 
+    # SQLite profile (WAL, synchronous=NORMAL, cache, mmap, busy_timeout) on every pooled connection
+    with app.app_context():
+        install_sqlite_pragmas(db.engine)
+        report_sqlite_settings(db.engine)
+
     socketio.init_app(app, cors_allowed_origins="*", async_mode="eventlet")
 
     # ==========================================================
@@ -145,6 +153,8 @@ def create_app():
     from backend.routes.history_routes import history_bp
     from backend.routes.dashboardbuilder_routes import dashboardbuilder_bp
     from backend.routes.dashboards_routes import dashboards_bp
+    from backend.routes.metrics_routes import metrics_bp
+    import backend.routes.socket_routes  # noqa: F401 — registers Socket.IO room handlers
 
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(device_bp, url_prefix="/api")
@@ -157,6 +167,7 @@ def create_app():
     app.register_blueprint(history_bp, url_prefix="/api/history")
     app.register_blueprint(dashboards_bp, url_prefix="/api/dashboards")
     app.register_blueprint(dashboardbuilder_bp, url_prefix="/api/dashboardbuilder")
+    app.register_blueprint(metrics_bp)
 
 
     # ==========================================================
@@ -245,6 +256,11 @@ if __name__ == "__main__":
 
         init_mqtt_system()
 
+    # Compact closed days of history into archive segments (hourly by default)
+    start_archiver(app)
+    # Age out raw sensors / history / minute rollups in small batches + incremental vacuum
+    start_retention(app)
+
     # Prevent duplicate MQTT threads
     lock_path = os.path.join(tempfile.gettempdir(), "mqtt_init.lock")
     mqtt_lock = InterProcessLock(lock_path)
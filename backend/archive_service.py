@@ -0,0 +1,354 @@
+# =================================================================================================
+# Franc Automation - History Archive (cold tier, columnar NumPy segments)
+# Handles:
+#   • Compacting closed days of `history` into one immutable .npy segment per device per day
+#       <HISTORY_ARCHIVE_DIR>/<device_id>/<YYYY-MM-DD>.npy   (structured array, one column per field)
+#   • Deleting compacted rows so the hot SQLite table keeps only the last HISTORY_HOT_DAYS
+#   • Memory-mapped reads (np.load(mmap_mode="r")) + binary search on the sorted ts column
+#   • Background compaction greenlet + stats
+# Crash-safe: segments are written to a temp file and os.replace()d, and merging dedupes on
+# history.id, so a run interrupted between "write segment" and "delete rows" is simply redone.
+# =================================================================================================
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+import eventlet
+import numpy as np
+from sqlalchemy import func
+
+from backend.extensions import db
+from backend.models import History
+from backend.utils.audit import log_info
+from backend.utils.clock import INDIA_TZ
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+ARCHIVE_ENABLED = os.environ.get("HISTORY_ARCHIVE_ENABLED", "true").lower() in ("1", "true", "yes")
+ARCHIVE_DIR = os.environ.get(
+    "HISTORY_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(__file__), "instance", "archive"),
+)
+HOT_DAYS = int(os.environ.get("HISTORY_HOT_DAYS", 7))  # whole days kept in SQLite
+ARCHIVE_INTERVAL = float(os.environ.get("HISTORY_ARCHIVE_INTERVAL", 3600))  # seconds
+
+
+SEGMENT_DTYPE = np.dtype([
+    ("id", "i8"),
+    ("ts", "datetime64[us]"),   # India wall-clock, like history.timestamp
+    ("temperature", "f8"),      # NaN = NULL
+    ("humidity", "f8"),
+    ("pressure", "f8"),
+])
+
+_lock = threading.RLock()
+_archiver_thread = None
+_flask_app = None
+
+_stats = {
+    "runs": 0,
+    "segments_written": 0,
+    "rows_archived": 0,
+    "errors": 0,
+    "last_run_at": None,
+    "last_run_ms": 0.0,
+}
+
+
+# ==========================================================
+# Segment files
+# ==========================================================
+def segment_path(device_id, day):
+    return os.path.join(ARCHIVE_DIR, str(device_id), f"{day.isoformat()}.npy")
+
+
+def read_segment(device_id, day):
+    """Memory-mapped segment (None when the day was never archived)."""
+    path = segment_path(device_id, day)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def _write_segment(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, data)
+    os.replace(tmp, path)
+
+
+def archived_devices():
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(int(name) for name in os.listdir(ARCHIVE_DIR) if name.isdigit())
+
+
+def iter_segments(since=None, device_id=None):
+    """(device_id, day, mmapped segment) for every archived day on/after `since`."""
+    devices = [device_id] if device_id is not None else archived_devices()
+    for dev in devices:
+        folder = os.path.join(ARCHIVE_DIR, str(dev))
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith(".npy"):
+                continue
+            day = datetime.strptime(name[:-4], "%Y-%m-%d").date()
+            if since is None or day >= since.date():
+                yield dev, day, np.load(os.path.join(folder, name), mmap_mode="r")
+
+
+def _to_segment(rows):
+    data = np.empty(len(rows), dtype=SEGMENT_DTYPE)
+    if not rows:
+        return data
+    ids, stamps, temperature, humidity, pressure = zip(*rows)
+    data["id"] = ids
+    data["ts"] = np.array(stamps, dtype="datetime64[us]")
+    for name, column in (("temperature", temperature), ("humidity", humidity), ("pressure", pressure)):
+        data[name] = np.array(column, dtype="f8")  # None → nan
+    return data
+
+
+# ==========================================================
+# Compaction (hot SQLite → cold segments)
+# ==========================================================
+def hot_cutoff(now=None):
+    """Start of the oldest day that stays in SQLite."""
+    now = now or datetime.now(INDIA_TZ).replace(tzinfo=None)
+    return datetime.combine(now.date() - timedelta(days=HOT_DAYS), datetime.min.time())
+
+
+def compact_day(device_id, day):
+    """Move one device-day from `history` into its segment. Needs an app context."""
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+    filters = (History.device_id == device_id, History.timestamp >= start, History.timestamp < end)
+
+    rows = (
+        db.session.query(History.id, History.timestamp, History.temperature, History.humidity, History.pressure)
+        .filter(*filters)
+        .all()
+    )
+    if not rows:
+        return 0
+
+    data = _to_segment(rows)
+    path = segment_path(device_id, day)
+    existing = read_segment(device_id, day)
+    if existing is not None:
+        # late readings for an already archived day: merge, dedupe on id
+        data = np.concatenate((np.asarray(existing), data))
+        _, keep = np.unique(data["id"], return_index=True)
+        data = data[keep]
+    data = data[np.argsort(data["ts"], kind="stable")]
+    _write_segment(path, data)
+
+    History.query.filter(*filters).delete(synchronize_session=False)
+    db.session.commit()
+    return len(rows)
+
+
+def compact_closed_days(now=None):
+    """Archive every device-day older than the hot window. Needs an app context."""
+    cutoff = hot_cutoff(now)
+    pending = (
+        db.session.query(History.device_id, func.date(History.timestamp))
+        .filter(History.timestamp < cutoff, History.device_id.isnot(None))
+        .distinct()
+        .all()
+    )
+
+    archived = 0
+    for device_id, day in pending:
+        day = datetime.strptime(day, "%Y-%m-%d").date() if isinstance(day, str) else day
+        archived += compact_day(device_id, day)
+        _stats["segments_written"] += 1
+    _stats["rows_archived"] += archived
+    return archived
+
+
+def prune_before(day):
+    """Delete whole segments older than `day` (retention). Returns (segments, bytes)."""
+    removed = reclaimed = 0
+    for dev, seg_day, _segment in list(iter_segments()):
+        if seg_day >= day:
+            continue
+        path = segment_path(dev, seg_day)
+        reclaimed += os.path.getsize(path)
+        os.remove(path)
+        removed += 1
+    return removed, reclaimed
+
+
+# ==========================================================
+# Reads (memory-mapped)
+# ==========================================================
+def _days(start, end):
+    day, last = start.date(), (end - timedelta(microseconds=1)).date()
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+def read_range(device_id, start, end):
+    """Slice of one device's archive in [start, end) — views onto mmapped segments, per day."""
+    lo, hi = np.datetime64(start, "us"), np.datetime64(end, "us")
+    for day in _days(start, end):
+        segment = read_segment(device_id, day)
+        if segment is None or not len(segment):
+            continue
+        ts = segment["ts"]
+        a, b = np.searchsorted(ts, lo, "left"), np.searchsorted(ts, hi, "left")
+        if b > a:
+            yield segment[a:b]
+
+
+def _day_bounds(devices):
+    """(first, last) archived day across `devices`, or None."""
+    days = [
+        name[:-4]
+        for dev in devices
+        if os.path.isdir(os.path.join(ARCHIVE_DIR, str(dev)))
+        for name in os.listdir(os.path.join(ARCHIVE_DIR, str(dev)))
+        if name.endswith(".npy")
+    ]
+    if not days:
+        return None
+    return datetime.strptime(min(days), "%Y-%m-%d").date(), datetime.strptime(max(days), "%Y-%m-%d").date()
+
+
+def iter_rows(start=None, end=None, device_id=None, descending=False):
+    """
+    (id, device_id, temperature, humidity, pressure, timestamp) tuples in timestamp order —
+    same shape as the export query on `history`, so both tiers can be merged.
+    `device_id` is one id or an iterable of ids (None = all); open bounds stop at the
+    first / last archived day. `descending` walks newest first.
+    """
+    if not ARCHIVE_ENABLED:
+        return
+    if device_id is None:
+        devices = archived_devices()
+    elif isinstance(device_id, int):
+        devices = [device_id]
+    else:
+        devices = list(device_id)
+    bounds = _day_bounds(devices)
+    if bounds is None:
+        return
+    first = datetime.combine(bounds[0], datetime.min.time())
+    last = datetime.combine(bounds[1], datetime.min.time()) + timedelta(days=1)
+    start = max(start, first) if start is not None else first
+    end = min(end, last) if end is not None else last
+    if end <= start:
+        return
+
+    days = list(_days(start, end))
+    for day in reversed(days) if descending else days:
+        day_start = max(start, datetime.combine(day, datetime.min.time()))
+        day_end = min(end, datetime.combine(day, datetime.min.time()) + timedelta(days=1))
+
+        parts, owners = [], []
+        for dev in devices:
+            for part in read_range(dev, day_start, day_end):
+                parts.append(part)
+                owners.append(np.full(len(part), dev, dtype="i8"))
+        if not parts:
+            continue
+
+        data = np.concatenate(parts)
+        owner = np.concatenate(owners)
+        order = np.lexsort((data["id"], data["ts"]))  # (timestamp, id), like the hot listings
+        if descending:
+            order = order[::-1]
+        data, owner = data[order], owner[order]
+
+        columns = [
+            data["id"].tolist(),
+            owner.tolist(),
+            *(np.where(np.isnan(data[m]), None, data[m]).tolist() for m in ("temperature", "humidity", "pressure")),
+            data["ts"].tolist(),
+        ]
+        yield from zip(*columns)
+
+
+# ==========================================================
+# Background compaction
+# ==========================================================
+def run_compaction(now=None):
+    if _flask_app is None:
+        return 0
+    started = time.perf_counter()
+    with _lock:
+        with _flask_app.app_context():
+            try:
+                archived = compact_closed_days(now)
+            except Exception as e:
+                db.session.rollback()
+                _stats["errors"] += 1
+                log_info(f"[ARCHIVE] ❌ Compaction failed: {e}")
+                return 0
+    _stats["runs"] += 1
+    _stats["last_run_at"] = datetime.now(INDIA_TZ).isoformat(timespec="seconds")
+    _stats["last_run_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+    if archived:
+        log_info(f"[ARCHIVE] 🧊 Archived {archived} history rows older than {hot_cutoff(now).date()}")
+    return archived
+
+
+def _archiver_loop():
+    log_info(f"[ARCHIVE] 🧊 Archiver started (hot={HOT_DAYS}d, interval={ARCHIVE_INTERVAL}s, dir={ARCHIVE_DIR})")
+    while True:
+        run_compaction()
+        eventlet.sleep(ARCHIVE_INTERVAL)
+
+
+def start_archiver(app):
+    """Start the compaction greenlet once per process (idempotent)."""
+    global _archiver_thread, _flask_app
+    if app is None or not ARCHIVE_ENABLED:
+        return False
+    _flask_app = app
+    if _archiver_thread is None or _archiver_thread.dead:
+        _archiver_thread = eventlet.spawn(_archiver_loop)
+    return True
+
+
+def get_archive_stats():
+    segments = 0
+    size = 0
+    for dev in archived_devices():
+        folder = os.path.join(ARCHIVE_DIR, str(dev))
+        for name in os.listdir(folder):
+            if name.endswith(".npy"):
+                segments += 1
+                size += os.path.getsize(os.path.join(folder, name))
+    return {
+        **_stats,
+        "enabled": ARCHIVE_ENABLED,
+        "hot_days": HOT_DAYS,
+        "interval_s": ARCHIVE_INTERVAL,
+        "segments": segments,
+        "bytes": size,
+        "running": _archiver_thread is not None and not _archiver_thread.dead,
+    }
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "compact_day",
+    "compact_closed_days",
+    "run_compaction",
+    "read_segment",
+    "read_range",
+    "iter_segments",
+    "prune_before",
+    "iter_rows",
+    "start_archiver",
+    "get_archive_stats",
+]
@@ -0,0 +1,330 @@
+# =================================================================================================
+# Franc Automation - Device Registry (authoritative in-process device state)
+# Handles:
+#   • online / offline status, last_seen and latest reading per device
+#   • O(1) counts for status endpoints and emitters (no Device.query.count() per message)
+#   • Latest-value cache per device + global, with a version counter for ETags (plus a
+#     per-process boot nonce, so tags from a previous run or another worker never match)
+#   • Kept in sync with the devices table through mapper events (insert / delete)
+#   • Debounced persistence: a device row is written when its status changes, otherwise
+#     last_seen is flushed at most once per DEVICE_STATE_FLUSH_INTERVAL
+# =================================================================================================
+import os
+import time
+import threading
+
+from sqlalchemy import event, bindparam, func, and_
+
+from backend.extensions import db
+from backend.models import Device, History
+from backend.utils.clock import aware
+
+DEVICE_STATE_FLUSH_INTERVAL = float(os.environ.get("DEVICE_STATE_FLUSH_INTERVAL", 30))  # seconds
+
+
+_states = {}
+_online_ids = set()
+_lock = threading.RLock()
+_loaded = False
+_version = 0
+_latest_device_id = None
+_boot_id = os.urandom(4).hex()  # new on every process start
+
+
+# ==========================================================
+# State
+# ==========================================================
+class DeviceState:
+    __slots__ = (
+        "id", "name", "status", "last_seen", "latest", "latest_ts",
+        "persisted_status", "persisted_last_seen", "persisted_at",
+    )
+
+    def __init__(self, device_id, name, status="offline", last_seen=None):
+        self.id = device_id
+        self.name = name
+        self.status = status
+        self.last_seen = last_seen
+        self.latest = None
+        self.latest_ts = None
+        # what the devices table currently holds (set on load / after each flush)
+        self.persisted_status = status
+        self.persisted_last_seen = last_seen
+        self.persisted_at = time.monotonic()
+
+    def is_due(self, now, interval):
+        if self.status != self.persisted_status:
+            return True
+        return self.last_seen != self.persisted_last_seen and now - self.persisted_at >= interval
+
+    @property
+    def is_connected(self):
+        return self.status == "online"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "is_connected": self.is_connected,
+            "last_seen": self.last_seen.isoformat(timespec="seconds") if self.last_seen else None,
+            "latest": self.latest,
+            "latest_ts": self.latest_ts.isoformat(timespec="seconds") if self.latest_ts else None,
+        }
+
+
+# ==========================================================
+# Loading
+# ==========================================================
+def load_registry():
+    """(Re)load every device from SQLite. Needs an app context."""
+    global _loaded, _version, _latest_device_id
+    rows = db.session.query(Device.id, Device.name, Device.status, Device.last_seen).all()
+
+    # one grouped query seeds the latest-value cache (served by the index on (device_id, timestamp))
+    newest = (
+        db.session.query(History.device_id, func.max(History.timestamp).label("ts"))
+        .group_by(History.device_id)
+        .subquery()
+    )
+    latest_rows = (
+        db.session.query(History.device_id, History.temperature, History.humidity, History.pressure, History.timestamp)
+        .join(newest, and_(History.device_id == newest.c.device_id, History.timestamp == newest.c.ts))
+        .all()
+    )
+
+    with _lock:
+        _states.clear()
+        _online_ids.clear()
+        _latest_device_id = None
+        for dev_id, name, status, last_seen in rows:
+            _states[dev_id] = DeviceState(dev_id, name, status or "offline", last_seen)
+            if status == "online":
+                _online_ids.add(dev_id)
+        for dev_id, temperature, humidity, pressure, ts in latest_rows:
+            state = _states.get(dev_id)
+            if state is None:
+                continue
+            state.latest = {"temperature": temperature, "humidity": humidity, "pressure": pressure}
+            _set_latest_ts(state, aware(ts))  # SQLite hands back naive India wall-clock
+        _version += 1
+        _loaded = True
+
+
+def is_loaded():
+    return _loaded
+
+
+def _ensure_loaded():
+    if not _loaded:
+        load_registry()
+
+
+# ==========================================================
+# Writers (ingest path / connect / disconnect)
+# ==========================================================
+def _state_for(device_id, name=None):
+    state = _states.get(device_id)
+    if state is None:
+        state = _states[device_id] = DeviceState(device_id, name or f"device-{device_id}")
+    elif name:
+        state.name = name
+    return state
+
+
+def _set_latest_ts(state, ts):
+    global _latest_device_id
+    state.latest_ts = ts
+    current = _states.get(_latest_device_id)
+    if current is None or current.latest_ts is None or ts >= current.latest_ts:
+        _latest_device_id = state.id
+
+
+def _apply_status(state, status):
+    global _version
+    if state.status == status:
+        return False
+    _version += 1
+    state.status = status
+    if status == "online":
+        _online_ids.add(state.id)
+    else:
+        _online_ids.discard(state.id)
+    return True
+
+
+def record_reading(device_id, name, reading, ts):
+    """Store the newest reading; returns True when the device just came online."""
+    global _version
+    with _lock:
+        state = _state_for(device_id, name)
+        changed = _apply_status(state, "online")
+        state.last_seen = ts
+        state.latest = reading
+        _set_latest_ts(state, ts)
+        _version += 1
+    return changed
+
+
+def set_status(device_id, status, ts=None, name=None):
+    """Returns True when the status actually changed."""
+    with _lock:
+        state = _state_for(device_id, name)
+        changed = _apply_status(state, status)
+        if ts is not None:
+            state.last_seen = ts
+    return changed
+
+
+# ==========================================================
+# Readers — O(1) / O(devices), no SQL after first load
+# ==========================================================
+def get(device_id):
+    _ensure_loaded()
+    return _states.get(device_id)
+
+
+def online_count():
+    _ensure_loaded()
+    return len(_online_ids)
+
+
+def total_count():
+    _ensure_loaded()
+    return len(_states)
+
+
+def online_states():
+    _ensure_loaded()
+    return [_states[i] for i in list(_online_ids) if i in _states]
+
+
+def all_states():
+    _ensure_loaded()
+    return list(_states.values())
+
+
+def snapshot():
+    _ensure_loaded()
+    return [s.to_dict() for s in list(_states.values())]
+
+
+def latest_state():
+    """Device holding the most recent reading across all devices (global cache)."""
+    _ensure_loaded()
+    state = _states.get(_latest_device_id)
+    return state if state is not None and state.latest is not None else None
+
+
+def version():
+    """Bumped on every reading / status / membership change — cheap ETag source."""
+    _ensure_loaded()
+    return _version
+
+
+def cache_token():
+    """ETag body: boot nonce, version and the newest reading's (device_id, timestamp)."""
+    _ensure_loaded()
+    with _lock:
+        state = _states.get(_latest_device_id)
+        if state is not None and state.latest_ts is not None:
+            newest = f"{state.id}.{int(state.latest_ts.timestamp() * 1000)}"
+        else:
+            newest = "none"
+        return f"{_boot_id}-{_version}-{newest}"
+
+
+# ==========================================================
+# Debounced persistence
+# ==========================================================
+def collect_due(force=False):
+    """
+    Rows to write back: status changed, or last_seen stale for longer than
+    the flush interval. `force=True` returns every dirty device (shutdown).
+    Does not mark anything — call mark_persisted() after the commit.
+    """
+    now = time.monotonic()
+    interval = 0 if force else DEVICE_STATE_FLUSH_INTERVAL
+    with _lock:
+        return [
+            {"_id": s.id, "_status": s.status, "_connected": s.status == "online", "_last_seen": s.last_seen}
+            for s in _states.values()
+            if s.is_due(now, interval)
+        ]
+
+
+def write_due(session, rows):
+    """Execute the device UPDATE for collected rows inside the caller's transaction."""
+    if not rows:
+        return
+    devices = Device.__table__
+    session.execute(
+        devices.update()
+        .where(devices.c.id == bindparam("_id"))
+        .values(
+            status=bindparam("_status"),
+            is_connected=bindparam("_connected"),
+            last_seen=bindparam("_last_seen"),
+            # heartbeat writes must not bump updated_at (that tracks config edits)
+            updated_at=devices.c.updated_at,
+        ),
+        rows,
+    )
+
+
+def mark_persisted(rows):
+    now = time.monotonic()
+    with _lock:
+        for r in rows:
+            state = _states.get(r["_id"])
+            if state is None:
+                continue
+            state.persisted_status = r["_status"]
+            state.persisted_last_seen = r["_last_seen"]
+            state.persisted_at = now
+
+
+def persist_due(force=False):
+    """Collect, write and commit in one go. Needs an app context."""
+    rows = collect_due(force)
+    if not rows:
+        return 0
+    try:
+        write_due(db.session, rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    mark_persisted(rows)
+    return len(rows)
+
+
+def pending_count():
+    now = time.monotonic()
+    with _lock:
+        return sum(1 for s in _states.values() if s.is_due(now, 0))
+
+
+# ==========================================================
+# Keep in sync with CRUD on the devices table
+# ==========================================================
+@event.listens_for(Device, "after_insert")
+def _on_device_insert(mapper, connection, target):
+    global _version
+    with _lock:
+        _version += 1
+        state = _states[target.id] = DeviceState(target.id, target.name, "offline", target.last_seen)
+        _apply_status(state, target.status or "offline")
+        state.persisted_status = state.status
+
+
+@event.listens_for(Device, "after_delete")
+def _on_device_delete(mapper, connection, target):
+    global _version, _latest_device_id
+    with _lock:
+        _version += 1
+        if _latest_device_id == target.id:
+            rest = [s for s in _states.values() if s.id != target.id and s.latest_ts is not None]
+            _latest_device_id = max(rest, key=lambda s: s.latest_ts).id if rest else None
+        _states.pop(target.id, None)
+        _online_ids.discard(target.id)
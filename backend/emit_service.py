@@ -0,0 +1,304 @@
+# =================================================================================================
+# Franc Automation - Emit Service (Coalesced Socket.IO Fan-out)
+# Handles:
+#   • Latest-state-per-device buffer filled by the ingest path
+#   • One emitter greenlet sending ONE compact `telemetry_batch` frame per tick
+#   • Subscription rooms: device:<id>, dashboard:<id> (its widgets' device set), global
+#     — frames are only built for rooms that currently have members
+#   • Legacy per-device events (sensor_data / device_data_update / dashboard_update /
+#     device_status / mqtt_status) behind SOCKETIO_LEGACY_EVENTS, also coalesced per tick,
+#     sent to the `legacy` room every socket joins until it subscribes to something
+# =================================================================================================
+import os
+import time
+import threading
+
+import eventlet
+from sqlalchemy import event, inspect
+
+from backend.extensions import socketio, db
+from backend.models import DashboardWidget
+from backend.utils.audit import log_info
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+EMIT_TICK = float(os.environ.get("SOCKETIO_EMIT_TICK", 0.25))  # seconds
+LEGACY_EVENTS = os.environ.get("SOCKETIO_LEGACY_EVENTS", "true").lower() in ("1", "true", "yes")
+
+BATCH_EVENT = "telemetry_batch"
+BATCH_FIELDS = ("device_id", "device_name", "temperature", "humidity", "pressure", "status", "timestamp")
+
+GLOBAL_ROOM = "global"
+LEGACY_ROOM = "legacy"
+
+_pending = {}
+_pending_status = None
+_pending_lock = threading.Lock()
+
+_room_members = {}
+_sid_rooms = {}
+_dashboard_devices = {}
+_rooms_lock = threading.RLock()
+
+_emitter_thread = None
+_flask_app = None
+
+_stats = {
+    "readings_in": 0,
+    "status_in": 0,
+    "ticks": 0,
+    "frames_out": 0,
+    "legacy_frames_out": 0,
+    "rooms_skipped": 0,
+    "last_tick_ms": 0.0,
+    "max_tick_ms": 0.0,
+}
+
+
+# ==========================================================
+# Rooms
+# ==========================================================
+def device_room(device_id):
+    return f"device:{device_id}"
+
+
+def dashboard_room(dashboard_id):
+    return f"dashboard:{dashboard_id}"
+
+
+def _load_dashboard_devices(dashboard_id):
+    rows = (
+        db.session.query(DashboardWidget.device_id)
+        .filter(DashboardWidget.dashboard_id == dashboard_id, DashboardWidget.device_id.isnot(None))
+        .distinct()
+        .all()
+    )
+    return frozenset(r[0] for r in rows)
+
+
+def resolve_room(kind, target_id=None):
+    """Map a client subscription request to a room name (None if invalid)."""
+    if kind == "global":
+        return GLOBAL_ROOM
+    try:
+        target_id = int(target_id)
+    except (TypeError, ValueError):
+        return None
+    if kind == "device":
+        return device_room(target_id)
+    if kind == "dashboard":
+        with _rooms_lock:
+            if target_id not in _dashboard_devices:
+                _cache_dashboard(target_id, _load_dashboard_devices(target_id))
+        return dashboard_room(target_id)
+    return None
+
+
+def track_join(sid, room):
+    with _rooms_lock:
+        _room_members.setdefault(room, set()).add(sid)
+        _sid_rooms.setdefault(sid, set()).add(room)
+
+
+def track_leave(sid, room):
+    with _rooms_lock:
+        members = _room_members.get(room)
+        if members:
+            members.discard(sid)
+            if not members:
+                del _room_members[room]
+        rooms = _sid_rooms.get(sid)
+        if rooms:
+            rooms.discard(room)
+
+
+def track_disconnect(sid):
+    with _rooms_lock:
+        for room in list(_sid_rooms.pop(sid, ())):
+            members = _room_members.get(room)
+            if members:
+                members.discard(sid)
+                if not members:
+                    del _room_members[room]
+
+
+def _cache_dashboard(dashboard_id, devices):
+    """Only non-empty sets are cached: a dashboard without widgets yet is looked up again."""
+    if devices:
+        _dashboard_devices[dashboard_id] = devices
+
+
+def forget_dashboard(dashboard_id):
+    """Drop the cached device set (dashboard deleted / widgets changed)."""
+    with _rooms_lock:
+        _dashboard_devices.pop(dashboard_id, None)
+
+
+@event.listens_for(DashboardWidget, "after_insert")
+@event.listens_for(DashboardWidget, "after_update")
+@event.listens_for(DashboardWidget, "after_delete")
+def _on_widget_change(mapper, connection, target):
+    forget_dashboard(target.dashboard_id)
+    for old in inspect(target).attrs.dashboard_id.history.deleted:  # widget moved to another dashboard
+        forget_dashboard(old)
+
+
+def _subscribed_dashboards():
+    """(dashboard_id, device set) for dashboard rooms with members; uncached ones are loaded."""
+    with _rooms_lock:
+        wanted = [int(room.split(":", 1)[1]) for room in _room_members if room.startswith("dashboard:")]
+        missing = [dash_id for dash_id in wanted if dash_id not in _dashboard_devices]
+    loaded = {dash_id: _load_dashboard_devices(dash_id) for dash_id in missing}  # needs an app context
+    with _rooms_lock:
+        for dash_id, devices in loaded.items():
+            _cache_dashboard(dash_id, devices)
+        return [(dash_id, _dashboard_devices[dash_id]) for dash_id in wanted if dash_id in _dashboard_devices]
+
+
+def has_members(room):
+    return bool(_room_members.get(room))
+
+
+# ==========================================================
+# Producer side — O(1), never touches the socket
+# ==========================================================
+def publish_reading(payload):
+    """Keep only the newest payload per device until the next tick."""
+    with _pending_lock:
+        _pending[payload.get("device_id")] = payload
+    _stats["readings_in"] += 1
+
+
+def publish_status(payload):
+    """Keep only the newest global mqtt_status until the next tick."""
+    global _pending_status
+    with _pending_lock:
+        _pending_status = payload
+    _stats["status_in"] += 1
+
+
+# ==========================================================
+# Emitter side
+# ==========================================================
+def _take_pending():
+    global _pending, _pending_status
+    with _pending_lock:
+        readings, status = _pending, _pending_status
+        _pending, _pending_status = {}, None
+    return readings, status
+
+
+def _frame(rows, status=None):
+    return {"fields": BATCH_FIELDS, "rows": rows, "mqtt_status": status}
+
+
+def _emit_tick():
+    readings, status = _take_pending()
+    if not readings and status is None:
+        return
+
+    rows = {dev_id: [p.get(f) for f in BATCH_FIELDS] for dev_id, p in readings.items()}
+
+    if has_members(GLOBAL_ROOM):
+        _send(_frame(list(rows.values()), status), GLOBAL_ROOM)
+    else:
+        _stats["rooms_skipped"] += 1
+
+    for dev_id, row in rows.items():
+        room = device_room(dev_id)
+        if has_members(room):
+            _send(_frame([row]), room)
+
+    for dash_id, devices in _subscribed_dashboards():
+        dash_rows = [row for dev_id, row in rows.items() if dev_id in devices]
+        if dash_rows:
+            _send(_frame(dash_rows), dashboard_room(dash_id))
+
+    if LEGACY_EVENTS and has_members(LEGACY_ROOM):
+        _emit_legacy(readings, status)
+
+
+def _send(frame, room):
+    socketio.emit(BATCH_EVENT, frame, to=room, namespace="/")
+    _stats["frames_out"] += 1
+
+
+def _emit_legacy(readings, status):
+    for p in readings.values():
+        socketio.emit("sensor_data", p, to=LEGACY_ROOM, namespace="/")
+        socketio.emit("device_data_update", p, to=LEGACY_ROOM, namespace="/")
+        socketio.emit("dashboard_update", p, to=LEGACY_ROOM, namespace="/")
+        socketio.emit(
+            "device_status",
+            {"device_id": p.get("device_id"), "status": p.get("status"), "last_seen": p.get("timestamp")},
+            to=LEGACY_ROOM,
+            namespace="/",
+        )
+        _stats["legacy_frames_out"] += 4
+
+    if status is not None:
+        socketio.emit("mqtt_status", status, to=LEGACY_ROOM, namespace="/")
+        _stats["legacy_frames_out"] += 1
+
+
+def _emitter_loop():
+    log_info(f"[EMIT] 📡 Coalescer started (tick={EMIT_TICK}s, legacy={LEGACY_EVENTS})")
+    while True:
+        eventlet.sleep(EMIT_TICK)
+        _stats["ticks"] += 1
+        started = time.perf_counter()
+        try:
+            with _flask_app.app_context():
+                _emit_tick()
+        except Exception as e:
+            log_info(f"[EMIT] ❌ Tick failed: {e}")
+        # fan-out cost per tick: building frames + socketio.emit to every subscribed room
+        elapsed = (time.perf_counter() - started) * 1000.0
+        _stats["last_tick_ms"] = round(elapsed, 3)
+        _stats["max_tick_ms"] = round(max(_stats["max_tick_ms"], elapsed), 3)
+
+
+# ==========================================================
+# Lifecycle
+# ==========================================================
+def start_emitter(app):
+    """Start the emitter greenlet once per process (idempotent)."""
+    global _emitter_thread, _flask_app
+    if app is None:
+        return False
+    _flask_app = app
+    if _emitter_thread is None or _emitter_thread.dead:
+        _emitter_thread = eventlet.spawn(_emitter_loop)
+    return True
+
+
+def get_emit_stats():
+    return {
+        **_stats,
+        "pending_devices": len(_pending),
+        "rooms": {room: len(members) for room, members in list(_room_members.items())},
+        "tick_s": EMIT_TICK,
+        "legacy_events": LEGACY_EVENTS,
+        "running": _emitter_thread is not None and not _emitter_thread.dead,
+    }
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "publish_reading",
+    "publish_status",
+    "start_emitter",
+    "get_emit_stats",
+    "resolve_room",
+    "track_join",
+    "track_leave",
+    "track_disconnect",
+    "forget_dashboard",
+    "device_room",
+    "dashboard_room",
+    "GLOBAL_ROOM",
+    "LEGACY_ROOM",
+]
@@ -0,0 +1,318 @@
+# =================================================================================================
+# Franc Automation - Ingest Journal (append-only, memory-mapped spill in front of SQLite)
+# Handles:
+#   • Fixed-size segment files <INGEST_JOURNAL_DIR>/<seq>.seg, preallocated and mmap()ed;
+#     appends are a memcpy into the map — no fsync, no SQL on the producer path
+#   • Records: <u32 length><u32 crc32><payload>; a zero length (or bad crc after a crash)
+#     marks the end of the written part of a segment
+#   • Read cursor + committed checkpoint (<dir>/checkpoint, replaced atomically) — the
+#     writer commits the position only after its DB transaction, so a restart resumes there
+#   • Fully replayed segments are deleted; INGEST_JOURNAL_MAX_BYTES caps the disk used
+#   • Exclusive lock on <dir>/lock for the journal's lifetime — a second process opening the
+#     same directory gets JournalLockedError instead of interleaving appends and replays
+# =================================================================================================
+import os
+import mmap
+import struct
+import zlib
+import threading
+
+try:
+    import msvcrt  # Windows
+except ImportError:
+    import fcntl  # Unix
+
+MAGIC = b"FAJRNL1\0"
+_HEADER = struct.Struct("<II")  # length, crc32
+
+
+def _segment_name(seq):
+    return f"{seq:08d}.seg"
+
+
+class JournalLockedError(RuntimeError):
+    """The journal directory is already open in another process (or another Journal)."""
+
+
+class Journal:
+    """
+    One writer process per directory. append() may be called from any greenlet;
+    read() / commit() / rewind() belong to the single replayer (the ingest writer).
+    """
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = max(int(segment_bytes), 4096)
+        self.max_bytes = max(int(max_bytes), self.segment_bytes)
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = self._acquire_dir_lock()
+
+        self._write_seq = 0
+        self._write_pos = 0
+        self._write_map = None
+        self._write_file = None
+
+        self._read_maps = {}
+        self.appended = 0
+        self.rejected = 0
+        self.pending = 0
+
+        try:
+            self._committed = self._load_checkpoint()
+            self._read = self._committed
+            self._open_for_append()
+            self.pending = self._count_from(self._committed)
+        except Exception:
+            self._release_dir_lock()
+            raise
+        self.recovered = self.pending  # records left over from the previous run
+
+    # ------------------------------------------------------
+    # Files
+    # ------------------------------------------------------
+    def _path(self, seq):
+        return os.path.join(self.directory, _segment_name(seq))
+
+    def _segments(self):
+        return sorted(int(f[:-4]) for f in os.listdir(self.directory) if f.endswith(".seg") and f[:-4].isdigit())
+
+    def _acquire_dir_lock(self):
+        """Hold <dir>/lock exclusively until close(); never blocks."""
+        path = os.path.join(self.directory, "lock")
+        f = open(path, "a+")
+        try:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            raise JournalLockedError(f"{self.directory} is already in use by another ingest journal")
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))  # for whoever has to find the owner
+        f.flush()
+        return f
+
+    def _release_dir_lock(self):
+        if self._lock_file is None:
+            return
+        try:
+            if os.name == "nt":
+                self._lock_file.seek(0)
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        except OSError:
+            pass
+        self._lock_file.close()  # the file stays: unlinking a lock file races the next opener
+        self._lock_file = None
+
+    def _load_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, "checkpoint"), "r", encoding="utf-8") as f:
+                seq, offset = f.read().split()
+                return int(seq), int(offset)
+        except (OSError, ValueError):
+            segments = self._segments()
+            return (segments[0] if segments else 1), len(MAGIC)
+
+    def _save_checkpoint(self, position):
+        path = os.path.join(self.directory, "checkpoint")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"{position[0]} {position[1]}")
+        os.replace(tmp, path)
+
+    def _map(self, seq, create=False):
+        path = self._path(seq)
+        if create:
+            with open(path, "wb") as f:
+                f.truncate(self.segment_bytes)
+        f = open(path, "r+b")
+        try:
+            mm = mmap.mmap(f.fileno(), 0)
+        except Exception:
+            f.close()
+            raise
+        if create:
+            mm[:len(MAGIC)] = MAGIC
+        elif mm[:len(MAGIC)] != MAGIC:
+            mm.close()
+            f.close()
+            raise ValueError(f"{path} is not an ingest journal segment")
+        return f, mm
+
+    @staticmethod
+    def _next_record(mm, pos):
+        """(payload, next position) or (None, pos) at the end of the written part."""
+        if pos + _HEADER.size > len(mm):
+            return None, pos
+        length, crc = _HEADER.unpack_from(mm, pos)
+        end = pos + _HEADER.size + length
+        if length == 0 or end > len(mm):
+            return None, pos
+        payload = mm[pos + _HEADER.size:end]
+        if zlib.crc32(payload) != crc:
+            return None, pos  # torn write from a crash: everything after it is unwritten
+        return payload, end
+
+    def _open_for_append(self):
+        segments = self._segments()
+        if not segments:
+            self._write_seq = self._committed[0]
+            self._write_file, self._write_map = self._map(self._write_seq, create=True)
+            self._write_pos = len(MAGIC)
+            return
+        self._write_seq = segments[-1]
+        self._write_file, self._write_map = self._map(self._write_seq)
+        pos = len(MAGIC)
+        while True:
+            payload, nxt = self._next_record(self._write_map, pos)
+            if payload is None:
+                break
+            pos = nxt
+        self._write_pos = pos
+        # zero whatever a torn write left behind so the end marker is unambiguous
+        if pos + _HEADER.size <= len(self._write_map):
+            self._write_map[pos:pos + _HEADER.size] = b"\0" * _HEADER.size
+
+    def _roll(self):
+        self._write_map.flush()
+        self._write_seq += 1
+        self._write_file, self._write_map = self._map(self._write_seq, create=True)
+        self._write_pos = len(MAGIC)
+
+    def _reader_map(self, seq):
+        if seq == self._write_seq:
+            return self._write_map
+        mm = self._read_maps.get(seq)
+        if mm is None:
+            try:
+                f, mm = self._map(seq)
+            except FileNotFoundError:
+                return None
+            f.close()  # the map keeps its own reference to the file
+            self._read_maps[seq] = mm
+        return mm
+
+    # ------------------------------------------------------
+    # Producer
+    # ------------------------------------------------------
+    def append(self, payload):
+        """Append one record. False (and counted) when the journal is at INGEST_JOURNAL_MAX_BYTES."""
+        size = _HEADER.size + len(payload)
+        with self._lock:
+            if size > self.segment_bytes - len(MAGIC) - _HEADER.size:
+                self.rejected += 1
+                return False
+            if self._write_pos + size + _HEADER.size > self.segment_bytes:
+                live = self._write_seq - self._committed[0] + 1
+                if (live + 1) * self.segment_bytes > self.max_bytes:
+                    self.rejected += 1
+                    return False
+                self._roll()
+            pos = self._write_pos
+            mm = self._write_map
+            mm[pos + _HEADER.size:pos + size] = payload
+            _HEADER.pack_into(mm, pos, len(payload), zlib.crc32(payload))
+            self._write_pos = pos + size
+            self.appended += 1
+            self.pending += 1
+        return True
+
+    # ------------------------------------------------------
+    # Replayer
+    # ------------------------------------------------------
+    def read(self, limit):
+        """Up to `limit` records after the read cursor → ([payload, ...], position)."""
+        out = []
+        with self._lock:
+            seq, pos = self._read
+            while len(out) < limit:
+                mm = self._reader_map(seq)
+                if mm is None:
+                    if seq >= self._write_seq:
+                        break
+                    seq, pos = seq + 1, len(MAGIC)
+                    continue
+                payload, nxt = self._next_record(mm, pos)
+                if payload is None:
+                    if seq >= self._write_seq:
+                        break
+                    seq, pos = seq + 1, len(MAGIC)  # rolled segment: continue in the next one
+                    continue
+                out.append(payload)
+                pos = nxt
+            self._read = (seq, pos)
+        return out, (seq, pos)
+
+    def commit(self, position, count):
+        """Records up to `position` are in the database: checkpoint and drop replayed segments."""
+        with self._lock:
+            self._committed = position
+            self.pending = max(self.pending - count, 0)
+            self._save_checkpoint(position)
+            for seq in self._segments():
+                if seq >= position[0]:
+                    break
+                mm = self._read_maps.pop(seq, None)
+                if mm is not None:
+                    mm.close()
+                os.remove(self._path(seq))
+
+    def rewind(self):
+        """Forget uncommitted reads (the DB write failed); they are read again next time."""
+        with self._lock:
+            self._read = self._committed
+
+    def _count_from(self, position):
+        count = 0
+        with self._lock:
+            saved = self._read
+            self._read = position
+            while True:
+                batch, _ = self.read(10000)
+                if not batch:
+                    break
+                count += len(batch)
+            self._read = saved
+        return count
+
+    def sync(self):
+        """msync the active segment (power-loss durability; process crashes need no sync)."""
+        with self._lock:
+            if self._write_map is not None:
+                self._write_map.flush()
+
+    def close(self):
+        with self._lock:
+            for mm in self._read_maps.values():
+                mm.close()
+            self._read_maps.clear()
+            if self._write_map is not None:
+                self._write_map.flush()
+                self._write_map.close()
+                self._write_file.close()
+                self._write_map = None
+            self._release_dir_lock()
+
+    def stats(self):
+        return {
+            "pending": self.pending,
+            "recovered": self.recovered,
+            "appended": self.appended,
+            "rejected": self.rejected,
+            "segments": self._write_seq - self._committed[0] + 1,
+            "segment_bytes": self.segment_bytes,
+            "max_bytes": self.max_bytes,
+            "directory": self.directory,
+        }
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = ["Journal", "JournalLockedError"]
@@ -0,0 +1,462 @@
+# =================================================================================================
+# Franc Automation - Ingest Service (Write-Behind Batch Writer)
+# Handles:
+#   • Append-only memory-mapped journal (ingest_journal) between MQTT / simulator and SQLite:
+#     readings survive DB stalls (VACUUM, exports, backups) and restarts; replays skip
+#     (device_id, timestamp) keys already stored. In-memory queue for in-memory databases
+#     or INGEST_JOURNAL=false
+#   • Dedicated writer greenlet flushing by batch size OR time limit
+#   • One transaction + bulk insert per batch: one canonical `history` row per reading,
+#     plus narrow `readings` rows for channels beyond the core three
+#   • Debounced device heartbeat rows (device_registry.collect_due) in the same transaction
+#   • Minute / hour / day rollups (rollup_service.write_rollups) in the same transaction
+#   • Queue depth / batch size / flush latency stats
+# =================================================================================================
+import os
+import time
+import atexit
+import threading
+from datetime import datetime
+
+import eventlet
+from eventlet.queue import LightQueue, Full, Empty
+
+from backend.extensions import db
+from backend.models import History, Reading, ROLLUP_METRICS
+from backend.utils.audit import log_info
+from backend.utils.clock import wall_clock
+from backend.ingest_journal import Journal, JournalLockedError
+from backend import device_registry, payload_parser, rollup_service, schema_registry
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", 10000))
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 500))
+INGEST_FLUSH_INTERVAL = float(os.environ.get("INGEST_FLUSH_INTERVAL", 0.5))  # seconds
+
+INGEST_JOURNAL = os.environ.get("INGEST_JOURNAL", "true").lower() in ("1", "true", "yes")
+INGEST_JOURNAL_DIR = os.environ.get(
+    "INGEST_JOURNAL_DIR",
+    os.path.join(os.path.dirname(__file__), "instance", "journal"),
+)
+INGEST_JOURNAL_SEGMENT_MB = float(os.environ.get("INGEST_JOURNAL_SEGMENT_MB", 16))
+INGEST_JOURNAL_MAX_MB = float(os.environ.get("INGEST_JOURNAL_MAX_MB", 1024))
+INGEST_JOURNAL_SYNC_INTERVAL = float(os.environ.get("INGEST_JOURNAL_SYNC_INTERVAL", 1.0))  # seconds, msync
+
+_IN_MEMORY_URIS = ("sqlite://", "sqlite:///:memory:")
+
+_queue = LightQueue(INGEST_QUEUE_SIZE)
+_writer_thread = None
+_writer_stop = threading.Event()
+_write_lock = threading.RLock()
+_flask_app = None
+_retry_batch = []
+
+_journal = None
+_journal_app = None
+_journal_ready = threading.Event()
+_last_sync = 0.0
+
+_stats = {
+    "enqueued": 0,
+    "dropped": 0,
+    "batches": 0,
+    "rows_written": 0,
+    "errors": 0,
+    "replayed_duplicates": 0,
+    "last_batch_size": 0,
+    "max_batch_size": 0,
+    "last_flush_ms": 0.0,
+    "avg_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+}
+
+
+# ==========================================================
+# Producer side
+# ==========================================================
+def enqueue_reading(device_id, temperature, humidity, pressure, timestamp, metrics=None):
+    """
+    Queue one reading for the writer greenlet.
+    Core values go to `history` (None / missing stays NULL instead of becoming 0.0);
+    any other channel in `metrics` ({channel: value}) goes to the narrow readings store.
+    Never blocks the caller (pipeline worker / simulator): with the journal on, this
+    is a memcpy into the mapped segment, whatever state SQLite is in. Returns False
+    and counts a drop when the queue (or INGEST_JOURNAL_MAX_MB) is full.
+    """
+    reading = {
+        "device_id": device_id,
+        "temperature": temperature,
+        "humidity": humidity,
+        "pressure": pressure,
+        "timestamp": timestamp,
+        "metrics": metrics,
+    }
+    journal = _active_journal()
+    if journal is not None:
+        if not journal.append(_encode(reading)):
+            _stats["dropped"] += 1
+            return False
+        _stats["enqueued"] += 1
+        if journal.pending >= INGEST_BATCH_SIZE:
+            _journal_ready.set()
+        return True
+
+    try:
+        _queue.put_nowait(reading)
+    except Full:
+        _stats["dropped"] += 1
+        return False
+
+    _stats["enqueued"] += 1
+    return True
+
+
+# ==========================================================
+# Journal
+# ==========================================================
+def _active_journal():
+    """The on-disk journal once a file-backed app is bound (None → in-memory queue)."""
+    global _journal, _journal_app
+    app = _flask_app
+    if _journal is not None or app is None or app is _journal_app:
+        return _journal
+    _journal_app = app
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI", "")
+    if not INGEST_JOURNAL or uri in _IN_MEMORY_URIS:
+        return None  # nothing durable to protect
+    try:
+        _journal = Journal(
+            INGEST_JOURNAL_DIR,
+            segment_bytes=INGEST_JOURNAL_SEGMENT_MB * 1024 * 1024,
+            max_bytes=INGEST_JOURNAL_MAX_MB * 1024 * 1024,
+        )
+    except JournalLockedError:
+        # two processes replaying one journal would store readings twice — refuse to start
+        log_info(f"[INGEST] ❌ Journal {INGEST_JOURNAL_DIR} is held by another process")
+        _journal_app = None  # no quiet fallback on the next call either
+        raise
+    except Exception as e:
+        log_info(f"[INGEST] ⚠️ Journal unavailable ({e}) → in-memory queue")
+        return None
+    if _journal.recovered:
+        log_info(f"[INGEST] ♻️ Replaying {_journal.recovered} journaled readings from the last run")
+        _journal_ready.set()
+    return _journal
+
+
+def _encode(reading):
+    ts = wall_clock(reading["timestamp"])  # stored as India wall-clock anyway
+    return payload_parser.dumps([
+        reading["device_id"], ts.isoformat(), reading["temperature"], reading["humidity"],
+        reading["pressure"], reading["metrics"],
+    ]).encode()
+
+
+def _decode(raw):
+    device_id, ts, temperature, humidity, pressure, metrics = payload_parser.loads(raw)
+    return {
+        "device_id": device_id,
+        "temperature": temperature,
+        "humidity": humidity,
+        "pressure": pressure,
+        "timestamp": datetime.fromisoformat(ts),
+        "metrics": metrics,
+    }
+
+
+def _drop_stored(batch):
+    """
+    Journal replays may repeat readings whose batch committed just before a crash
+    (the checkpoint is written after the commit): skip (device_id, timestamp) keys
+    already in history / readings, and repeats inside the batch.
+    """
+    devices = {r["device_id"] for r in batch}
+    lo = min(r["timestamp"] for r in batch)
+    hi = max(r["timestamp"] for r in batch)
+    stored = set()
+    for model in (History, Reading):
+        stored.update(
+            (device_id, ts)
+            for device_id, ts in db.session.query(model.device_id, model.timestamp)
+            .filter(model.device_id.in_(devices), model.timestamp >= lo, model.timestamp <= hi)
+            .distinct()
+        )
+    fresh = []
+    for r in batch:
+        key = (r["device_id"], r["timestamp"])
+        if key in stored:
+            _stats["replayed_duplicates"] += 1
+            continue
+        stored.add(key)
+        fresh.append(r)
+    return fresh
+
+
+def _flush_journal(journal):
+    """Replay one batch from the journal; checkpoint only after the DB commit. → rows (-1 on failure)."""
+    with _write_lock:
+        raws, position = journal.read(INGEST_BATCH_SIZE)
+        if not raws:
+            return 0
+        batch = []
+        for raw in raws:
+            try:
+                batch.append(_decode(raw))
+            except (ValueError, TypeError):
+                _stats["errors"] += 1  # unreadable record — skipped, never retried forever
+        if batch and not _flush(batch, replay=True):
+            journal.rewind()
+            return -1
+        journal.commit(position, len(raws))
+        return len(raws)
+
+
+def _sync_journal(journal, force=False):
+    global _last_sync
+    if force or time.monotonic() - _last_sync >= INGEST_JOURNAL_SYNC_INTERVAL:
+        journal.sync()
+        _last_sync = time.monotonic()
+
+
+# ==========================================================
+# Writer side
+# ==========================================================
+def _collect_batch():
+    """Block for the first reading, then gather more until size or time limit is hit."""
+    batch = list(_retry_batch)
+    _retry_batch.clear()
+
+    if not batch:
+        try:
+            batch.append(_queue.get(timeout=INGEST_FLUSH_INTERVAL))
+        except Empty:
+            return batch
+
+    deadline = time.monotonic() + INGEST_FLUSH_INTERVAL
+    while len(batch) < INGEST_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except Empty:
+            break
+    return batch
+
+
+def _drain_nowait(limit=None):
+    batch = list(_retry_batch)
+    _retry_batch.clear()
+    while limit is None or len(batch) < limit:
+        try:
+            batch.append(_queue.get_nowait())
+        except Empty:
+            break
+    return batch
+
+
+def _write_batch(batch, replay=False):
+    """Persist a batch in ONE transaction using executemany bulk inserts."""
+    if replay:
+        batch = _drop_stored(batch)
+    if not batch:
+        return
+
+    history_rows = [
+        {
+            "device_id": r["device_id"],
+            "temperature": r["temperature"],
+            "humidity": r["humidity"],
+            "pressure": r["pressure"],
+            "timestamp": r["timestamp"],
+        }
+        for r in batch
+        # a message carrying only extra channels has nothing for history
+        if r["temperature"] is not None or r["humidity"] is not None or r["pressure"] is not None
+    ]
+
+    # narrow store: one row per extra channel actually sent; new channels are registered first
+    extras = [
+        (r, {name: value for name, value in r["metrics"].items() if name not in ROLLUP_METRICS})
+        for r in batch if r.get("metrics")
+    ]
+    pairs = {(r["device_id"], name) for r, values in extras for name in values}
+    metric_ids = schema_registry.metric_ids(db.session, pairs) if pairs else {}
+    reading_rows = [
+        {"device_id": r["device_id"], "metric_id": metric_ids[(r["device_id"], name)],
+         "timestamp": r["timestamp"], "value": value}
+        for r, values in extras
+        for name, value in values.items()
+        if value is not None and (r["device_id"], name) in metric_ids
+    ]
+
+    # only devices whose status changed or whose heartbeat is stale get a row
+    device_rows = device_registry.collect_due()
+
+    started = time.perf_counter()
+    try:
+        if history_rows:
+            db.session.execute(History.__table__.insert(), history_rows)
+        if reading_rows:
+            db.session.execute(Reading.__table__.insert(), reading_rows)
+        rollup_service.write_rollups(db.session, history_rows)
+        device_registry.write_due(db.session, device_rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    device_registry.mark_persisted(device_rows)
+    _record_flush(len(batch), (time.perf_counter() - started) * 1000.0)
+
+
+def _record_flush(size, elapsed_ms):
+    _stats["batches"] += 1
+    _stats["rows_written"] += size
+    _stats["last_batch_size"] = size
+    _stats["max_batch_size"] = max(_stats["max_batch_size"], size)
+    _stats["last_flush_ms"] = round(elapsed_ms, 3)
+    _stats["max_flush_ms"] = round(max(_stats["max_flush_ms"], elapsed_ms), 3)
+    # exponential moving average keeps the number stable under bursty load
+    avg = _stats["avg_flush_ms"]
+    _stats["avg_flush_ms"] = round(elapsed_ms if avg == 0 else avg * 0.9 + elapsed_ms * 0.1, 3)
+
+
+def _flush(batch, replay=False):
+    """Write one batch. On failure an in-memory batch is kept for retry; a journal batch is re-read."""
+    with _write_lock:
+        with _flask_app.app_context():
+            try:
+                _write_batch(batch, replay)
+            except Exception as e:
+                _stats["errors"] += 1
+                if not replay:
+                    _retry_batch[:0] = batch
+                log_info(f"[INGEST] ❌ Batch of {len(batch)} failed, will retry: {e}")
+                return False
+    return True
+
+
+def _persist_device_states(force=False):
+    """Write due heartbeat rows when no reading batch carried them."""
+    with _write_lock:
+        with _flask_app.app_context():
+            try:
+                return device_registry.persist_due(force)
+            except Exception as e:
+                _stats["errors"] += 1
+                log_info(f"[INGEST] ❌ Device state flush failed: {e}")
+                return 0
+
+
+def _writer_loop():
+    log_info(
+        f"[INGEST] ✍️ Writer started (batch={INGEST_BATCH_SIZE}, "
+        f"interval={INGEST_FLUSH_INTERVAL}s, queue={INGEST_QUEUE_SIZE})"
+    )
+    while not _writer_stop.is_set():
+        journal = _active_journal()
+        if journal is not None and not _retry_batch and not _queue.qsize():
+            if journal.pending < INGEST_BATCH_SIZE:
+                _journal_ready.wait(INGEST_FLUSH_INTERVAL)
+            _journal_ready.clear()
+            written = _flush_journal(journal)
+            if written == 0:
+                _persist_device_states()
+            elif written < 0:
+                eventlet.sleep(INGEST_FLUSH_INTERVAL)  # DB stalled: readings wait on disk
+            _sync_journal(journal)
+            continue
+
+        batch = _collect_batch()
+        if not batch:
+            _persist_device_states()
+        elif not _flush(batch):
+            eventlet.sleep(INGEST_FLUSH_INTERVAL)
+    log_info("[INGEST] 🛑 Writer stopped")
+
+
+# ==========================================================
+# Lifecycle
+# ==========================================================
+def start_ingest_writer(app):
+    """Start the writer greenlet once per process (idempotent)."""
+    global _writer_thread, _flask_app
+    if app is None:
+        return False
+    with _write_lock:
+        _flask_app = app
+        if _writer_thread is not None:
+            return True
+        _active_journal()  # open (and lock) the journal now, so a second owner fails at startup
+        _writer_stop.clear()
+        _writer_thread = eventlet.spawn(_writer_loop)
+    return True
+
+
+def flush_pending():
+    """Synchronously write everything still queued or journaled (used on shutdown and by tests)."""
+    if _flask_app is None:
+        return 0
+    written = 0
+    while True:
+        batch = _drain_nowait(INGEST_BATCH_SIZE)
+        if batch:
+            if not _flush(batch):
+                return written
+            written += len(batch)
+            continue
+        journal = _active_journal()
+        done = _flush_journal(journal) if journal is not None else 0
+        if done <= 0:
+            return written
+        written += done
+
+
+def stop_ingest_writer():
+    global _writer_thread
+    _writer_stop.set()
+    if _writer_thread is not None:
+        # let the loop finish its in-flight batch instead of killing it mid-collect
+        try:
+            with eventlet.Timeout(INGEST_FLUSH_INTERVAL * 4, False):
+                _writer_thread.wait()
+        except Exception:
+            pass
+        _writer_thread = None
+    written = flush_pending()
+    if _flask_app is not None:
+        # shutdown: in-memory last_seen / status must reach the table exactly
+        _persist_device_states(force=True)
+    if _journal is not None:
+        _sync_journal(_journal, force=True)
+    return written
+
+
+atexit.register(stop_ingest_writer)
+
+
+def get_ingest_stats():
+    return {
+        **_stats,
+        "queue_depth": _queue.qsize(),
+        "queue_capacity": INGEST_QUEUE_SIZE,
+        "batch_limit": INGEST_BATCH_SIZE,
+        "flush_interval_s": INGEST_FLUSH_INTERVAL,
+        "running": _writer_thread is not None,
+        "journal": _journal.stats() if _journal is not None else None,
+    }
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "enqueue_reading",
+    "start_ingest_writer",
+    "stop_ingest_writer",
+    "flush_pending",
+    "get_ingest_stats",
+]
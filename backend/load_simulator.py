@@ -0,0 +1,350 @@
+# =================================================================================================
+# Franc Automation - Load Simulator (virtual devices for demos and load tests)
+# Handles:
+#   • N virtual devices driven by ONE scheduler greenlet (heap of next-due times) — thousands
+#     of devices cost one greenlet, not one each
+#   • Per-device interval with ± jitter, payload shapes (core / aliases / extended / bare),
+#     optional device timestamps and a redelivery rate (QoS 1 duplicates for reading_guard)
+#   • Targets:
+#       pipeline  message_pipeline.submit() — the exact hand-off the MQTT io loop makes
+#       broker    LocalBroker, an in-process MQTT stand-in: publish → wildcard subscription →
+#                 topic routing → on_message(conn, msg), no internet broker needed
+#   • Counters: published / redelivered / scheduler lag / achieved rate
+# =================================================================================================
+import os
+import time
+import heapq
+import random
+import threading
+
+import eventlet
+
+from backend import message_pipeline, payload_parser
+from backend.utils.audit import log_info
+from backend.utils.clock import now
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+SHAPES = ("core", "aliases", "extended", "bare")
+TARGETS = ("pipeline", "broker")
+
+SIM_INTERVAL = float(os.environ.get("SIM_INTERVAL", 2.0))  # seconds between readings per device
+SIM_JITTER = float(os.environ.get("SIM_JITTER", 0.1))  # ± fraction of the interval
+SIM_SHAPE = os.environ.get("SIM_SHAPE", "core").lower()
+SIM_EXTRA_CHANNELS = int(os.environ.get("SIM_EXTRA_CHANNELS", 4))  # "extended" shape only
+SIM_MAX_BURST = int(os.environ.get("SIM_MAX_BURST", 1000))  # messages per scheduler pass
+
+TOPIC_PREFIX = "francauto/devices/"
+WILDCARD_TOPIC = TOPIC_PREFIX + "+"
+
+
+# ==========================================================
+# Virtual devices
+# ==========================================================
+class VirtualDevice:
+    """One simulated sensor: a slow random walk around plausible room values."""
+    __slots__ = ("id", "name", "topic", "interval", "due", "seq", "temperature", "humidity", "pressure")
+
+    def __init__(self, device_id, name, interval):
+        self.id = device_id
+        self.name = name
+        self.topic = TOPIC_PREFIX + name
+        self.interval = interval
+        self.due = 0.0
+        self.seq = 0
+        self.temperature = random.uniform(22.0, 36.0)
+        self.humidity = random.uniform(35.0, 75.0)
+        self.pressure = random.uniform(990.0, 1035.0)
+
+    def step(self):
+        self.seq += 1
+        self.temperature = min(max(self.temperature + random.uniform(-0.3, 0.3), 22.0), 36.0)
+        self.humidity = min(max(self.humidity + random.uniform(-0.8, 0.8), 35.0), 75.0)
+        self.pressure = min(max(self.pressure + random.uniform(-0.5, 0.5), 990.0), 1035.0)
+
+
+def make_payload(device, shape="core", extra_channels=SIM_EXTRA_CHANNELS, ts_ms=None):
+    """Encode the device's current values in one of SHAPES → bytes."""
+    t, h, p = round(device.temperature, 2), round(device.humidity, 2), round(device.pressure, 2)
+    if shape == "bare":  # not JSON: exercises the parser's lenient fallback
+        text = f"{{temp: {t}, hum: {h}, press: {p}" + (f", ts: {ts_ms}}}" if ts_ms else "}")
+        return text.encode()
+    if shape == "aliases":
+        data = {"Temp": t, "HUM": h, "p": p, "rssi": -40 - device.id % 50, "battery": 3.7}
+    else:
+        data = {"temperature": t, "humidity": h, "pressure": p}
+        if shape == "extended":
+            for i in range(extra_channels):
+                data[f"ch{i + 1}"] = round(t * (i + 1) % 97, 2)
+    if ts_ms:
+        data["ts"] = ts_ms
+    return payload_parser.dumps(data).encode()
+
+
+# ==========================================================
+# Local broker stand-in
+# ==========================================================
+class LocalMessage:
+    """The attributes of paho's MQTTMessage the backend reads."""
+    __slots__ = ("topic", "payload", "qos", "retain")
+
+    def __init__(self, topic, payload, qos=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = False
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT filter match with `+` (one level) and `#` (rest of the topic)."""
+    levels = topic.split("/")
+    parts = topic_filter.split("/")
+    for i, part in enumerate(parts):
+        if part == "#":
+            return True
+        if i >= len(levels) or (part != "+" and part != levels[i]):
+            return False
+    return len(parts) == len(levels)
+
+
+class LocalBroker:
+    """In-process publish / subscribe with MQTT topic filters; delivery is synchronous."""
+
+    def __init__(self):
+        self._subscriptions = []
+        self.published = 0
+        self.delivered = 0
+        self.unmatched = 0
+
+    def subscribe(self, topic_filter, callback):
+        self._subscriptions.append((topic_filter, callback))
+
+    def publish(self, topic, payload, qos=0):
+        self.published += 1
+        message = LocalMessage(topic, payload, qos)
+        matched = False
+        for topic_filter, callback in self._subscriptions:
+            if topic_matches(topic_filter, topic):
+                matched = True
+                self.delivered += 1
+                callback(message)
+        if not matched:
+            self.unmatched += 1
+
+
+# ==========================================================
+# Simulator
+# ==========================================================
+class LoadSimulator:
+    """
+    Publishes readings for many VirtualDevices from one scheduler.
+    `on_message(conn, msg)` is the broker-target handler (mqtt_service.handle_message);
+    `conn` is the VirtualDevice, which carries the .id / .name a DeviceConnection has.
+    """
+
+    def __init__(self, target="pipeline", shape=None, jitter=None, extra_channels=None,
+                 device_timestamps=True, redelivery=0.0, on_message=None):
+        if target not in TARGETS:
+            raise ValueError(f"target must be one of {TARGETS}")
+        shape = (shape or SIM_SHAPE).lower()
+        if shape not in SHAPES:
+            raise ValueError(f"shape must be one of {SHAPES}")
+        self.target = target
+        self.shape = shape
+        self.jitter = min(max(SIM_JITTER if jitter is None else float(jitter), 0.0), 0.9)
+        self.extra_channels = SIM_EXTRA_CHANNELS if extra_channels is None else int(extra_channels)
+        self.device_timestamps = device_timestamps
+        self.redelivery = float(redelivery)
+
+        self._devices = {}
+        self._topics = {}
+        self._heap = []
+        self._counter = 0
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stopped = False
+
+        self.broker = None
+        if target == "broker":
+            if on_message is None:
+                raise ValueError("the broker target needs an on_message handler")
+            self.broker = LocalBroker()
+            self._on_message = on_message
+            self.broker.subscribe(WILDCARD_TOPIC, self._route)
+
+        self._started_at = None
+        self._stats = {
+            "published": 0,
+            "redelivered": 0,
+            "unrouted": 0,
+            "passes": 0,
+            "last_lag_ms": 0.0,
+            "max_lag_ms": 0.0,
+        }
+
+    # ------------------------------------------------------
+    # Devices
+    # ------------------------------------------------------
+    def _next_due(self, device, base):
+        spread = device.interval * self.jitter
+        return base + device.interval + (random.uniform(-spread, spread) if spread else 0.0)
+
+    def _push(self, device):
+        self._counter += 1
+        heapq.heappush(self._heap, (device.due, self._counter, device))
+
+    def add_device(self, device_id, name, interval=None):
+        """Add (or replace) a device; its first reading is due within one interval."""
+        interval = max(SIM_INTERVAL if interval is None else float(interval), 0.001)
+        device = VirtualDevice(device_id, name, interval)
+        device.due = time.monotonic() + random.uniform(0.0, device.interval)  # spread the first wave
+        with self._lock:
+            old = self._devices.get(device_id)
+            if old is not None:
+                self._topics.pop(old.topic, None)
+            self._devices[device_id] = device
+            self._topics[device.topic] = device_id
+            self._push(device)
+        return device
+
+    def remove_device(self, device_id):
+        with self._lock:
+            device = self._devices.pop(device_id, None)  # its heap entry is skipped lazily
+            if device is not None:
+                self._topics.pop(device.topic, None)
+            return device is not None
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+            self._topics.clear()
+            self._heap = []
+
+    def __len__(self):
+        return len(self._devices)
+
+    # ------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------
+    def _route(self, msg):
+        device = self._devices.get(self._topics.get(msg.topic))
+        if device is None:
+            self._stats["unrouted"] += 1
+            return
+        self._on_message(device, msg)
+
+    def _send(self, device, payload):
+        if self.broker is not None:
+            self.broker.publish(device.topic, payload, qos=1)
+        else:
+            message_pipeline.submit(device.id, device.name, payload, now())
+
+    def publish(self, device):
+        """Advance one device and publish its reading (twice when a redelivery is drawn)."""
+        device.step()
+        ts_ms = int(time.time() * 1000) if self.device_timestamps else None
+        payload = make_payload(device, self.shape, self.extra_channels, ts_ms)
+        self._send(device, payload)
+        self._stats["published"] += 1
+        if self.redelivery and random.random() < self.redelivery:
+            self._send(device, payload)
+            self._stats["redelivered"] += 1
+
+    def tick(self, limit=None, at=None):
+        """Publish every device due by `at` (monotonic, default now), at most `limit`. → count."""
+        limit = limit or SIM_MAX_BURST
+        done = 0
+        current = time.monotonic() if at is None else at
+        with self._lock:
+            while self._heap and done < limit:
+                due, _, device = self._heap[0]
+                if due > current:
+                    break
+                heapq.heappop(self._heap)
+                if self._devices.get(device.id) is not device:
+                    continue  # removed / replaced
+                lag = (current - due) * 1000.0
+                self._stats["last_lag_ms"] = round(lag, 3)
+                self._stats["max_lag_ms"] = round(max(self._stats["max_lag_ms"], lag), 3)
+                self.publish(device)
+                # schedule from the due time, not from now, so a slow pass does not lower the rate;
+                # a device a whole interval behind skips ahead instead of bursting to catch up
+                device.due = self._next_due(device, due)
+                if device.due <= current:
+                    device.due = self._next_due(device, current)
+                self._push(device)
+                done += 1
+        self._stats["passes"] += 1
+        return done
+
+    def _loop(self):
+        log_info(
+            f"[SIMULATOR] 🎮 Load simulator started ({len(self._devices)} devices, target={self.target}, "
+            f"shape={self.shape}, jitter={self.jitter})"
+        )
+        while not self._stopped:
+            published = self.tick()
+            if published:
+                eventlet.sleep(0)  # let the pipeline worker / io loop run between bursts
+                continue
+            with self._lock:
+                wait = self._heap[0][0] - time.monotonic() if self._heap else 0.5
+            eventlet.sleep(min(max(wait, 0.0), 0.5))
+        log_info("[SIMULATOR] 🛑 Load simulator stopped")
+
+    # ------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------
+    def start(self):
+        """Start the scheduler greenlet (idempotent)."""
+        with self._lock:
+            self._stopped = False
+            if self._started_at is None:
+                self._started_at = time.monotonic()
+            if self._thread is None or self._thread.dead:
+                self._thread = eventlet.spawn(self._loop)
+        return self
+
+    def stop(self):
+        self._stopped = True
+        if self._thread is not None:
+            try:
+                self._thread.kill()
+            except Exception:
+                pass
+            self._thread = None
+
+    def stats(self):
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        offered = sum(1.0 / d.interval for d in list(self._devices.values()))
+        return {
+            **self._stats,
+            "devices": len(self._devices),
+            "target": self.target,
+            "shape": self.shape,
+            "jitter": self.jitter,
+            "offered_rate": round(offered, 1),  # messages / s the schedule asks for
+            "achieved_rate": round(self._stats["published"] / elapsed, 1) if elapsed else 0.0,
+            "broker": {
+                "published": self.broker.published,
+                "delivered": self.broker.delivered,
+                "unmatched": self.broker.unmatched,
+            } if self.broker is not None else None,
+            "running": self._thread is not None and not self._thread.dead,
+        }
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "SHAPES",
+    "TARGETS",
+    "VirtualDevice",
+    "make_payload",
+    "LocalMessage",
+    "LocalBroker",
+    "topic_matches",
+    "LoadSimulator",
+]
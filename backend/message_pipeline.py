@@ -0,0 +1,295 @@
+# =================================================================================================
+# Franc Automation - Message Pipeline (MQTT io loop → worker stage)
+# Handles:
+#   • submit(): the only thing the broker io loop does per message — queue the raw payload
+#     bytes with a receive timestamp (no parsing, SQL or Socket.IO on the network path)
+#   • Bounded inbox with an overflow policy (MQTT_INBOX_POLICY):
+#       drop_oldest  evict the oldest queued message (default; live data wins)
+#       block        wait up to MQTT_INBOX_BLOCK_TIMEOUT, then drop the new message
+#       spill        append to an on-disk spill file, replayed in order once the inbox drains
+#   • One worker greenlet that parses, persists (ingest queue) and emits, in arrival order
+#   • Counters: received / processed / dropped per reason / spilled / replayed / lag
+# =================================================================================================
+import os
+import time
+import atexit
+import base64
+import threading
+from datetime import datetime
+
+import eventlet
+from eventlet.queue import LightQueue, Full, Empty
+
+from backend.utils.audit import log_info
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+POLICIES = ("drop_oldest", "block", "spill")
+
+INBOX_SIZE = int(os.environ.get("MQTT_INBOX_SIZE", 20000))
+INBOX_POLICY = os.environ.get("MQTT_INBOX_POLICY", "drop_oldest").lower()
+INBOX_BLOCK_TIMEOUT = float(os.environ.get("MQTT_INBOX_BLOCK_TIMEOUT", 1.0))  # seconds
+INBOX_BATCH = int(os.environ.get("MQTT_INBOX_BATCH", 200))  # messages per worker pass
+SPILL_PATH = os.environ.get(
+    "MQTT_INBOX_SPILL_PATH",
+    os.path.join(os.path.dirname(__file__), "instance", "inbox.spill"),
+)
+if INBOX_POLICY not in POLICIES:
+    INBOX_POLICY = "drop_oldest"
+
+_inbox = LightQueue(INBOX_SIZE)
+_worker_thread = None
+_processor = None
+_after_batch = None
+_lock = threading.RLock()
+
+# spill state: while the file holds unread lines every new message goes behind them
+_spill_offset = 0
+_spilling = os.path.exists(SPILL_PATH) and os.path.getsize(SPILL_PATH) > 0  # resume after restart
+
+_stats = {
+    "received": 0,
+    "processed": 0,
+    "dropped_oldest": 0,
+    "dropped_blocked": 0,
+    "spilled": 0,
+    "replayed": 0,
+    "errors": 0,
+    "max_depth": 0,
+    "last_lag_ms": 0.0,
+    "max_lag_ms": 0.0,
+}
+
+
+class Message:
+    """One raw MQTT message as it left the socket."""
+    __slots__ = ("device_id", "device_name", "payload", "received_at")
+
+    def __init__(self, device_id, device_name, payload, received_at):
+        self.device_id = device_id
+        self.device_name = device_name
+        self.payload = payload
+        self.received_at = received_at
+
+
+# ==========================================================
+# Spill file — tab-separated: device_id, device_name, received_at (ISO), base64 payload
+# ==========================================================
+def _spill(message):
+    global _spilling
+    line = "\t".join((
+        str(message.device_id),
+        message.device_name or "",
+        message.received_at.isoformat(),
+        base64.b64encode(bytes(message.payload)).decode(),
+    ))
+    with _lock:
+        os.makedirs(os.path.dirname(SPILL_PATH) or ".", exist_ok=True)
+        with open(SPILL_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        _spilling = True
+    _stats["spilled"] += 1
+
+
+def _parse_spilled(line):
+    device_id, name, received_at, payload = line.rstrip("\n").split("\t")
+    return Message(int(device_id), name, base64.b64decode(payload), datetime.fromisoformat(received_at))
+
+
+def _refill_from_spill(limit):
+    """Move up to `limit` spilled messages back into the inbox, oldest first."""
+    global _spill_offset, _spilling
+    moved = 0
+    with _lock:
+        if not _spilling:
+            return 0
+        at_end = True
+        try:
+            with open(SPILL_PATH, "r", encoding="utf-8") as f:
+                f.seek(_spill_offset)
+                while moved < limit:
+                    start = f.tell()
+                    line = f.readline()
+                    if not line:
+                        break
+                    try:
+                        message = _parse_spilled(line)
+                    except ValueError:
+                        _stats["errors"] += 1  # torn tail from a crash / corrupt line — skip it
+                        _spill_offset = f.tell()
+                        continue
+                    try:
+                        _inbox.put_nowait(message)
+                    except Full:
+                        f.seek(start)
+                        break
+                    _spill_offset = f.tell()
+                    moved += 1
+                at_end = not f.readline()
+        except FileNotFoundError:
+            pass
+        if at_end:
+            # everything spilled is back in memory: new messages may use the inbox again
+            try:
+                os.remove(SPILL_PATH)
+            except FileNotFoundError:
+                pass
+            _spill_offset = 0
+            _spilling = False
+    _stats["replayed"] += moved
+    return moved
+
+
+# ==========================================================
+# Producer side (broker io loop)
+# ==========================================================
+def submit(device_id, device_name, payload, received_at):
+    """
+    Hand one raw message to the worker stage. Returns False when it was dropped.
+    Never parses or touches the database; only the `block` policy can make the
+    caller wait (bounded by MQTT_INBOX_BLOCK_TIMEOUT).
+    """
+    message = Message(device_id, device_name, payload, received_at)
+    _stats["received"] += 1
+
+    if _spilling and INBOX_POLICY == "spill":
+        _spill(message)  # keep arrival order behind what is already on disk
+        return True
+    try:
+        _inbox.put_nowait(message)
+    except Full:
+        if INBOX_POLICY == "spill":
+            _spill(message)
+        elif INBOX_POLICY == "block":
+            try:
+                _inbox.put(message, timeout=INBOX_BLOCK_TIMEOUT)
+            except Full:
+                _stats["dropped_blocked"] += 1
+                return False
+        else:
+            try:
+                _inbox.get_nowait()
+                _stats["dropped_oldest"] += 1
+            except Empty:
+                pass
+            try:
+                _inbox.put_nowait(message)
+            except Full:
+                _stats["dropped_oldest"] += 1
+                return False
+
+    depth = _inbox.qsize()
+    if depth > _stats["max_depth"]:
+        _stats["max_depth"] = depth
+    return True
+
+
+# ==========================================================
+# Worker side
+# ==========================================================
+def _process(message):
+    try:
+        _processor(message)
+    except Exception as e:
+        _stats["errors"] += 1
+        log_info(f"[PIPELINE] ❌ Device {message.device_id}: {e}")
+        return
+    _stats["processed"] += 1
+    lag = (time.time() - message.received_at.timestamp()) * 1000.0
+    _stats["last_lag_ms"] = round(lag, 3)
+    _stats["max_lag_ms"] = round(max(_stats["max_lag_ms"], lag), 3)
+
+
+def _run_batch(first=None):
+    """Process `first` plus whatever else is queued (up to INBOX_BATCH). Returns the count."""
+    done = 0
+    if first is not None:
+        _process(first)
+        done = 1
+    while done < INBOX_BATCH:
+        try:
+            message = _inbox.get_nowait()
+        except Empty:
+            if not _refill_from_spill(INBOX_BATCH - done):
+                break
+            continue
+        _process(message)
+        done += 1
+    if done and _after_batch is not None:
+        try:
+            _after_batch()
+        except Exception as e:
+            log_info(f"[PIPELINE] ❌ After-batch hook failed: {e}")
+    return done
+
+
+def _worker_loop():
+    log_info(f"[PIPELINE] 📥 Worker started (inbox={INBOX_SIZE}, policy={INBOX_POLICY})")
+    while True:
+        try:
+            first = _inbox.get(timeout=0.5)
+        except Empty:
+            first = None
+            if not _refill_from_spill(INBOX_BATCH):
+                continue
+        _run_batch(first)
+        eventlet.sleep(0)  # let the io loop read sockets between batches
+
+
+# ==========================================================
+# Lifecycle
+# ==========================================================
+def start_pipeline(processor, after_batch=None):
+    """
+    Start the worker greenlet once per process (idempotent).
+    `processor(message)` handles one Message; `after_batch()` runs once per worker pass
+    (e.g. one global status emit instead of one per message).
+    """
+    global _worker_thread, _processor, _after_batch
+    with _lock:
+        _processor = processor
+        _after_batch = after_batch
+        if _worker_thread is None or _worker_thread.dead:
+            _worker_thread = eventlet.spawn(_worker_loop)
+    return True
+
+
+def drain():
+    """Synchronously process everything queued or spilled (shutdown / tests)."""
+    if _processor is None:
+        return 0
+    total = 0
+    while True:
+        done = _run_batch()
+        if not done:
+            return total
+        total += done
+
+
+atexit.register(drain)  # registered after the ingest writer's hook, so it runs first
+
+
+def get_pipeline_stats():
+    return {
+        **_stats,
+        "queue_depth": _inbox.qsize(),
+        "queue_capacity": INBOX_SIZE,
+        "policy": INBOX_POLICY,
+        "spill_pending": _spilling,
+        "spill_path": SPILL_PATH if INBOX_POLICY == "spill" else None,
+        "running": _worker_thread is not None and not _worker_thread.dead,
+    }
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "POLICIES",
+    "Message",
+    "submit",
+    "start_pipeline",
+    "drain",
+    "get_pipeline_stats",
+]
@@ -0,0 +1,26 @@
+-- =========================================================
+-- 009_add_timeseries_indexes.sql — Time-series indexes
+-- Every read path filters / sorts sensors + history by timestamp,
+-- per-device lookups by (device_id, timestamp).
+-- Mirrors __table_args__ on Sensor / History in models.py
+-- =========================================================
+
+-- ============================
+-- SENSORS
+-- ============================
+CREATE INDEX IF NOT EXISTS ix_sensors_timestamp
+    ON sensors (timestamp);
+
+CREATE INDEX IF NOT EXISTS ix_sensors_device_timestamp
+    ON sensors (device_id, timestamp);
+
+-- ============================
+-- HISTORY
+-- ============================
+CREATE INDEX IF NOT EXISTS ix_history_timestamp
+    ON history (timestamp);
+
+CREATE INDEX IF NOT EXISTS ix_history_device_timestamp
+    ON history (device_id, timestamp);
+
+ANALYZE;
@@ -0,0 +1,41 @@
+-- =========================================================
+-- 010_create_rollups.sql — Time-bucketed aggregates
+-- One row per (device, resolution, bucket); maintained by
+-- rollup_service.write_rollups in the ingest transaction.
+-- Fill from existing history with:
+--   python -m backend.scripts.backfill_rollups
+-- Mirrors the Rollup model in models.py
+-- =========================================================
+
+CREATE TABLE IF NOT EXISTS rollups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id INTEGER NOT NULL,
+    resolution TEXT NOT NULL,          -- minute | hour | day
+    bucket_start DATETIME NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    last_ts DATETIME,
+
+    temperature_min REAL,
+    temperature_max REAL,
+    temperature_sum REAL NOT NULL DEFAULT 0,
+    temperature_count INTEGER NOT NULL DEFAULT 0,
+    temperature_last REAL,
+
+    humidity_min REAL,
+    humidity_max REAL,
+    humidity_sum REAL NOT NULL DEFAULT 0,
+    humidity_count INTEGER NOT NULL DEFAULT 0,
+    humidity_last REAL,
+
+    pressure_min REAL,
+    pressure_max REAL,
+    pressure_sum REAL NOT NULL DEFAULT 0,
+    pressure_count INTEGER NOT NULL DEFAULT 0,
+    pressure_last REAL,
+
+    CONSTRAINT uq_rollups_bucket UNIQUE (device_id, resolution, bucket_start),
+    FOREIGN KEY (device_id) REFERENCES devices(id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_rollups_resolution_bucket
+    ON rollups (resolution, bucket_start);
@@ -0,0 +1,40 @@
+-- =========================================================
+-- 011_create_readings.sql — Per-device metric schemas + narrow readings
+-- device_metrics: one row per channel a device sends (name, unit,
+--   type, scale / offset, payload aliases); unknown numeric channels
+--   are registered automatically by the ingest writer.
+-- readings: one row per (device, metric, timestamp) — only the
+--   metrics a message actually carried are stored.
+-- Mirrors the DeviceMetric / Reading models in models.py
+-- =========================================================
+
+CREATE TABLE IF NOT EXISTS device_metrics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    unit TEXT,
+    type TEXT NOT NULL DEFAULT 'float',   -- float | int | bool
+    scale REAL NOT NULL DEFAULT 1.0,
+    value_offset REAL NOT NULL DEFAULT 0.0,
+    aliases JSON,
+    created_at DATETIME,
+
+    CONSTRAINT uq_device_metrics_name UNIQUE (device_id, name),
+    FOREIGN KEY (device_id) REFERENCES devices(id)
+);
+
+CREATE TABLE IF NOT EXISTS readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id INTEGER NOT NULL,
+    metric_id INTEGER NOT NULL,
+    timestamp DATETIME NOT NULL,
+    value REAL,
+
+    FOREIGN KEY (device_id) REFERENCES devices(id),
+    FOREIGN KEY (metric_id) REFERENCES device_metrics(id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_readings_device_timestamp
+    ON readings (device_id, timestamp);
+CREATE INDEX IF NOT EXISTS ix_readings_metric_timestamp
+    ON readings (metric_id, timestamp);
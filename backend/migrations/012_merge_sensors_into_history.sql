@@ -0,0 +1,53 @@
+-- =========================================================
+-- 012_merge_sensors_into_history.sql — One canonical raw readings table
+-- Every reading used to be written twice (sensors + history). From now
+-- on `history` is the only raw table; `sensors` becomes a read-only
+-- view over its recent window (last 24 h, India wall-clock) for SQL
+-- consumers. The ORM maps Sensor straight onto history (models.py).
+-- Extra channels stay in the narrow `readings` table; core channels
+-- (temperature / humidity / pressure) are no longer copied there.
+-- Run with the backend stopped; take a backup first.
+-- =========================================================
+
+-- ============================
+-- 1) Merge: sensors rows that never reached history (e.g. inserted by hand)
+-- ============================
+INSERT INTO history (device_id, temperature, humidity, pressure, timestamp)
+SELECT s.device_id, s.temperature, s.humidity, s.pressure, s.timestamp
+FROM sensors s
+WHERE NOT EXISTS (
+    SELECT 1 FROM history h
+    WHERE h.device_id = s.device_id AND h.timestamp = s.timestamp
+);
+
+-- ============================
+-- 2) Drop the duplicate table, keep its shape as a view
+-- ============================
+DROP INDEX IF EXISTS ix_sensors_timestamp;
+DROP INDEX IF EXISTS ix_sensors_device_timestamp;
+DROP TABLE IF EXISTS sensors;
+
+CREATE VIEW IF NOT EXISTS sensors AS
+SELECT
+    h.id,
+    h.device_id,
+    'francauto/devices/' || d.name AS topic,
+    json_object('temperature', h.temperature, 'humidity', h.humidity, 'pressure', h.pressure) AS payload,
+    h.temperature,
+    h.humidity,
+    h.pressure,
+    h.timestamp,
+    NULL AS raw_data
+FROM history h
+LEFT JOIN devices d ON d.id = h.device_id
+WHERE h.timestamp >= datetime('now', '+5 hours', '+30 minutes', '-1 day');
+
+-- ============================
+-- 3) Core channels live in history only
+-- ============================
+DELETE FROM readings
+WHERE metric_id IN (
+    SELECT id FROM device_metrics WHERE name IN ('temperature', 'humidity', 'pressure')
+);
+
+ANALYZE;
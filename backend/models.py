@@ -3,8 +3,9 @@
 # ==========================================================
 from datetime import datetime
 from backend.extensions import db
-from pytz import timezone
-from sqlalchemy import JSON
+from backend.utils.clock import INDIA_TZ
+from sqlalchemy import JSON, func, literal, null, select
+from sqlalchemy.orm import column_property
 
 # ==========================================================
 # Association Tables
@@ -124,7 +125,8 @@ class Device(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_seen = db.Column(db.DateTime, nullable=True)
 
-    sensors = db.relationship("Sensor", back_populates="device", cascade="all, delete-orphan")
+    # read-only: readings live in `history`, whose backref owns the foreign key
+    sensors = db.relationship("Sensor", back_populates="device", viewonly=True)
 
     def to_dict(self):
         return {
@@ -149,24 +151,62 @@ class Device(db.Model):
         }
 
 # ==========================================================
-# Sensor Model
+# History Model — the canonical raw readings table (core metrics, one row per message)
 # ==========================================================
-INDIA_TZ = timezone("Asia/Kolkata")
-
-class Sensor(db.Model):
-    __tablename__ = "sensors"
+class History(db.Model):
+    __tablename__ = "history"
+    __table_args__ = (
+        db.Index("ix_history_timestamp", "timestamp"),
+        db.Index("ix_history_device_timestamp", "device_id", "timestamp"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    device_id = db.Column(db.Integer, db.ForeignKey("devices.id"), nullable=False)
-    topic = db.Column(db.String(255))
-    payload = db.Column(db.Text)
+    device_id = db.Column(db.Integer, db.ForeignKey("devices.id"))
     temperature = db.Column(db.Float)
     humidity = db.Column(db.Float)
     pressure = db.Column(db.Float)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    raw_data = db.Column(JSON)
 
-    device = db.relationship("Device", back_populates="sensors")
+    device = db.relationship("Device", backref=db.backref("history", lazy=True))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "device_id": self.device_id,
+            "temperature": self.temperature,
+            "humidity": self.humidity,
+            "pressure": self.pressure,
+            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
+        }
+
+# ==========================================================
+# Sensor — compatibility mapping over `history` (the old `sensors` table was merged
+# into it by migrations/012_merge_sensors_into_history.sql). `topic` and `payload`
+# are derived on read; only the core columns are writable.
+# ==========================================================
+_history = History.__table__
+# own alias: listings that also join Device (device_name) must not correlate the topic lookup away
+_topic_device = Device.__table__.alias("topic_device")
+
+
+class Sensor(db.Model):
+    __table__ = _history
+
+    topic = column_property(
+        select(literal("francauto/devices/") + _topic_device.c.name)
+        .where(_topic_device.c.id == _history.c.device_id)
+        .scalar_subquery()
+    )
+    payload = column_property(
+        func.json_object(
+            "temperature", _history.c.temperature,
+            "humidity", _history.c.humidity,
+            "pressure", _history.c.pressure,
+        )
+    )
+    raw_data = column_property(null())
+
+    device = db.relationship("Device", back_populates="sensors", viewonly=True)
 
     def to_dict(self):
         ts = self.timestamp
@@ -192,29 +232,118 @@ class Sensor(db.Model):
         }
 
 # ==========================================================
-# History Model
+# Metric schema (per device channel) + narrow readings store
+# keep in sync with migrations/011_create_readings.sql
 # ==========================================================
-class History(db.Model):
-    __tablename__ = "history"
+METRIC_TYPES = ("float", "int", "bool")
+
+
+class DeviceMetric(db.Model):
+    __tablename__ = "device_metrics"
+    __table_args__ = (
+        db.UniqueConstraint("device_id", "name", name="uq_device_metrics_name"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    device_id = db.Column(db.Integer, db.ForeignKey("devices.id"))
-    temperature = db.Column(db.Float)
-    humidity = db.Column(db.Float)
-    pressure = db.Column(db.Float)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    device_id = db.Column(db.Integer, db.ForeignKey("devices.id"), nullable=False)
+    name = db.Column(db.String(64), nullable=False)          # channel name after alias mapping
+    unit = db.Column(db.String(32))
+    type = db.Column(db.String(10), nullable=False, default="float")  # float | int | bool
+    scale = db.Column(db.Float, nullable=False, default=1.0)          # stored = raw * scale + offset
+    offset = db.Column("value_offset", db.Float, nullable=False, default=0.0)
+    aliases = db.Column(JSON)                                  # payload keys mapped to this channel
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    device = db.relationship("Device", backref=db.backref("history", lazy=True))
+    device = db.relationship("Device", backref=db.backref("metrics", lazy=True, cascade="all, delete-orphan"))
 
     def to_dict(self):
         return {
             "id": self.id,
             "device_id": self.device_id,
-            "temperature": self.temperature,
-            "humidity": self.humidity,
-            "pressure": self.pressure,
+            "name": self.name,
+            "unit": self.unit,
+            "type": self.type,
+            "scale": self.scale,
+            "offset": self.offset,
+            "aliases": self.aliases or [],
+        }
+
+
+class Reading(db.Model):
+    __tablename__ = "readings"
+    __table_args__ = (
+        db.Index("ix_readings_device_timestamp", "device_id", "timestamp"),
+        db.Index("ix_readings_metric_timestamp", "metric_id", "timestamp"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.Integer, db.ForeignKey("devices.id"), nullable=False)
+    metric_id = db.Column(db.Integer, db.ForeignKey("device_metrics.id"), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)        # India wall-clock, like history
+    value = db.Column(db.Float)
+
+    def to_dict(self):
+        return {
+            "device_id": self.device_id,
+            "metric_id": self.metric_id,
             "timestamp": self.timestamp.isoformat() if self.timestamp else None,
+            "value": self.value,
+        }
+
+# ==========================================================
+# Rollup Model (per device, per minute / hour / day bucket)
+# Maintained incrementally by backend/rollup_service.py
+# ==========================================================
+ROLLUP_METRICS = ("temperature", "humidity", "pressure")
+
+
+class Rollup(db.Model):
+    __tablename__ = "rollups"
+    __table_args__ = (
+        db.UniqueConstraint("device_id", "resolution", "bucket_start", name="uq_rollups_bucket"),
+        db.Index("ix_rollups_resolution_bucket", "resolution", "bucket_start"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.Integer, db.ForeignKey("devices.id"), nullable=False)
+    resolution = db.Column(db.String(10), nullable=False)   # minute | hour | day
+    bucket_start = db.Column(db.DateTime, nullable=False)    # India wall-clock, like history.timestamp
+    count = db.Column(db.Integer, nullable=False, default=0)
+    last_ts = db.Column(db.DateTime)
+
+    temperature_min = db.Column(db.Float)
+    temperature_max = db.Column(db.Float)
+    temperature_sum = db.Column(db.Float, nullable=False, default=0.0)
+    temperature_count = db.Column(db.Integer, nullable=False, default=0)
+    temperature_last = db.Column(db.Float)
+
+    humidity_min = db.Column(db.Float)
+    humidity_max = db.Column(db.Float)
+    humidity_sum = db.Column(db.Float, nullable=False, default=0.0)
+    humidity_count = db.Column(db.Integer, nullable=False, default=0)
+    humidity_last = db.Column(db.Float)
+
+    pressure_min = db.Column(db.Float)
+    pressure_max = db.Column(db.Float)
+    pressure_sum = db.Column(db.Float, nullable=False, default=0.0)
+    pressure_count = db.Column(db.Integer, nullable=False, default=0)
+    pressure_last = db.Column(db.Float)
+
+    def to_dict(self):
+        """Same keys as History.to_dict (averages), plus min / max / last per metric."""
+        data = {
+            "device_id": self.device_id,
+            "resolution": self.resolution,
+            "timestamp": self.bucket_start.isoformat() if self.bucket_start else None,
+            "count": self.count,
         }
+        for m in ROLLUP_METRICS:
+            n = getattr(self, f"{m}_count")
+            data[m] = getattr(self, f"{m}_sum") / n if n else None
+            data[f"{m}_min"] = getattr(self, f"{m}_min")
+            data[f"{m}_max"] = getattr(self, f"{m}_max")
+            data[f"{m}_last"] = getattr(self, f"{m}_last")
+        return data
 
 # ---------- Dashboard & Widget Models ----------
 class Dashboard(db.Model):
@@ -9,7 +9,7 @@ from backend.utils.audit import log_info
 def start_all_mqtt():
     """Initialize MQTT system on app startup."""
     init_mqtt_system()
-    log_info("✅ MQTT client system ready (single-device mode).")
+    log_info("✅ MQTT client system ready (multi-device mode).")
 
 def connect_first_device():
     """Optionally auto-connect the first device (for testing)."""
@@ -0,0 +1,332 @@
+# =================================================================================================
+# Franc Automation - MQTT Connection Manager
+# Handles:
+#   • Many concurrent device connections inside one backend process
+#   • ONE shared paho client per distinct broker (host, port, credentials)
+#   • Wildcard subscription (francauto/devices/+) + in-memory topic → device_id routing
+#   • Per-device state / message handler, per-broker reconnect policy (exponential backoff)
+#   • ONE io greenlet multiplexing every broker socket (no loop_start() thread per client)
+# =================================================================================================
+import os
+import time
+import select
+import threading
+
+import eventlet
+import paho.mqtt.client as mqtt
+
+from backend.utils.audit import log_info
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+IO_POLL_INTERVAL = float(os.environ.get("MQTT_IO_POLL_INTERVAL", 1.0))  # seconds
+MAX_RECONNECT_DELAY = float(os.environ.get("MQTT_MAX_RECONNECT_DELAY", 60))  # seconds
+DEFAULT_RECONNECT_PERIOD_MS = 5000
+
+TOPIC_PREFIX = "francauto/devices/"
+WILDCARD_TOPIC = TOPIC_PREFIX + "+"
+
+
+def new_client(client_id=""):
+    """paho 2.x requires an explicit callback API version; 1.x rejects the argument."""
+    try:
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id)
+    except AttributeError:
+        return mqtt.Client(client_id=client_id)
+
+
+def broker_key(device):
+    """Devices sharing this key share one TCP connection."""
+    host = (device.host or "broker.hivemq.com").strip().lower()
+    return (host, int(device.port or 1883), device.username or None, device.password or None)
+
+
+# ==========================================================
+# Per-device registration
+# ==========================================================
+class DeviceConnection:
+    """
+    Plain snapshot of a Device row plus its live MQTT state.
+    Safe to hand to other greenlets (no ORM instance / session attached).
+    """
+
+    def __init__(self, device, on_message):
+        self.id = device.id
+        self.name = device.name
+        self.host, self.port = broker_key(device)[:2]
+        self.auto_reconnect = device.auto_reconnect is not False
+        self.reconnect_period = (device.reconnect_period or DEFAULT_RECONNECT_PERIOD_MS) / 1000.0
+        self.topic = TOPIC_PREFIX + self.name
+
+        self.on_message = on_message
+        self.messages = 0
+        self.broker = None
+        self.stopped = False
+
+    @property
+    def state(self):
+        if self.stopped or self.broker is None:
+            return "stopped"
+        return self.broker.state
+
+    def to_dict(self):
+        broker = self.broker
+        return {
+            "device_id": self.id,
+            "device_name": self.name,
+            "host": self.host,
+            "port": self.port,
+            "state": self.state,
+            "retries": broker.retries if broker else 0,
+            "messages": self.messages,
+            "connected_at": broker.connected_at if broker else None,
+        }
+
+
+# ==========================================================
+# Shared broker connection
+# ==========================================================
+class BrokerConnection:
+    """One paho client per (host, port, username, password), shared by all its devices."""
+
+    def __init__(self, key, keepalive, router):
+        self.key = key
+        self.host, self.port, self.username, self.password = key
+        self.keepalive = keepalive
+        self.devices = {}
+        self._router = router
+
+        self.state = "idle"
+        self.retries = 0
+        self.next_retry_at = 0.0
+        self.connected_at = None
+        self.client = None
+        self._reconnecting = False
+
+    # ------------------------------------------------------
+    # Reconnect policy — the most eager attached device wins
+    # ------------------------------------------------------
+    @property
+    def auto_reconnect(self):
+        return any(d.auto_reconnect for d in list(self.devices.values()))
+
+    @property
+    def reconnect_period(self):
+        periods = [d.reconnect_period for d in list(self.devices.values())]
+        return min(periods) if periods else DEFAULT_RECONNECT_PERIOD_MS / 1000.0
+
+    # ------------------------------------------------------
+    # paho callbacks
+    # ------------------------------------------------------
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            log_info(f"[MQTT] ⚠️ {self.host}:{self.port} CONNACK refused (rc={rc})")
+            self.state = "disconnected"
+            self._schedule_retry()
+            return
+        client.subscribe(WILDCARD_TOPIC)
+        self.state = "connected"
+        self.retries = 0
+        self.connected_at = time.time()
+
+    def _on_disconnect(self, client, userdata, rc):
+        if self.state == "stopped":
+            return
+        self.state = "disconnected"
+        log_info(f"[MQTT] ⚠️ {self.host}:{self.port} lost connection (rc={rc})")
+        self._schedule_retry()
+
+    def _on_message(self, client, userdata, msg):
+        self._router(self, msg)
+
+    # ------------------------------------------------------
+    # Connect / reconnect
+    # ------------------------------------------------------
+    def connect(self):
+        """Blocking TCP connect; CONNACK is processed later by the io loop."""
+        client = new_client()
+        if self.username:
+            client.username_pw_set(self.username, self.password)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        self.client = client
+        self.state = "connecting"
+        client.connect(self.host, self.port, self.keepalive)
+
+    def _schedule_retry(self):
+        delay = min(self.reconnect_period * (2 ** self.retries), MAX_RECONNECT_DELAY)
+        self.next_retry_at = time.monotonic() + delay
+
+    def should_reconnect(self, now):
+        return (
+            self.auto_reconnect
+            and self.state == "disconnected"
+            and not self._reconnecting
+            and now >= self.next_retry_at
+        )
+
+    def reconnect(self):
+        self._reconnecting = True
+        try:
+            self.state = "connecting"
+            self.client.reconnect()
+        except Exception as e:
+            self.retries += 1
+            self.state = "disconnected"
+            self._schedule_retry()
+            log_info(f"[MQTT] 🔁 {self.host}:{self.port} reconnect #{self.retries} failed: {e}")
+        finally:
+            self._reconnecting = False
+
+    def close(self):
+        self.state = "stopped"
+        if self.client:
+            try:
+                self.client.disconnect()
+            except Exception:
+                pass
+
+
+# ==========================================================
+# Manager
+# ==========================================================
+class MqttConnectionManager:
+    """Registry of devices → shared BrokerConnections, driven by a single io greenlet."""
+
+    def __init__(self):
+        self._devices = {}
+        self._brokers = {}
+        self._topic_index = {}
+        self._lock = threading.RLock()
+        self._io_thread = None
+        self.unrouted = 0
+
+    # ------------------------------------------------------
+    # Registry
+    # ------------------------------------------------------
+    def connect(self, device, on_message, keepalive=60):
+        conn = DeviceConnection(device, on_message)
+        key = broker_key(device)
+
+        with self._lock:
+            old = self._devices.get(conn.id)
+            if old:
+                self._detach(old)
+            broker = self._brokers.get(key)
+            is_new = broker is None
+            if is_new:
+                broker = BrokerConnection(key, int(device.keep_alive or keepalive), self._route)
+                self._brokers[key] = broker
+            conn.broker = broker
+            broker.devices[conn.id] = conn
+            self._devices[conn.id] = conn
+            self._topic_index[conn.topic] = conn.id
+
+        if is_new:
+            try:
+                broker.connect()
+            except Exception:
+                with self._lock:
+                    for dev in list(broker.devices.values()):
+                        self._detach(dev)
+                raise
+
+        self._ensure_io_loop()
+        return conn
+
+    def _detach(self, conn):
+        """Caller holds the lock. Closes the broker when its last device leaves."""
+        conn.stopped = True
+        self._devices.pop(conn.id, None)
+        if self._topic_index.get(conn.topic) == conn.id:
+            del self._topic_index[conn.topic]
+        broker = conn.broker
+        if broker is None:
+            return
+        broker.devices.pop(conn.id, None)
+        if not broker.devices:
+            self._brokers.pop(broker.key, None)
+            broker.close()
+
+    def disconnect(self, device_id):
+        with self._lock:
+            conn = self._devices.get(device_id)
+            if conn:
+                self._detach(conn)
+        return conn is not None
+
+    def clear(self):
+        with self._lock:
+            for conn in list(self._devices.values()):
+                self._detach(conn)
+
+    def get(self, device_id):
+        return self._devices.get(device_id)
+
+    def online_count(self):
+        return sum(1 for c in list(self._devices.values()) if c.state != "stopped")
+
+    def has_broker(self, device):
+        return broker_key(device) in self._brokers
+
+    def broker_count(self):
+        return len(self._brokers)
+
+    def snapshot(self):
+        return [c.to_dict() for c in list(self._devices.values())]
+
+    # ------------------------------------------------------
+    # Routing — topic → device_id → per-device handler
+    # ------------------------------------------------------
+    def _route(self, broker, msg):
+        conn = broker.devices.get(self._topic_index.get(msg.topic))
+        if conn is None:
+            self.unrouted += 1
+            return
+        conn.messages += 1
+        conn.on_message(conn, msg)
+
+    # ------------------------------------------------------
+    # IO loop — select() across every broker socket
+    # ------------------------------------------------------
+    def _ensure_io_loop(self):
+        with self._lock:
+            if self._io_thread is None or self._io_thread.dead:
+                self._io_thread = eventlet.spawn(self._io_loop)
+
+    def _io_loop(self):
+        log_info("[MQTT] 🔄 Connection manager io loop started")
+        while True:
+            now = time.monotonic()
+            by_sock = {}
+            writers = []
+
+            for broker in list(self._brokers.values()):
+                sock = broker.client.socket() if broker.client else None
+                if sock is None:
+                    if broker.should_reconnect(now):
+                        eventlet.spawn_n(broker.reconnect)
+                    continue
+                by_sock[sock] = broker
+                if broker.client.want_write():
+                    writers.append(sock)
+
+            if not by_sock:
+                eventlet.sleep(IO_POLL_INTERVAL)
+                continue
+
+            try:
+                readable, writable, _ = select.select(list(by_sock), writers, [], IO_POLL_INTERVAL)
+            except (OSError, ValueError):
+                # a socket was closed under us — rebuild the set on the next pass
+                readable, writable = [], []
+
+            for sock in readable:
+                by_sock[sock].client.loop_read()
+            for sock in writable:
+                by_sock[sock].client.loop_write()
+            for broker in by_sock.values():
+                if broker.client:
+                    broker.client.loop_misc()
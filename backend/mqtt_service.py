@@ -1,41 +1,48 @@
 # =================================================================================================
 # Franc Automation - MQTT Service (Final Stable Anti-Flicker Build v3 with History Logging)
 # Handles:
-#   • Real & simulated MQTT data ingestion
-#   • Stores in BOTH Sensor (live) + History (archive)
-#   • Socket.IO updates to Dashboard / Live / Devices
+#   • Real & simulated MQTT data ingestion (many devices at once via MqttConnectionManager)
+#   • The broker io loop only queues raw bytes (message_pipeline); parsing, storage and
+#     emits run in the pipeline worker greenlet
+#   • Demo-broker devices get a virtual twin in the shared load simulator; load tests
+#     drive the same path with thousands of devices (start_load_simulation)
+#   • Device-supplied timestamps, duplicate drop and late-reading routing (reading_guard)
+#   • Stores one canonical `history` row per reading via the write-behind ingest queue,
+#     plus any extra channel the message carried in the narrow readings store (schema_registry)
+#   • Socket.IO updates to Dashboard / Live / Devices (coalesced per tick by emit_service)
 #   • Stable connection state, no flicker
 # =================================================================================================
 import eventlet
 eventlet.monkey_patch(all=True)
 
-import json
-import re
 import threading
 import os
-import random
 import socket
 from datetime import datetime
-from pytz import timezone
-import paho.mqtt.client as mqtt
+from backend.utils.clock import INDIA_TZ
 from flask import current_app
-from backend.extensions import db, socketio
-from backend.models import Device, Sensor, History     # <-- ✔ Added History Model
+from backend.extensions import db
+from backend.models import Device
 from backend.utils.audit import log_info
+from backend.ingest_service import enqueue_reading, start_ingest_writer
+from backend.mqtt_manager import MqttConnectionManager
+from backend.emit_service import publish_reading, publish_status, start_emitter
+from backend.load_simulator import LoadSimulator
+from backend import device_registry, message_pipeline, payload_parser, reading_guard, schema_registry
 
 # ==========================================================
 # Globals / Config
 # ==========================================================
 KEEPALIVE = int(os.environ.get("MQTT_KEEPALIVE", 60))
-INDIA_TZ = timezone("Asia/Kolkata")
 
-_active_device_id = None
-_mqtt_clients = {}
+SIMULATOR_HOSTS = ("broker.hivemq.com", "broker.emqx.io", "test.mosquitto.org")
+
+_manager = MqttConnectionManager()
 _flask_app = None
 _state_lock = threading.RLock()
 
-_simulator_thread = None
-_simulator_stop = threading.Event()
+_simulator = None  # shared LoadSimulator for demo-broker devices
+_stopped_ids = set()  # stopped by the user: their still-queued messages are dropped
 
 
 # ==========================================================
@@ -77,320 +84,266 @@ def reachable_broker(host, port=1883, timeout=3):
         return False
 
 
-def _parse_payload(payload_text: str):
-    try:
-        data = json.loads(payload_text)
-    except Exception:
-        try:
-            fixed = re.sub(r'(\w+)\s*:', r'"\1":', payload_text)
-            data = json.loads(fixed)
-        except Exception:
-            data = {"raw": payload_text}
-
-    norm = {}
-    for k, v in data.items():
-        k = str(k).lower()
-        if k in ("temperature", "temp", "t"):
-            norm["temperature"] = _num(v)
-        elif k in ("humidity", "hum", "h"):
-            norm["humidity"] = _num(v)
-        elif k in ("pressure", "press", "p"):
-            norm["pressure"] = _num(v)
-
-    norm.setdefault("temperature", 0.0)
-    norm.setdefault("humidity", 0.0)
-    norm.setdefault("pressure", 0.0)
-    return norm
-
-
 # ==========================================================
 # New — Global MQTT Status Broadcaster (FIX)
 # ==========================================================
 def emit_global_mqtt_status(force_offline=False):
-    """Emit global status for dashboards, prevents flicker."""
+    """
+    Emit global status for dashboards, prevents flicker.
+    Counts come from the in-process device registry (no SQL per message);
+    `force_offline` is kept for callers that just stopped a device (the
+    registry already has it offline).
+    """
     app = _get_flask_app()
     if not app:
         return
-    
-    with app.app_context():
-        online = 1 if (_active_device_id and not force_offline) else 0
-        total = Device.query.count()
-        iso, ms = _format_time(_safe_now())
 
-        payload = {
-            "status": "connected" if online else "disconnected",
-            "devices_online": online,
-            "devices_total": total,
-            "timestamp_iso": iso if online else "--",
-            "timestamp_ms": ms if online else "--",
-        }
+    if not device_registry.is_loaded():
+        with app.app_context():
+            device_registry.load_registry()
+
+    online = device_registry.online_count()
+    total = device_registry.total_count()
+    iso, ms = _format_time(_safe_now())
+
+    payload = {
+        "status": "connected" if online else "disconnected",
+        "devices_online": online,
+        "devices_total": total,
+        "timestamp_iso": iso if online else "--",
+        "timestamp_ms": ms if online else "--",
+    }
 
-        socketio.emit("mqtt_status", payload, namespace="/")
-        print(f"[MQTT STATUS] → {payload}")
+    start_emitter(app)
+    publish_status(payload)
 
 
 # ==========================================================
 # Unified emitters
 # ==========================================================
-def _emit_all(device, temperature, humidity, pressure, status):
+def _emit_all(device_id, name, metrics, status):
     app = _get_flask_app()
     if not app:
         return
 
     now = _safe_now()
     iso, _ = _format_time(now)
+    name = name or "Unknown"
 
-    device_id = getattr(device, "id", None) if device else None
-    name = getattr(device, "name", "Unknown") if device else "Unknown"
-
-    payload = {
+    payload = dict(metrics)  # extra metric channels ride along with the core three
+    payload.update({
         "device_id": device_id,
         "device_name": name,
-        "temperature": _num(temperature),
-        "humidity": _num(humidity),
-        "pressure": _num(pressure),
+        "temperature": _num(metrics.get("temperature")),
+        "humidity": _num(metrics.get("humidity")),
+        "pressure": _num(metrics.get("pressure")),
         "status": status,
         "timestamp": iso,
-        "devices_online": 1 if status == "online" else 0,
-    }
+        "devices_online": device_registry.online_count(),
+    })
 
-    with app.app_context():
-        socketio.emit("sensor_data", payload, namespace="/")
-        socketio.emit("device_data_update", payload, namespace="/")
-        socketio.emit("dashboard_update", payload, namespace="/")
-        socketio.emit(
-            "device_status",
-            {"device_id": device_id, "status": status, "last_seen": iso},
-            namespace="/",
-        )
-
-    print(
-        f"[EMIT] → {name} {status.upper()} | "
-        f"T={payload['temperature']}°C H={payload['humidity']}% P={payload['pressure']} | {iso}"
-    )
+    # Coalesced: only the newest payload per device goes out on the next tick
+    start_emitter(app)
+    publish_reading(payload)
 
 
 # ==========================================================
 # SIMULATOR + HISTORY STORAGE
 # ==========================================================
-def _start_simulator(device, host, interval=2.0):
-    global _simulator_thread
-    _stop_simulator()
+def _start_simulator(conn, host, interval=2.0):
+    """Demo brokers get a virtual twin of the device in the shared simulator (one greenlet for all)."""
+    _stop_simulator(conn.id)
 
-    if host not in ("broker.hivemq.com", "broker.emqx.io", "test.mosquitto.org"):
+    if host not in SIMULATOR_HOSTS:
         return
 
-    _simulator_stop.clear()
-
-    def sim_loop():
-        log_info(f"[SIMULATOR] 🎮 Started for {device.name} ({host})")
-        app = _get_flask_app()
-
-        while not _simulator_stop.is_set():
-            if _active_device_id != device.id or not device.is_connected:
-                break
-
-            now = _safe_now()
-            data = {
-                "temperature": round(random.uniform(22.0, 36.0), 2),
-                "humidity": round(random.uniform(35.0, 75.0), 2),
-                "pressure": round(random.uniform(990.0, 1035.0), 2),
-            }
-
-            if app:
-                with app.app_context():
-                    # Live storage
-                    s = Sensor(
-                        device_id=device.id,
-                        topic=f"francauto/devices/{device.name}",
-                        payload=json.dumps(data),
-                        temperature=data["temperature"],
-                        humidity=data["humidity"],
-                        pressure=data["pressure"],
-                        timestamp=now,
-                    )
-                    db.session.add(s)
-
-                    # Archive storage (NEW)
-                    h = History(
-                        device_id=device.id,
-                        temperature=data["temperature"],
-                        humidity=data["humidity"],
-                        pressure=data["pressure"],
-                        timestamp=now,
-                    )
-                    db.session.add(h)
-
-                    device.last_seen = now
-                    device.status = "online"
-                    device.is_connected = True
-                    db.session.commit()
-
-            _emit_all(device, **data, status="online")
-            emit_global_mqtt_status(force_offline=False)
-            eventlet.sleep(interval)
-
-        log_info(f"[SIMULATOR] 🛑 Stopped for {device.name}")
-
-    _simulator_thread = eventlet.spawn(sim_loop)
-
-
-def _stop_simulator():
-    _simulator_stop.set()
-    global _simulator_thread
-    if _simulator_thread:
-        try:
-            _simulator_thread.kill()
-        except Exception:
-            pass
-        _simulator_thread = None
+    global _simulator
+    if _simulator is None:
+        _simulator = LoadSimulator(target="pipeline", device_timestamps=False)
+    start_ingest_writer(_get_flask_app())
+    _ensure_pipeline()
+    _simulator.add_device(conn.id, conn.name, interval)
+    _simulator.start()
+    log_info(f"[SIMULATOR] 🎮 Started for {conn.name} ({host})")
+
+
+def _stop_simulator(device_id=None):
+    """Stop one device's simulator, or all of them when device_id is None."""
+    if _simulator is None:
+        return
+    if device_id is None:
+        _simulator.clear()
+        _simulator.stop()
+    elif _simulator.remove_device(device_id):
+        log_info(f"[SIMULATOR] 🛑 Stopped for device {device_id}")
+
+
+def start_load_simulation(devices, target="pipeline", interval=None, **options):
+    """
+    Load test: drive `devices` ([(id, name), ...]) through the real message path, offline.
+    target="pipeline" hands payloads to the worker stage like the io loop does;
+    target="broker" publishes on an in-process broker stand-in routed to handle_message.
+    Other options go to LoadSimulator (shape, jitter, extra_channels, redelivery, …).
+    """
+    app = _get_flask_app()
+    start_ingest_writer(app)
+    start_emitter(app)
+    _ensure_pipeline()
+    sim = LoadSimulator(target=target, on_message=handle_message, **options)
+    for device_id, name in devices:
+        _stopped_ids.discard(device_id)
+        sim.add_device(device_id, name, interval)
+    return sim.start()
 
 
 # ==========================================================
 # REAL MQTT MESSAGE HANDLER + HISTORY
 # ==========================================================
 def handle_message(device, msg):
+    """Broker io loop callback: queue the raw bytes with their receive time, nothing else."""
+    _ensure_pipeline()
+    message_pipeline.submit(device.id, device.name, msg.payload, _safe_now())
+
+
+def _process_message(message):
+    """Pipeline worker: parse → guard → schema → latest cache → ingest queue → coalesced emit."""
     app = _get_flask_app()
     if not app:
         return
 
-    try:
-        payload_text = msg.payload.decode(errors="ignore")
-    except Exception:
-        payload_text = str(msg.payload)
+    if not schema_registry.is_loaded():
+        with app.app_context():
+            schema_registry.load_schemas()
+
+    # bytes go straight to the fast-path parser (no decode / re-encode); only the
+    # channels the message carried come back, scaled / typed by the device schema
+    device_id = message.device_id
+    if device_id in _stopped_ids and _manager.get(device_id) is None:
+        return  # queued before stop_mqtt_client: would mark the device online again
+    data, device_ts = payload_parser.parse_message(message.payload, device_id)
+
+    # redeliveries are dropped here; late readings are stored but never become "live"
+    verdict, ts = reading_guard.check(device_id, device_ts, message.received_at)
+    if verdict in (reading_guard.DUPLICATE, reading_guard.TOO_OLD):
+        return
+    data = schema_registry.apply(device_id, data)
+    if verdict == reading_guard.LATE:
+        device_registry.set_status(device_id, "online", message.received_at, message.device_name)
+    else:
+        device_registry.record_reading(device_id, message.device_name, data, ts)
+
+    # Write-behind: the ingest writer persists History + readings + Device in batches;
+    # rollups fold a late reading into the bucket of its own timestamp
+    start_ingest_writer(app)
+    enqueue_reading(
+        device_id,
+        data.get("temperature"),
+        data.get("humidity"),
+        data.get("pressure"),
+        ts,
+        metrics=data,
+    )
+
+    if verdict != reading_guard.LATE:
+        _emit_all(device_id, message.device_name, data, "online")
 
-    data = _parse_payload(payload_text)
-    now = _safe_now()
 
-    with app.app_context():
-        s = Sensor(
-            device_id=device.id,
-            topic=getattr(msg, "topic", f"francauto/devices/{device.name}"),
-            payload=json.dumps(data),
-            temperature=data["temperature"],
-            humidity=data["humidity"],
-            pressure=data["pressure"],
-            timestamp=now,
-        )
-        db.session.add(s)
-
-        h = History(
-            device_id=device.id,
-            temperature=data["temperature"],
-            humidity=data["humidity"],
-            pressure=data["pressure"],
-            timestamp=now,
-        )
-        db.session.add(h)
-
-        device.status = "online"
-        device.is_connected = True
-        device.last_seen = now
-        db.session.commit()
-
-    _emit_all(device, **data, status="online")
+def _after_message_batch():
+    # one global status per worker pass instead of one per message
     emit_global_mqtt_status(force_offline=False)
 
 
+def _ensure_pipeline():
+    message_pipeline.start_pipeline(_process_message, _after_message_batch)
+
+
 # ==========================================================
 # CONNECT / DISCONNECT
 # ==========================================================
+def _persist_status():
+    """Status changes are written right away; heartbeats stay debounced."""
+    app = _get_flask_app()
+    if app:
+        with app.app_context():
+            device_registry.persist_due()
+
+
+def _mark_offline(device):
+    device_registry.set_status(device.id, "offline", name=device.name)
+    _persist_status()
+    _emit_all(device.id, device.name, {}, "offline")
+    emit_global_mqtt_status(force_offline=True)
+
+
 def start_mqtt_client(device):
-    global _active_device_id, _mqtt_clients
+    if _manager.get(device.id):
+        log_info(f"[MQTT] ℹ️ Device {device.name} already connected.")
+        return True
 
-    with _state_lock:
-        if _active_device_id:
-            log_info(f"[MQTT] ❌ Another device already active.")
-            return False
-
-        host = (device.host or "broker.hivemq.com").strip().lower()
-        topic = f"francauto/devices/{device.name}"
-
-        if not reachable_broker(host, 1883, 3):
-            log_info(f"[MQTT] ⚠️ Broker {host} unreachable → staying offline.")
-            app = _get_flask_app()
-            if app:
-                with app.app_context():
-                    device.status = "offline"
-                    device.is_connected = False
-                    db.session.commit()
-            _emit_all(device, 0, 0, 0, "offline")
-            emit_global_mqtt_status(force_offline=True)
-            return False
+    host = (device.host or "broker.hivemq.com").strip().lower()
+    port = int(device.port or 1883)
 
-        try:
-            client = mqtt.Client()
-            client.on_connect = lambda c, u, f, rc: c.subscribe(topic)
-            client.on_message = lambda c, u, m: handle_message(device, m)
-            client.connect(host, 1883, KEEPALIVE)
-            client.loop_start()
-
-            _mqtt_clients[device.id] = client
-            _active_device_id = device.id
-
-            app = _get_flask_app()
-            if app:
-                with app.app_context():
-                    device.status = "online"
-                    device.is_connected = True
-                    device.last_seen = _safe_now()
-                    db.session.commit()
-
-            _start_simulator(device, host)
-            emit_global_mqtt_status(force_offline=False)
-            log_info(f"[MQTT] ✔ Device {device.name} started successfully")
-            return True
-
-        except Exception as e:
-            log_info(f"[MQTT] ❌ Connection failed for {device.name}: {e}")
-            app = _get_flask_app()
-            if app:
-                with app.app_context():
-                    device.status = "offline"
-                    device.is_connected = False
-                    db.session.commit()
-            _emit_all(device, 0, 0, 0, "offline")
-            emit_global_mqtt_status(force_offline=True)
-            return False
+    # a broker already shared by other devices needs no reachability probe
+    if not _manager.has_broker(device) and not reachable_broker(host, port, 3):
+        log_info(f"[MQTT] ⚠️ Broker {host} unreachable → staying offline.")
+        _mark_offline(device)
+        return False
+
+    try:
+        conn = _manager.connect(device, handle_message, KEEPALIVE)
+        _stopped_ids.discard(conn.id)
+
+        device_registry.set_status(conn.id, "online", _safe_now(), conn.name)
+        _persist_status()
+
+        _start_simulator(conn, host)
+        emit_global_mqtt_status(force_offline=False)
+        log_info(f"[MQTT] ✔ Device {conn.name} started successfully")
+        return True
+
+    except Exception as e:
+        log_info(f"[MQTT] ❌ Connection failed for {device.name}: {e}")
+        _mark_offline(device)
+        return False
 
 
 def stop_mqtt_client(device):
-    global _active_device_id, _mqtt_clients
     with _state_lock:
-        client = _mqtt_clients.pop(device.id, None)
-        _stop_simulator()
-
-        if client:
-            try:
-                client.loop_stop()
-                client.disconnect()
-            except Exception:
-                pass
-
-        _active_device_id = None
-
-        app = _get_flask_app()
-        if app:
-            with app.app_context():
-                device.status = "offline"
-                device.is_connected = False
-                device.last_seen = _safe_now()
-                db.session.commit()
-
-        _emit_all(device, 0, 0, 0, "offline")
+        _stop_simulator(device.id)
+        _manager.disconnect(device.id)
+        _stopped_ids.add(device.id)  # messages still in the pipeline inbox must not revive it
+
+        device_registry.set_status(device.id, "offline", _safe_now(), device.name)
+        _persist_status()
+
+        _emit_all(device.id, device.name, {}, "offline")
         emit_global_mqtt_status(force_offline=True)
         log_info(f"[MQTT] 🔌 Device {device.name} disconnected cleanly")
         return True
 
 
+def get_connection_states():
+    """Live per-device MQTT state (for diagnostics / metrics)."""
+    return _manager.snapshot()
+
+
+def get_broker_stats():
+    return {
+        "brokers": _manager.broker_count(),
+        "unrouted_messages": _manager.unrouted,
+        "pipeline": message_pipeline.get_pipeline_stats(),
+        "guard": reading_guard.get_guard_stats(),
+        "simulator": _simulator.stats() if _simulator is not None else None,
+    }
+
+
 # ==========================================================
 # RESET & INIT
 # ==========================================================
 def reset_all_mqtt_state():
-    global _active_device_id, _mqtt_clients
-    _active_device_id = None
-    _mqtt_clients.clear()
+    _manager.clear()
     _stop_simulator()
+    _stopped_ids.clear()
 
     app = _get_flask_app()
     if app:
@@ -400,6 +353,8 @@ def reset_all_mqtt_state():
                 d.is_connected = False
                 d.last_seen = _safe_now()
             db.session.commit()
+            device_registry.load_registry()
+            schema_registry.load_schemas()
 
     emit_global_mqtt_status(force_offline=True)
     log_info("[MQTT] 🔄 Reset all devices to offline")
@@ -407,6 +362,8 @@ def reset_all_mqtt_state():
 
 def init_mqtt_system():
     reset_all_mqtt_state()
+    start_ingest_writer(_get_flask_app())
+    _ensure_pipeline()
     log_info("[MQTT] 🧩 MQTT system initialized")
 
 
@@ -414,13 +371,15 @@ def init_mqtt_system():
 # Public wrappers
 # ==========================================================
 def start_simulator(device):
-    host = (getattr(device, "host", "") or "").strip().lower()
-    _start_simulator(device, host, 2.0)
+    conn = _manager.get(device.id)
+    if not conn:
+        return False
+    _start_simulator(conn, conn.host, 2.0)
     return True
 
 
 def stop_simulator(device):
-    _stop_simulator()
+    _stop_simulator(device.id)
     return True
 
 
@@ -435,4 +394,7 @@ __all__ = [
     "init_mqtt_system",
     "start_simulator",
     "stop_simulator",
+    "start_load_simulation",
+    "get_connection_states",
+    "get_broker_stats",
 ]
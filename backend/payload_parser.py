@@ -0,0 +1,213 @@
+# =================================================================================================
+# Franc Automation - Payload Parser (MQTT message → normalized metrics)
+# Handles:
+#   • orjson fast path straight on the message bytes (stdlib json when orjson is missing)
+#   • Lenient fallback for bare-key payloads ({temp: 21.5}) with a precompiled regex
+#   • Precompiled alias → metric table (env-extendable, overridable per device)
+#   • Arbitrary numeric channels beyond temperature / humidity / pressure
+#   • Only metrics present in the message are returned (no 0.0 placeholders)
+#   • Device-supplied reading time (ts / timestamp / time: epoch s or ms, or ISO 8601)
+#     returned beside the metrics, never stored as a channel
+#   • dumps() on the same fast path
+# =================================================================================================
+import json
+import os
+import re
+from datetime import datetime, timezone
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is the fallback
+    orjson = None
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+CORE_METRICS = ("temperature", "humidity", "pressure")
+DEFAULT_ALIASES = {
+    "temperature": ("temperature", "temp", "t"),
+    "humidity": ("humidity", "hum", "h"),
+    "pressure": ("pressure", "press", "p"),
+}
+TIMESTAMP_KEYS = ("ts", "timestamp", "time", "datetime")
+# keep numeric keys that match no alias as extra metrics (lowercased key)
+PAYLOAD_EXTRA_METRICS = os.environ.get("PAYLOAD_EXTRA_METRICS", "true").lower() in ("1", "true", "yes")
+MAX_EXTRA_METRICS = int(os.environ.get("PAYLOAD_MAX_EXTRA_METRICS", 32))
+
+_BARE_KEY_RE = re.compile(r'(\w+)\s*:')
+
+_device_maps = {}
+
+
+# ==========================================================
+# JSON
+# ==========================================================
+if orjson is not None:
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+else:
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj):
+        return json.dumps(obj)
+
+
+def _decode(payload):
+    """bytes / str → dict. Fast path first; the regex rewrite only runs for invalid JSON."""
+    try:
+        data = loads(payload)
+    except (ValueError, TypeError):
+        text = payload.decode(errors="ignore") if isinstance(payload, (bytes, bytearray)) else str(payload)
+        try:
+            data = loads(_BARE_KEY_RE.sub(r'"\1":', text))
+        except (ValueError, TypeError):
+            return {}
+    return data if isinstance(data, dict) else {}
+
+
+# ==========================================================
+# Key maps
+# ==========================================================
+def compile_key_map(aliases=None):
+    """
+    {metric: [alias, ...]} merged over DEFAULT_ALIASES → flat {alias: metric} lookup.
+    Aliases are matched case-insensitively; a per-device entry replaces the default
+    aliases of that metric.
+    """
+    merged = dict(DEFAULT_ALIASES)
+    for metric, names in (aliases or {}).items():
+        merged[str(metric).lower()] = tuple(names) if isinstance(names, (list, tuple)) else (names,)
+
+    key_map = {}
+    for metric, names in merged.items():
+        for name in names:
+            key_map[str(name).lower()] = metric
+    return key_map
+
+
+def _env_aliases():
+    raw = os.environ.get("PAYLOAD_ALIASES")  # e.g. {"temperature": ["temperature", "tmp"]}
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+_default_map = compile_key_map(_env_aliases())
+
+
+def set_device_aliases(device_id, aliases):
+    """Install (or with None, drop) a device-specific alias table."""
+    if aliases:
+        _device_maps[device_id] = compile_key_map({**(_env_aliases() or {}), **aliases})
+    else:
+        _device_maps.pop(device_id, None)
+
+
+def key_map_for(device_id=None):
+    return _device_maps.get(device_id, _default_map)
+
+
+# ==========================================================
+# Parse
+# ==========================================================
+def _num(value):
+    """Numeric value or None — missing / garbage values are not stored as 0.0."""
+    if value is None or isinstance(value, bool):
+        return float(value) if isinstance(value, bool) else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_timestamp(value):
+    """
+    Epoch seconds / milliseconds (number or numeric string) → aware UTC datetime;
+    ISO 8601 string → datetime (naive when it carries no offset). None when unusable.
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            value = float(text)
+        except ValueError:
+            try:
+                return datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith(("Z", "z")) else text)
+            except ValueError:
+                return None
+    if not isinstance(value, (int, float)) or value != value or value <= 0:
+        return None
+    if value > 1e11:  # milliseconds
+        value /= 1000.0
+    try:
+        return datetime.fromtimestamp(value, timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def parse_message(payload, device_id=None):
+    """
+    MQTT payload (bytes or str) → (metrics, device timestamp or None).
+    `metrics` is what parse() returns; a TIMESTAMP_KEYS entry is never an extra metric
+    (unless an alias table claims that key).
+    """
+    data = _decode(payload)
+    key_map = _device_maps.get(device_id, _default_map)
+
+    out = {}
+    ts = None
+    extras = 0
+    for key, value in data.items():
+        key = key.lower() if isinstance(key, str) else str(key).lower()
+        metric = key_map.get(key)
+        if metric is None and key in TIMESTAMP_KEYS:
+            ts = parse_timestamp(value) if ts is None else ts
+        elif metric is not None:
+            value = _num(value)
+            if value is not None:
+                out[metric] = value
+        elif (
+            PAYLOAD_EXTRA_METRICS
+            and extras < MAX_EXTRA_METRICS
+            and isinstance(value, (int, float))
+            and not isinstance(value, bool)
+        ):
+            out[key] = float(value)
+            extras += 1
+    return out, ts
+
+
+def parse(payload, device_id=None):
+    """
+    MQTT payload (bytes or str) → {metric: float} holding only the metrics the message
+    actually carried (aliased keys with a numeric value). Any other numeric key is kept
+    as an extra metric when PAYLOAD_EXTRA_METRICS is on. Callers read the core three
+    with .get() — a missing metric is None, never a fake 0.0.
+    """
+    return parse_message(payload, device_id)[0]
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "CORE_METRICS",
+    "DEFAULT_ALIASES",
+    "TIMESTAMP_KEYS",
+    "loads",
+    "dumps",
+    "compile_key_map",
+    "set_device_aliases",
+    "key_map_for",
+    "parse_timestamp",
+    "parse_message",
+    "parse",
+]
@@ -0,0 +1,135 @@
+# =================================================================================================
+# Franc Automation - Reading Guard (duplicate / out-of-order detection at ingest)
+# Handles:
+#   • Reading time: the device-supplied timestamp when present and sane, else the receive time
+#     (a device clock more than READING_MAX_FUTURE ahead falls back to the receive time)
+#   • Per-device window of the last READING_DEDUPE_WINDOW device timestamps (insertion-ordered
+#     dict used as an LRU): QoS≥1 redeliveries and reconnect replays are dropped in O(1)
+#   • Out-of-order readings (older than the newest one seen for the device) are flagged
+#     `late`: still stored and folded into their own rollup buckets, but never replace the
+#     live value; readings older than READING_MAX_LATE are refused
+#   • Counters: accepted / duplicates / late / lateness / clock skew / too old
+# =================================================================================================
+import os
+import threading
+from collections import OrderedDict
+
+from backend.utils.clock import aware, parse_range
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+READING_DEDUPE_WINDOW = int(os.environ.get("READING_DEDUPE_WINDOW", 256))  # keys per device, 0 = off
+READING_MAX_FUTURE = parse_range(os.environ.get("READING_MAX_FUTURE", "5m"))
+# keep within HISTORY_HOT_DAYS so a late reading never targets an already archived day
+READING_MAX_LATE = parse_range(os.environ.get("READING_MAX_LATE", "7d"))
+
+FRESH = "fresh"
+LATE = "late"
+DUPLICATE = "duplicate"
+TOO_OLD = "too_old"
+
+_windows = {}
+_lock = threading.RLock()
+
+_stats = {
+    "accepted": 0,
+    "duplicates": 0,
+    "late": 0,
+    "too_old": 0,
+    "clock_skew": 0,
+    "device_timestamps": 0,
+    "last_late_ms": 0.0,
+    "max_late_ms": 0.0,
+}
+
+
+class _Window:
+    """Recent device timestamps (oldest first) and the newest reading time of one device."""
+    __slots__ = ("keys", "newest")
+
+    def __init__(self):
+        self.keys = OrderedDict()
+        self.newest = None
+
+
+# ==========================================================
+# Check
+# ==========================================================
+def check(device_id, device_ts, received_at):
+    """
+    Classify one reading → (verdict, reading time). Verdicts: FRESH, LATE (store, do not
+    publish as live), DUPLICATE and TOO_OLD (drop). Only device timestamps identify a
+    reading, so messages without one are never treated as duplicates.
+    """
+    received_at = aware(received_at)
+    ts = received_at
+    if device_ts is not None:
+        device_ts = aware(device_ts)
+        if READING_MAX_FUTURE and device_ts - received_at > READING_MAX_FUTURE:
+            _stats["clock_skew"] += 1
+            device_ts = None
+        elif READING_MAX_LATE and received_at - device_ts > READING_MAX_LATE:
+            _stats["too_old"] += 1
+            return TOO_OLD, device_ts
+        else:
+            _stats["device_timestamps"] += 1
+            ts = device_ts
+
+    with _lock:
+        window = _windows.get(device_id)
+        if window is None:
+            window = _windows[device_id] = _Window()
+
+        if device_ts is not None and READING_DEDUPE_WINDOW > 0:
+            if ts in window.keys:
+                window.keys.move_to_end(ts)
+                _stats["duplicates"] += 1
+                return DUPLICATE, ts
+            window.keys[ts] = None
+            if len(window.keys) > READING_DEDUPE_WINDOW:
+                window.keys.popitem(last=False)
+
+        if window.newest is not None and ts < window.newest:
+            late_ms = (window.newest - ts).total_seconds() * 1000.0
+            _stats["late"] += 1
+            _stats["last_late_ms"] = round(late_ms, 3)
+            _stats["max_late_ms"] = round(max(_stats["max_late_ms"], late_ms), 3)
+            return LATE, ts
+        window.newest = ts
+
+    _stats["accepted"] += 1
+    return FRESH, ts
+
+
+def forget(device_id=None):
+    """Drop the window of one device (or of all devices)."""
+    with _lock:
+        if device_id is None:
+            _windows.clear()
+        else:
+            _windows.pop(device_id, None)
+
+
+def get_guard_stats():
+    return {
+        **_stats,
+        "devices": len(_windows),
+        "window": READING_DEDUPE_WINDOW,
+        "max_future_s": READING_MAX_FUTURE.total_seconds() if READING_MAX_FUTURE else None,
+        "max_late_s": READING_MAX_LATE.total_seconds() if READING_MAX_LATE else None,
+    }
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "FRESH",
+    "LATE",
+    "DUPLICATE",
+    "TOO_OLD",
+    "check",
+    "forget",
+    "get_guard_stats",
+]
@@ -0,0 +1,219 @@
+# =================================================================================================
+# Franc Automation - Retention Service (age-based cleanup of raw tables)
+# Handles:
+#   • Per-table retention windows: canonical raw `history` (default 30d, including archived
+#     segments), narrow `readings` (default 30d), minute rollups (default 90d); hour / day
+#     rollups are kept. The live `sensors` view is a window over history, not a table
+#   • Deletes in small batches (DELETE … WHERE id IN (SELECT … LIMIT n)), one short
+#     transaction each, yielding between batches so the ingest writer is never starved
+#   • PRAGMA incremental_vacuum after each pass, reporting rows removed + bytes reclaimed
+# =================================================================================================
+import os
+import time
+import threading
+from datetime import datetime
+
+import eventlet
+from sqlalchemy import select
+
+from backend.extensions import db
+from backend.models import History, Reading, Rollup
+from backend.utils.audit import log_info
+from backend import archive_service
+from backend.utils.clock import INDIA_TZ, parse_range
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+RETENTION_ENABLED = os.environ.get("RETENTION_ENABLED", "true").lower() in ("1", "true", "yes")
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", 600))  # seconds
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", 1000))
+RETENTION_BATCH_PAUSE = float(os.environ.get("RETENTION_BATCH_PAUSE", 0.05))  # seconds between batches
+RETENTION_VACUUM_PAGES = int(os.environ.get("RETENTION_VACUUM_PAGES", 0))  # 0 = all free pages
+
+# window strings use the same syntax as ?range= ("24h", "30d", …); "0" / "" keeps forever
+RETENTION = {
+    "history": os.environ.get("RETENTION_HISTORY", "30d"),
+    "readings": os.environ.get("RETENTION_READINGS", "30d"),
+    "rollups_minute": os.environ.get("RETENTION_ROLLUPS_MINUTE", "90d"),
+}
+
+
+_lock = threading.RLock()
+_retention_thread = None
+_flask_app = None
+
+_stats = {
+    "runs": 0,
+    "rows_removed": {name: 0 for name in RETENTION},
+    "segments_removed": 0,
+    "bytes_reclaimed": 0,
+    "batches": 0,
+    "errors": 0,
+    "last_run_at": None,
+    "last_run_ms": 0.0,
+    "last_report": None,
+}
+
+
+# ==========================================================
+# Policies
+# ==========================================================
+def _policies():
+    """(name, table, time column, extra filter) per retained table."""
+    rollups = Rollup.__table__
+    return [
+        ("history", History.__table__, History.__table__.c.timestamp, None),
+        ("readings", Reading.__table__, Reading.__table__.c.timestamp, None),
+        ("rollups_minute", rollups, rollups.c.bucket_start, rollups.c.resolution == "minute"),
+    ]
+
+
+def cutoff_for(name, now=None):
+    """Oldest timestamp to keep for a policy (None = keep forever)."""
+    window = parse_range(RETENTION.get(name))
+    if not window:
+        return None
+    now = now or datetime.now(INDIA_TZ).replace(tzinfo=None)  # stored as India wall-clock
+    return now - window
+
+
+def _delete_batches(table, column, cutoff, extra=None):
+    """Delete rows older than `cutoff`, RETENTION_BATCH_SIZE at a time. Needs an app context."""
+    condition = column < cutoff
+    if extra is not None:
+        condition = condition & extra
+    victims = select(table.c.id).where(condition).limit(RETENTION_BATCH_SIZE).scalar_subquery()
+    stmt = table.delete().where(table.c.id.in_(victims))
+
+    removed = 0
+    while True:
+        result = db.session.execute(stmt)
+        db.session.commit()
+        _stats["batches"] += 1
+        removed += result.rowcount
+        if result.rowcount < RETENTION_BATCH_SIZE:
+            return removed
+        eventlet.sleep(RETENTION_BATCH_PAUSE)  # let the ingest writer take the write lock
+
+
+# ==========================================================
+# Vacuum
+# ==========================================================
+def _db_size():
+    pages = db.session.execute(db.text("PRAGMA page_count")).scalar()
+    page_size = db.session.execute(db.text("PRAGMA page_size")).scalar()
+    free = db.session.execute(db.text("PRAGMA freelist_count")).scalar()
+    return pages * page_size, free * page_size
+
+
+def incremental_vacuum():
+    """Return free pages to the filesystem. A no-op unless auto_vacuum=INCREMENTAL."""
+    raw = db.engine.raw_connection()
+    try:
+        pages = f"({RETENTION_VACUUM_PAGES})" if RETENTION_VACUUM_PAGES > 0 else ""
+        # executescript steps the pragma to completion; cursor.execute() frees a single page
+        raw.driver_connection.executescript(f"PRAGMA incremental_vacuum{pages};")
+    finally:
+        raw.close()
+
+
+# ==========================================================
+# One pass
+# ==========================================================
+def apply_retention(now=None):
+    """Apply every policy once, vacuum, and return a report. Needs an app context."""
+    if db.engine.dialect.name != "sqlite":
+        return {}
+    size_before, _ = _db_size()
+
+    removed = {}
+    for name, table, column, extra in _policies():
+        cutoff = cutoff_for(name, now)
+        removed[name] = _delete_batches(table, column, cutoff, extra) if cutoff else 0
+        _stats["rows_removed"][name] += removed[name]
+
+    segments, segment_bytes = 0, 0
+    history_cutoff = cutoff_for("history", now)
+    if history_cutoff is not None:
+        segments, segment_bytes = archive_service.prune_before(history_cutoff.date())
+        _stats["segments_removed"] += segments
+
+    incremental_vacuum()
+    size_after, free_after = _db_size()
+    reclaimed = max(size_before - size_after, 0) + segment_bytes
+    _stats["bytes_reclaimed"] += reclaimed
+
+    return {
+        "rows_removed": removed,
+        "segments_removed": segments,
+        "bytes_reclaimed": reclaimed,
+        "db_bytes": size_after,
+        "free_bytes": free_after,  # stays > 0 when the DB predates auto_vacuum=INCREMENTAL
+    }
+
+
+def run_retention(now=None):
+    if _flask_app is None:
+        return None
+    started = time.perf_counter()
+    with _lock:
+        with _flask_app.app_context():
+            try:
+                report = apply_retention(now)
+            except Exception as e:
+                db.session.rollback()
+                _stats["errors"] += 1
+                log_info(f"[RETENTION] ❌ Pass failed: {e}")
+                return None
+    _stats["runs"] += 1
+    _stats["last_run_at"] = datetime.now(INDIA_TZ).isoformat(timespec="seconds")
+    _stats["last_run_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+    _stats["last_report"] = report
+    if report and (any(report["rows_removed"].values()) or report["segments_removed"]):
+        log_info(f"[RETENTION] 🧹 {report['rows_removed']} rows, {report['bytes_reclaimed']} bytes reclaimed")
+    return report
+
+
+# ==========================================================
+# Lifecycle
+# ==========================================================
+def _retention_loop():
+    log_info(f"[RETENTION] 🧹 Retention started (policies={RETENTION}, interval={RETENTION_INTERVAL}s)")
+    while True:
+        run_retention()
+        eventlet.sleep(RETENTION_INTERVAL)
+
+
+def start_retention(app):
+    """Start the retention greenlet once per process (idempotent)."""
+    global _retention_thread, _flask_app
+    if app is None or not RETENTION_ENABLED:
+        return False
+    _flask_app = app
+    if _retention_thread is None or _retention_thread.dead:
+        _retention_thread = eventlet.spawn(_retention_loop)
+    return True
+
+
+def get_retention_stats():
+    return {
+        **_stats,
+        "enabled": RETENTION_ENABLED,
+        "policies": RETENTION,
+        "batch_size": RETENTION_BATCH_SIZE,
+        "interval_s": RETENTION_INTERVAL,
+        "running": _retention_thread is not None and not _retention_thread.dead,
+    }
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "apply_retention",
+    "run_retention",
+    "incremental_vacuum",
+    "start_retention",
+    "get_retention_stats",
+]
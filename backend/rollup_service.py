@@ -0,0 +1,216 @@
+# =================================================================================================
+# Franc Automation - Rollup Service (time-bucketed aggregates)
+# Handles:
+#   • min / max / avg / count / last of temperature, humidity, pressure per device
+#     per minute, hour and day bucket (rollups table)
+#   • Incremental maintenance: each ingest batch is folded in Python, then upserted with
+#     ONE executemany INSERT … ON CONFLICT DO UPDATE inside the writer's transaction
+#   • Backfill from the history table + archived segments (scripts/backfill_rollups.py)
+#   • Resolution picking (range reads live in backend/timeseries.py)
+# =================================================================================================
+import os
+from datetime import timedelta
+
+from sqlalchemy import func, case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from backend.extensions import db
+from backend.models import History, Rollup, ROLLUP_METRICS
+from backend.utils.audit import log_info
+from backend.utils.clock import wall_clock
+from backend import archive_service
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+ROLLUPS_ENABLED = os.environ.get("ROLLUPS_ENABLED", "true").lower() in ("1", "true", "yes")
+ROLLUP_MAX_POINTS = int(os.environ.get("ROLLUP_MAX_POINTS", 500))  # buckets per device per response
+
+# finest → coarsest
+RESOLUTIONS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# ==========================================================
+# Buckets
+# ==========================================================
+def bucket_start(ts, resolution):
+    ts = wall_clock(ts)
+    if resolution == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"unknown resolution: {resolution}")
+
+
+def _empty_bucket(device_id, resolution, start):
+    row = {
+        "device_id": device_id,
+        "resolution": resolution,
+        "bucket_start": start,
+        "count": 0,
+        "last_ts": None,
+    }
+    for m in ROLLUP_METRICS:
+        row.update({f"{m}_min": None, f"{m}_max": None, f"{m}_sum": 0.0, f"{m}_count": 0, f"{m}_last": None})
+    return row
+
+
+def fold_readings(readings):
+    """
+    Aggregate readings (dicts with device_id, timestamp and metric keys) into
+    one partial row per (device, resolution, bucket).
+    """
+    buckets = {}
+    for r in readings:
+        ts = r.get("timestamp")
+        if ts is None or r.get("device_id") is None:
+            continue
+        ts = wall_clock(ts)
+        for resolution in RESOLUTIONS:
+            start = bucket_start(ts, resolution)
+            key = (r["device_id"], resolution, start)
+            row = buckets.get(key)
+            if row is None:
+                row = buckets[key] = _empty_bucket(r["device_id"], resolution, start)
+
+            row["count"] += 1
+            newest = row["last_ts"] is None or ts >= row["last_ts"]
+            if newest:
+                row["last_ts"] = ts
+            for m in ROLLUP_METRICS:
+                v = r.get(m)
+                if v is None:
+                    continue
+                row[f"{m}_min"] = v if row[f"{m}_min"] is None else min(row[f"{m}_min"], v)
+                row[f"{m}_max"] = v if row[f"{m}_max"] is None else max(row[f"{m}_max"], v)
+                row[f"{m}_sum"] += v
+                row[f"{m}_count"] += 1
+                if newest:
+                    row[f"{m}_last"] = v
+    return list(buckets.values())
+
+
+# ==========================================================
+# Upsert
+# ==========================================================
+def _upsert_statement():
+    t = Rollup.__table__
+    stmt = sqlite_insert(t)
+    ex = stmt.excluded
+    newer = func.coalesce(ex.last_ts >= t.c.last_ts, True)
+
+    def _pick(a, b, fn):
+        # SQLite's scalar min()/max() return NULL if either side is NULL
+        return fn(func.coalesce(a, b), func.coalesce(b, a))
+
+    set_ = {
+        "count": t.c.count + ex.count,
+        "last_ts": case((newer, ex.last_ts), else_=t.c.last_ts),
+    }
+    for m in ROLLUP_METRICS:
+        set_[f"{m}_min"] = _pick(t.c[f"{m}_min"], ex[f"{m}_min"], func.min)
+        set_[f"{m}_max"] = _pick(t.c[f"{m}_max"], ex[f"{m}_max"], func.max)
+        set_[f"{m}_sum"] = t.c[f"{m}_sum"] + ex[f"{m}_sum"]
+        set_[f"{m}_count"] = t.c[f"{m}_count"] + ex[f"{m}_count"]
+        set_[f"{m}_last"] = case((newer, func.coalesce(ex[f"{m}_last"], t.c[f"{m}_last"])), else_=t.c[f"{m}_last"])
+
+    return stmt.on_conflict_do_update(
+        index_elements=["device_id", "resolution", "bucket_start"],
+        set_=set_,
+    )
+
+
+_UPSERT = _upsert_statement()
+
+
+def write_rollups(session, readings):
+    """Fold and upsert inside the caller's transaction. Returns the number of bucket rows touched."""
+    if not ROLLUPS_ENABLED:
+        return 0
+    rows = fold_readings(readings)
+    if rows:
+        session.execute(_UPSERT, rows)
+    return len(rows)
+
+
+# ==========================================================
+# Backfill
+# ==========================================================
+def backfill_rollups(since=None, device_id=None, chunk_size=5000):
+    """
+    Rebuild rollups from the history table and the archived segments. Needs an app context.
+    Buckets from the start of `since`'s day onward are deleted first, so the
+    run is repeatable; stop the ingest writer while it runs.
+    """
+    since = bucket_start(since, "day") if since else None
+
+    wipe = Rollup.query
+    source = History.query.order_by(History.id)
+    if since is not None:
+        wipe = wipe.filter(Rollup.bucket_start >= since)
+        source = source.filter(History.timestamp >= since)
+    if device_id is not None:
+        wipe = wipe.filter(Rollup.device_id == device_id)
+        source = source.filter(History.device_id == device_id)
+
+    wipe.delete(synchronize_session=False)
+
+    folded = 0
+    pending = []
+    columns = ("device_id", "timestamp") + ROLLUP_METRICS
+    for rec in source.with_entities(*(getattr(History, c) for c in columns)).yield_per(chunk_size):
+        pending.append(dict(zip(columns, rec)))
+        if len(pending) >= chunk_size:
+            write_rollups(db.session, pending)
+            folded += len(pending)
+            pending = []
+    if pending:
+        write_rollups(db.session, pending)
+        folded += len(pending)
+
+    for dev, _day, segment in archive_service.iter_segments(since, device_id):
+        for offset in range(0, len(segment), chunk_size):
+            part = segment[offset:offset + chunk_size]
+            rows = [{"device_id": dev, "timestamp": ts} for ts in part["ts"].tolist()]
+            for m in ROLLUP_METRICS:
+                for row, v in zip(rows, part[m].tolist()):
+                    row[m] = None if v != v else v  # NaN → NULL
+            write_rollups(db.session, rows)
+            folded += len(rows)
+
+    db.session.commit()
+    log_info(f"[ROLLUP] ♻️ Backfilled {folded} history rows (since={since}, device={device_id})")
+    return folded
+
+
+# ==========================================================
+# Resolution
+# ==========================================================
+def pick_resolution(span, max_points=None):
+    """
+    Coarsest-needed resolution for a time span: the finest bucket size that keeps
+    the series within `max_points` buckets per device (day if nothing fits).
+    """
+    max_points = max_points or ROLLUP_MAX_POINTS
+    for name, size in RESOLUTIONS.items():
+        if span / size <= max_points:
+            return name
+    return "day"
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "RESOLUTIONS",
+    "bucket_start",
+    "fold_readings",
+    "write_rollups",
+    "backfill_rollups",
+    "pick_resolution",
+]
@@ -1,18 +1,19 @@
 # ==========================================================
 # backend/routes/dashboard_routes.py — Unified Dashboard API (Enhanced)
 # ==========================================================
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from backend.extensions import db, socketio
-from backend.models import Sensor, Device
-from sqlalchemy import desc
-from datetime import datetime
-from pytz import timezone
+from datetime import timedelta
 from backend.utils.dashboard import emit_dashboard_update
 from backend.mqtt_service import emit_global_mqtt_status
+from backend.emit_service import GLOBAL_ROOM, LEGACY_ROOM
 from backend.utils.audit import log_info
+from backend.utils.http_cache import not_modified, with_etag
+from backend import device_registry, timeseries
+from backend.utils.clock import INDIA_TZ, aware, now, parse_range
+from backend.utils.downsample import METHODS
 
 dashboard_bp = Blueprint("dashboard_bp", __name__, url_prefix="/api")
-INDIA_TZ = timezone("Asia/Kolkata")
 
 
 def _num(v, default=0.0):
@@ -34,13 +35,19 @@ def get_current_data():
     Returns the latest sensor data and overall dashboard metrics.
     Always returns numeric values for temperature/humidity/pressure
     so frontend code that calls toFixed() won't crash.
+    Served from the latest-value cache with ETag / If-None-Match.
     """
-    latest = Sensor.query.order_by(desc(Sensor.timestamp)).first()
-    devices_online = Device.query.filter_by(status="online").count()
-    total_devices = Device.query.count()
+    etag = f"current-{device_registry.cache_token()}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
 
-    if not latest:
-        return jsonify({
+    state = timeseries.latest_state()  # global latest-value cache, no SQL
+    devices_online = device_registry.online_count()
+    total_devices = device_registry.total_count()
+
+    if not state:
+        return with_etag(jsonify({
             "temperature": 0.0,
             "humidity": 0.0,
             "pressure": 0.0,
@@ -49,46 +56,95 @@ def get_current_data():
             "status": "offline",
             "timestamp_iso": "--",
             "timestamp_ms": 0,
-        }), 200
+        }), etag), 200
 
+    latest = state.latest
     data = {
-        "temperature": round(_num(latest.temperature, 0.0), 2),
-        "humidity": round(_num(latest.humidity, 0.0), 2),
-        "pressure": round(_num(latest.pressure, 0.0), 2),
+        "temperature": round(_num(latest.get("temperature"), 0.0), 2),
+        "humidity": round(_num(latest.get("humidity"), 0.0), 2),
+        "pressure": round(_num(latest.get("pressure"), 0.0), 2),
         "devices_online": devices_online,
         "devices_total": total_devices,
         "status": "online" if devices_online > 0 else "offline",
-        "timestamp_iso": latest.timestamp.astimezone(INDIA_TZ).isoformat(timespec="milliseconds"),
-        "timestamp_ms": int(latest.timestamp.timestamp() * 1000),
+        "timestamp_iso": state.latest_ts.astimezone(INDIA_TZ).isoformat(timespec="milliseconds"),
+        "timestamp_ms": int(state.latest_ts.timestamp() * 1000),
     }
     log_info(f"[DASHBOARD] 📊 Latest data served: {data}")
-    return jsonify(data), 200
+    return with_etag(jsonify(data), etag), 200
 
 
 # ==========================================================
 # 📈 Chart Data (Recent 50 readings for visualization)
 # ==========================================================
+CHART_DEFAULT_RANGE = "1h"
+CHART_DEFAULT_POINTS = 500
+CHART_MAX_POINTS = 5000
+CHART_METRICS = timeseries.METRICS
+
+
 @dashboard_bp.route("/dashboard/chart", methods=["GET"])
 def get_chart_data():
     """
     Returns the 50 most recent sensor readings for dashboard charts.
+    With ?range=5m|24h|30d and/or ?points=N, returns at most N points per device
+    for the whole range, downsampled on the server:
+      &method=lttb (default) | minmax   &metric=temperature (drives point selection)
+      &device_id=1
     Ensures numeric types for charting.
     """
-    records = Sensor.query.order_by(desc(Sensor.timestamp)).limit(50).all()
+    span = parse_range(request.args.get("range"))
+    points = request.args.get("points", type=int)
+    if span is not None or points is not None:
+        return _downsampled_chart(
+            span or parse_range(CHART_DEFAULT_RANGE),
+            min(max(points or CHART_DEFAULT_POINTS, 2), CHART_MAX_POINTS),
+        )
+
+    series = timeseries.query(source="raw", limit=50, newest_first=True)
     chart_data = [
         {
-            "timestamp": s.timestamp.astimezone(INDIA_TZ).strftime("%H:%M:%S"),
-            "temperature": _num(s.temperature, 0.0),
-            "humidity": _num(s.humidity, 0.0),
-            "pressure": _num(s.pressure, 0.0),
+            "timestamp": aware(ts).strftime("%H:%M:%S"),
+            "temperature": _num(temperature, 0.0),
+            "humidity": _num(humidity, 0.0),
+            "pressure": _num(pressure, 0.0),
         }
-        for s in reversed(records)
+        for _device_id, ts, temperature, humidity, pressure in reversed(series.rows)
     ]
 
     log_info(f"[DASHBOARD] 📈 Chart data returned ({len(chart_data)} points)")
     return jsonify(chart_data), 200
 
 
+def _downsampled_chart(span, points):
+    method = request.args.get("method", "lttb")
+    metric = request.args.get("metric", "temperature")
+    try:
+        series = timeseries.query(
+            span=span, devices=request.args.get("device_id", type=int),
+            points=points, method=method, by=metric,
+        )
+    except ValueError:
+        return jsonify({"error": f"method must be one of {METHODS}, metric one of {CHART_METRICS}"}), 400
+
+    label = "%H:%M:%S" if span <= timedelta(days=1) else "%d %b %H:%M"
+    chart_data = [
+        {
+            "timestamp": ts.strftime(label),
+            "timestamp_ms": int(aware(ts).timestamp() * 1000),
+            "device_id": device_id,
+            "temperature": _num(temperature, 0.0),
+            "humidity": _num(humidity, 0.0),
+            "pressure": _num(pressure, 0.0),
+        }
+        for device_id, ts, temperature, humidity, pressure in series.rows
+    ]
+
+    log_info(
+        f"[DASHBOARD] 📈 Chart data returned ({len(chart_data)} {series.resolution or series.source} points, {method})"
+    )
+    return jsonify(chart_data), 200
+
+
 # ==========================================================
 # 💻 Device summary for dashboard sidebar
 # ==========================================================
@@ -98,9 +154,8 @@ def get_device_summary():
     Returns a summary of total, online, and offline devices;
     emits updates to socket clients as a side-effect.
     """
-    devices = Device.query.all()
-    total = len(devices)
-    online = sum(1 for d in devices if d.status == "online")
+    total = device_registry.total_count()
+    online = device_registry.online_count()
     offline = total - online
 
     data = {
@@ -108,7 +163,7 @@ def get_device_summary():
         "online": online,
         "offline": offline,
         "mqtt_status": "connected" if online > 0 else "disconnected",
-        "timestamp_iso": datetime.now(INDIA_TZ).isoformat(timespec="milliseconds"),
+        "timestamp_iso": now().isoformat(timespec="milliseconds"),
     }
 
     # Push real-time updates to all dashboards
@@ -130,4 +185,5 @@ def handle_new_sensor_data(data):
     """
     # do not mutate client payload; ensure callers send numeric fields
     log_info(f"[SOCKET] 🔄 Broadcasting dashboard update: {data}")
-    socketio.emit("dashboard_update", data)
+    socketio.emit("dashboard_update", data, to=LEGACY_ROOM)
+    socketio.emit("dashboard_update", data, to=GLOBAL_ROOM)
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from backend.models import db, Dashboard, DashboardWidget, User
+from backend.emit_service import forget_dashboard
 from functools import wraps
 
 dashboards_bp = Blueprint("dashboards", __name__, url_prefix="/api")
@@ -105,6 +106,7 @@ def delete_dashboard(current_user, dash_id):
     # Delete dashboard + widgets
     db.session.delete(dash)
     db.session.commit()
+    forget_dashboard(dash_id)
 
     return jsonify({
         "status": "success",
@@ -2,27 +2,16 @@
 # backend/routes/data_routes.py — Fixed version (no tzinfo error)
 # ==========================================================
 from flask import Blueprint, jsonify, request
-from backend.extensions import db
-from backend.models import Sensor, Device
+from backend.models import Sensor
 from backend.utils.dashboard import emit_dashboard_update
+from backend.utils.http_cache import not_modified, with_etag
+from backend.utils.pagination import PageError, keyset_page, with_next_cursor
 from backend.mqtt_service import emit_global_mqtt_status
-from datetime import datetime, timedelta
-from pytz import timezone
+from backend import device_registry, timeseries
+from backend.utils.clock import now, parse_range
+from datetime import timedelta
 
 data_bp = Blueprint("data_bp", __name__, url_prefix="/api")
-INDIA_TZ = timezone("Asia/Kolkata")
-
-
-# ----------------------------------------------------------
-# Helper to safely localize datetime
-# ----------------------------------------------------------
-def _aware(dt):
-    """Return a timezone-aware datetime (for Python values, not SQLAlchemy columns)."""
-    if isinstance(dt, datetime):
-        if dt.tzinfo is None:
-            return INDIA_TZ.localize(dt)
-        return dt.astimezone(INDIA_TZ)
-    return dt
 
 
 # ----------------------------------------------------------
@@ -30,18 +19,19 @@ def _aware(dt):
 # ----------------------------------------------------------
 @data_bp.route("/data/latest", methods=["GET"])
 def get_latest():
-    now = _aware(datetime.now())
-    cutoff = now - timedelta(minutes=5)
-
-    # ✅ Fetch latest record safely (no tzinfo checks on column)
-    latest = (
-        Sensor.query.order_by(Sensor.timestamp.desc())
-        .filter(Sensor.timestamp >= cutoff)
-        .first()
-    )
+    """Served from the in-process latest-value cache; unchanged polls get a 304."""
+    cutoff = now() - timedelta(minutes=5)
+
+    state = timeseries.latest_state()
+    fresh = state is not None and state.latest_ts >= cutoff
 
-    if not latest:
-        return jsonify({
+    etag = f"latest-{device_registry.cache_token()}-{int(fresh)}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    if not fresh:
+        return with_etag(jsonify({
             "device_name": "No Device",
             "temperature": None,
             "humidity": None,
@@ -49,22 +39,20 @@ def get_latest():
             "status": "offline",
             "timestamp": None,
             "devices_online": 0,
-        }), 200
-
-    device = Device.query.get(latest.device_id)
-    online_devices = Device.query.filter_by(is_connected=True).count()
+        }), etag), 200
 
+    latest = state.latest
     data = {
-        "device_name": device.name if device else "Unknown",
-        "temperature": latest.temperature,
-        "humidity": latest.humidity,
-        "pressure": latest.pressure,
-        "status": "online" if device and device.is_connected else "offline",
-        "timestamp": latest.timestamp.isoformat(timespec="seconds"),
-        "devices_online": online_devices,
+        "device_name": state.name,
+        "temperature": latest.get("temperature"),
+        "humidity": latest.get("humidity"),
+        "pressure": latest.get("pressure"),
+        "status": state.status,
+        "timestamp": state.latest_ts.isoformat(timespec="seconds"),
+        "devices_online": device_registry.online_count(),
     }
 
-    return jsonify(data), 200
+    return with_etag(jsonify(data), etag), 200
 
 
 # ----------------------------------------------------------
@@ -72,24 +60,19 @@ def get_latest():
 # ----------------------------------------------------------
 @data_bp.route("/data/recent", methods=["GET"])
 def get_recent():
-    now = _aware(datetime.now())
-    cutoff = now - timedelta(minutes=10)
-    sensors = (
-        Sensor.query.filter(Sensor.timestamp >= cutoff)
-        .order_by(Sensor.timestamp.desc())
-        .limit(50)
-        .all()
+    series = timeseries.query(
+        span=timedelta(minutes=10), source="raw", limit=50, newest_first=True, with_names=True,
     )
 
     return jsonify([
         {
-            "device_name": Device.query.get(s.device_id).name if s.device_id else "Unknown",
-            "temperature": s.temperature,
-            "humidity": s.humidity,
-            "pressure": s.pressure,
-            "timestamp": s.timestamp.isoformat(timespec="seconds"),
+            "device_name": device_name or "Unknown",
+            "temperature": temperature,
+            "humidity": humidity,
+            "pressure": pressure,
+            "timestamp": timestamp.isoformat(timespec="seconds"),
         }
-        for s in sensors
+        for _device_id, timestamp, temperature, humidity, pressure, device_name in series.rows
     ]), 200
 
 
@@ -103,37 +86,56 @@ def emit_data_update():
     return jsonify({"message": "Dashboard update emitted"}), 200
 
 # ==========================================================
-# New Route: Get all sensor data in JSON format
+# Sensor readings, keyset-paginated (100 per page by default), LIVE_WINDOW unless ?from=
+# ?device_id=&from=&to=&fields=&limit=&order=&cursor= ; next page token in X-Next-Cursor
 # ==========================================================
-from flask import Blueprint, jsonify
-from backend.models import Sensor
-from backend.extensions import db
+ALL_DATA_COLUMNS = {
+    c: getattr(Sensor, c)
+    for c in ("id", "device_id", "topic", "payload", "temperature", "humidity", "pressure", "timestamp", "raw_data")
+}
 
-data_bp = Blueprint("data_bp", __name__)
 
-@data_bp.route("/api/data/all", methods=["GET"])
+@data_bp.route("/data/all", methods=["GET"])
 def get_all_sensor_data():
-    sensors = Sensor.query.order_by(Sensor.id.desc()).limit(100).all()  # limit to 100 for performance
-    return jsonify([s.to_dict() for s in sensors])
+    try:
+        rows, next_cursor = keyset_page(
+            Sensor, ALL_DATA_COLUMNS, request.args, default_limit=100, window=timeseries.LIVE_WINDOW,
+        )
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
+    return with_next_cursor(jsonify(rows), next_cursor)
 
 # ==========================================================
 # New Route: Get all sensor data in JSON format
 # ==========================================================
-@data_bp.route("/api/data/history", methods=["GET"])
+@data_bp.route("/data/history", methods=["GET"])
 def get_history():
-    """Return last 7 days of sensor data grouped by date"""
-    now = datetime.utcnow()
-    start = now - timedelta(days=7)
-
-    sensors = (
-        Sensor.query.filter(Sensor.timestamp >= start)
-        .order_by(Sensor.timestamp.desc())
-        .all()
+    """Return last 7 days of sensor data grouped by date (hourly rollups)"""
+    series = timeseries.query(
+        span=timedelta(days=7), devices=request.args.get("device_id", type=int), agg="all", source="rollup",
     )
+    return jsonify(series.by_day())
 
-    grouped = {}
-    for s in sensors:
-        date_key = s.timestamp.strftime("%Y-%m-%d")
-        grouped.setdefault(date_key, []).append(s.to_dict())
 
-    return jsonify(grouped)
\ No newline at end of file
+# ==========================================================
+# Any channel(s), any range — schema-driven series
+# ?metrics=vibration,current&range=24h&device_id=3&bucket=hour&agg=max&points=300
+# No range → latest values from the cache.
+# ==========================================================
+@data_bp.route("/data/series", methods=["GET"])
+def get_series():
+    metrics = [m.strip().lower() for m in request.args.get("metrics", "").split(",") if m.strip()]
+    span = parse_range(request.args.get("range"))
+    try:
+        series = timeseries.query(
+            span=span,
+            devices=request.args.get("device_id", type=int),
+            metrics=metrics or timeseries.METRICS,
+            agg=request.args.get("agg", "avg"),
+            bucket=request.args.get("bucket"),
+            points=request.args.get("points", type=int),
+            method=request.args.get("method", "lttb"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"source": series.source, "resolution": series.resolution, "data": series.records()}), 200
@@ -12,11 +12,11 @@ from backend.mqtt_service import (
     stop_simulator,
 )
 from backend.utils.audit import log_info
+from backend import device_registry, schema_registry
+from backend.utils.clock import INDIA_TZ
 from datetime import datetime
-from pytz import timezone
 
 device_bp = Blueprint("device_bp", __name__, url_prefix="/api")
-INDIA_TZ = timezone("Asia/Kolkata")
 
 # ==========================================================
 # 🧩 Get all devices
@@ -24,17 +24,20 @@ INDIA_TZ = timezone("Asia/Kolkata")
 @device_bp.route("/devices", methods=["GET"])
 def get_all_devices():
     devices = Device.query.all()
-    data = [
-        {
+    data = []
+    for d in devices:
+        # heartbeat columns are persisted lazily — the registry has the live values
+        state = device_registry.get(d.id)
+        status = state.status if state else d.status
+        last_seen = state.last_seen if state and state.last_seen else d.last_seen
+        data.append({
             "id": d.id,
             "name": d.name,
             "host": d.host,
-            "status": d.status,
-            "is_connected": d.is_connected,
-            "last_seen": d.last_seen.isoformat(timespec="seconds") if d.last_seen else None,
-        }
-        for d in devices
-    ]
+            "status": status,
+            "is_connected": status == "online" if state else d.is_connected,
+            "last_seen": last_seen.isoformat(timespec="seconds") if last_seen else None,
+        })
     return jsonify(data), 200
 
 
@@ -110,7 +113,39 @@ def delete_device(device_id):
 
     db.session.delete(device)
     db.session.commit()
+    schema_registry.forget_device(device_id)
 
     log_info(f"[DEVICE] ❌ Deleted device: {device.name}")
     emit_global_mqtt_status()
     return jsonify({"message": "Device deleted successfully"}), 200
+
+
+# ==========================================================
+# 📐 Device metric schema (channels, units, types, scaling, aliases)
+# PUT body: {"metrics": [{"name": "vibration", "unit": "mm/s", "type": "float",
+#                         "scale": 0.01, "offset": 0, "aliases": ["vib", "v_rms"]}]}
+# Channels not listed are kept; unknown channels a device sends are added as floats.
+# ==========================================================
+@device_bp.route("/devices/<int:device_id>/schema", methods=["GET"])
+def get_device_schema(device_id):
+    if not Device.query.get(device_id):
+        return jsonify({"error": "Device not found"}), 404
+    return jsonify([m.to_dict() for m in schema_registry.get_schema(device_id)]), 200
+
+
+@device_bp.route("/devices/<int:device_id>/schema", methods=["PUT"])
+def update_device_schema(device_id):
+    device = Device.query.get(device_id)
+    if not device:
+        return jsonify({"error": "Device not found"}), 404
+
+    metrics = (request.get_json() or {}).get("metrics")
+    if not isinstance(metrics, list):
+        return jsonify({"error": "Body must be {\"metrics\": [...]}"}), 400
+    try:
+        schema = schema_registry.set_schema(device_id, metrics)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    log_info(f"[DEVICE] 📐 Schema updated for {device.name}: {[m.name for m in schema]}")
+    return jsonify([m.to_dict() for m in schema]), 200
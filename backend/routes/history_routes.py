@@ -1,114 +1,187 @@
 # ======================================
-# history_routes.py — Export Per Day | FIXED
+# history_routes.py — Export Per Day / Range | Streamed
 # ======================================
 
-from flask import Blueprint, jsonify, request, make_response
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from datetime import datetime, timedelta
-from io import BytesIO
+from io import StringIO
 import csv
 import json
+import heapq
 
 from backend.models import db, History
+from backend import archive_service, timeseries
+from backend.utils.clock import INDIA_TZ, parse_range
+from backend.utils.pagination import PageError, keyset_page, parse_bound
 
 # Correct Blueprint URL prefix matching frontend calls
 history_bp = Blueprint("history", __name__, url_prefix="/api/history")
 
 # Default days range
 DAYS = 7
+EXPORT_CHUNK = 2000  # rows per DB fetch / per streamed chunk
+EXPORT_COLUMNS = ("id", "device_id", "temperature", "humidity", "pressure", "timestamp")
 
 # ======================================
 # GET: Grouped History JSON (Last 7 Days)
+# Served from rollups (hourly for 7 days), not raw rows
+# Optional: ?range=24h|7d|30d  or  ?from=...&to=... (as the exports)  ?device_id=1
+#           ?points=200&method=lttb|minmax&metric=temperature (per device)
 # ======================================
 @history_bp.route("/", methods=["GET"])
 def get_history():
-    since = datetime.utcnow() - timedelta(days=DAYS)
+    start = end = None
+    if request.args.get("from"):
+        try:
+            start, end, _label = _export_range()
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e) or "Invalid date format"}), 400
+    try:
+        series = timeseries.query(
+            span=None if start else parse_range(request.args.get("range"), timedelta(days=DAYS)),
+            start=start,
+            end=end,
+            devices=request.args.get("device_id", type=int),
+            agg="all",
+            source="rollup",
+            points=request.args.get("points", type=int),
+            method=request.args.get("method", "lttb"),
+            by=request.args.get("metric", "temperature"),
+        )
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid method or metric"}), 400
 
-    records = (
-        History.query.filter(History.timestamp >= since)
-        .order_by(History.timestamp.desc())
-        .all()
-    )
+    return jsonify({"status": "success", "resolution": series.resolution, "data": series.by_day()})
+
+
+# ======================================
+# GET: Raw history rows, keyset-paginated on (timestamp, id)
+# Example: /api/history/rows?device_id=3&from=2025-11-01&to=2025-11-30&fields=temperature,timestamp
+#          then repeat with &cursor=<next_cursor> until it comes back null
+# Archived days (memory-mapped segments) are merged in, as in the exports below.
+# ======================================
+ROW_COLUMNS = {c: getattr(History, c) for c in EXPORT_COLUMNS}
+
+
+def _archived_rows(start, end, device_id, descending):
+    for row in archive_service.iter_rows(start, end, device_id, descending):
+        yield dict(zip(EXPORT_COLUMNS, row))
 
-    grouped = {}
-    for rec in records:
-        date_key = rec.timestamp.strftime("%Y-%m-%d")
-        if date_key not in grouped:
-            grouped[date_key] = []
-        grouped[date_key].append(rec.to_dict())
 
-    return jsonify({"status": "success", "data": grouped})
+@history_bp.route("/rows", methods=["GET"])
+def get_history_rows():
+    try:
+        rows, next_cursor = keyset_page(History, ROW_COLUMNS, request.args, archive=_archived_rows)
+    except PageError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "data": rows, "next_cursor": next_cursor})
 
 
 # ======================================
-# EXPORT JSON (per-day)
-# Example: /api/history/export/json?date=2025-11-21
+# Export helpers — rows are streamed, never materialized
 # ======================================
-@history_bp.route("/export/json", methods=["GET"])
-def export_json():
+def _export_range():
+    """
+    ?date=YYYY-MM-DD (one day) or ?from=...&to=... (date or ISO datetime; a date-only
+    `to` includes that whole day). Returns (start, end, label) or raises ValueError.
+    """
     date = request.args.get("date")
-    if not date:
-        return jsonify({"status": "error", "message": "Missing ?date=YYYY-MM-DD"}), 400
+    if date:
+        start, _ = parse_bound(date)
+        return start, start + timedelta(days=1), date
+
+    start_arg, end_arg = request.args.get("from"), request.args.get("to")
+    if not start_arg:
+        raise ValueError("Missing ?date=YYYY-MM-DD or ?from=...&to=...")
+    start, _ = parse_bound(start_arg)
+    if end_arg:
+        end, date_only = parse_bound(end_arg)
+        if date_only:
+            end += timedelta(days=1)
+    else:
+        end = datetime.now(INDIA_TZ).replace(tzinfo=None)
+    if end <= start:
+        raise ValueError("`to` must be after `from`")
+    return start, end, f"{start_arg}_{end_arg or 'now'}".replace(":", "")
+
+
+def _export_rows(start, end, device_id=None):
+    """
+    Plain tuples in timestamp order: hot rows fetched EXPORT_CHUNK at a time from one
+    cursor, merged with archived days read from memory-mapped segments.
+    """
+    query = db.session.query(*(getattr(History, c) for c in EXPORT_COLUMNS)).filter(
+        History.timestamp >= start, History.timestamp < end
+    )
+    if device_id is not None:
+        query = query.filter(History.device_id == device_id)
+    hot = query.order_by(History.timestamp).yield_per(EXPORT_CHUNK)
+    cold = archive_service.iter_rows(start, end, device_id)
+    return heapq.merge(cold, hot, key=lambda r: r[-1])
+
 
+def _stream_export(fmt):
     try:
-        start = datetime.strptime(date, "%Y-%m-%d")
-    except ValueError:
-        return jsonify({"status": "error", "message": "Invalid date format"}), 400
+        start, end, label = _export_range()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e) or "Invalid date format"}), 400
 
-    end = start + timedelta(days=1)
+    rows = _export_rows(start, end, request.args.get("device_id", type=int))
+    generate, mimetype = (_csv_chunks, "text/csv") if fmt == "csv" else (_json_chunks, "application/json")
 
-    records = History.query.filter(
-        History.timestamp >= start, History.timestamp < end
-    ).all()
+    response = Response(stream_with_context(generate(rows)), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=history_{label}.{fmt}"
+    return response
 
-    payload = [r.to_dict() for r in records]
 
-    response = make_response(json.dumps(payload, indent=2))
-    response.headers["Content-Disposition"] = f"attachment; filename=history_{date}.json"
-    response.headers["Content-Type"] = "application/json"
-    return response
+def _csv_chunks(rows):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS[1:])
+
+    pending = 0
+    for _id, device_id, temperature, humidity, pressure, ts in rows:
+        writer.writerow([device_id, temperature, humidity, pressure, ts.isoformat()])
+        pending += 1
+        if pending >= EXPORT_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def _json_chunks(rows):
+    yield "["
+    chunk = []
+    first = True
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, row))
+        record["timestamp"] = record["timestamp"].isoformat() if record["timestamp"] else None
+        chunk.append(("\n  " if first else ",\n  ") + json.dumps(record))
+        first = False
+        if len(chunk) >= EXPORT_CHUNK:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("\n]" if not first else "]")
+    yield "".join(chunk)
+
+
+# ======================================
+# EXPORT JSON (per-day or range)
+# Example: /api/history/export/json?date=2025-11-21
+#          /api/history/export/json?from=2025-11-01&to=2025-11-30&device_id=3
+# ======================================
+@history_bp.route("/export/json", methods=["GET"])
+def export_json():
+    return _stream_export("json")
 
 
 # ======================================
-# EXPORT CSV (per-day)
+# EXPORT CSV (per-day or range)
 # Example: /api/history/export/csv?date=2025-11-21
+#          /api/history/export/csv?from=2025-11-21T06:00:00&to=2025-11-21T18:00:00
 # ======================================
 @history_bp.route("/export/csv", methods=["GET"])
 def export_csv():
-    date = request.args.get("date")
-    if not date:
-        return jsonify({"status": "error", "message": "Missing ?date=YYYY-MM-DD"}), 400
-
-    try:
-        start = datetime.strptime(date, "%Y-%m-%d")
-    except ValueError:
-        return jsonify({"status": "error", "message": "Invalid date format"}), 400
-
-    end = start + timedelta(days=1)
-
-    records = History.query.filter(
-        History.timestamp >= start, History.timestamp < end
-    ).all()
-
-    output = BytesIO()
-    writer = csv.writer(output)
-    writer.writerow(["device_id", "temperature", "humidity", "pressure", "timestamp"])
-
-    for r in records:
-        writer.writerow(
-            [
-                r.device_id,
-                r.temperature,
-                r.humidity,
-                r.pressure,
-                r.timestamp.isoformat(),
-            ]
-        )
-
-    output.seek(0)
-
-    response = make_response(output.read())
-    response.headers["Content-Disposition"] = (
-        f"attachment; filename=history_{date}.csv"
-    )
-    response.headers["Content-Type"] = "text/csv"
-    return response
+    return _stream_export("csv")
@@ -0,0 +1,85 @@
+# ==========================================================
+# backend/routes/metrics_routes.py — Runtime pipeline metrics
+# ==========================================================
+from flask import Blueprint, jsonify
+from backend.ingest_service import get_ingest_stats
+from backend.emit_service import get_emit_stats
+from backend import device_registry
+from backend.archive_service import get_archive_stats
+from backend.retention_service import get_retention_stats
+from backend.extensions import db
+from backend.utils.sqlite_tuning import SQLITE_PRAGMAS, read_sqlite_settings
+from backend.mqtt_service import get_connection_states, get_broker_stats
+
+metrics_bp = Blueprint("metrics_bp", __name__, url_prefix="/api")
+
+
+# ==========================================================
+# ✍️ Ingest writer stats (queue depth, batch size, flush latency)
+# ==========================================================
+@metrics_bp.route("/metrics/ingest", methods=["GET"])
+def ingest_metrics():
+    return jsonify(get_ingest_stats()), 200
+
+
+# ==========================================================
+# 📡 Per-device MQTT connection state
+# ==========================================================
+@metrics_bp.route("/metrics/mqtt", methods=["GET"])
+def mqtt_metrics():
+    states = get_connection_states()
+    return jsonify({
+        "connections": len(states),
+        "connected": sum(1 for s in states if s["state"] == "connected"),
+        **get_broker_stats(),
+        "devices": states,
+    }), 200
+
+
+# ==========================================================
+# 📤 Socket.IO coalescer stats
+# ==========================================================
+@metrics_bp.route("/metrics/emit", methods=["GET"])
+def emit_metrics():
+    return jsonify(get_emit_stats()), 200
+
+
+# ==========================================================
+# 🗂️ In-process device registry
+# ==========================================================
+@metrics_bp.route("/metrics/devices", methods=["GET"])
+def device_metrics():
+    return jsonify({
+        "online": device_registry.online_count(),
+        "total": device_registry.total_count(),
+        "unflushed": device_registry.pending_count(),
+        "flush_interval_s": device_registry.DEVICE_STATE_FLUSH_INTERVAL,
+        "devices": device_registry.snapshot(),
+    }), 200
+
+
+# ==========================================================
+# 🗄️ SQLite profile — configured vs. in effect
+# ==========================================================
+@metrics_bp.route("/metrics/db", methods=["GET"])
+def db_metrics():
+    return jsonify({
+        "configured": SQLITE_PRAGMAS,
+        "effective": read_sqlite_settings(db.engine),
+    }), 200
+
+
+# ==========================================================
+# 🧊 History archive (cold tier)
+# ==========================================================
+@metrics_bp.route("/metrics/archive", methods=["GET"])
+def archive_metrics():
+    return jsonify(get_archive_stats()), 200
+
+
+# ==========================================================
+# 🧹 Retention (rows removed / bytes reclaimed)
+# ==========================================================
+@metrics_bp.route("/metrics/retention", methods=["GET"])
+def retention_metrics():
+    return jsonify(get_retention_stats()), 200
@@ -2,30 +2,43 @@ from flask import Blueprint, request, jsonify
 from backend.extensions import db, socketio
 from backend.models import Sensor, Device
 from backend.utils.audit import log_info
+from backend.utils.pagination import PageError, keyset_page, with_next_cursor
+from backend.timeseries import LIVE_WINDOW
 from datetime import datetime
 
 sensor_bp = Blueprint("sensors", __name__, url_prefix="/api")
 
 
 # ==========================================================
-# 📘 Get all sensors
+# 📘 Get sensors — keyset-paginated, newest first
+# ?device_id=&from=&to=&fields=&limit=&order=asc|desc&cursor=
+# Rows are the LIVE_WINDOW slice of the canonical history table unless ?from= is given.
+# Body stays a JSON array; the next page token is in X-Next-Cursor.
 # ==========================================================
+SENSOR_COLUMNS = {
+    "id": Sensor.id,
+    "name": Sensor.topic,
+    "device_id": Sensor.device_id,
+    "device_name": Device.name,
+    "temperature": Sensor.temperature,
+    "humidity": Sensor.humidity,
+    "pressure": Sensor.pressure,
+    "timestamp": Sensor.timestamp,
+}
+SENSOR_DEFAULT_FIELDS = ("id", "name", "device_id", "device_name")
+
+
 @sensor_bp.route("/sensors", methods=["GET"])
 def get_sensors():
-    sensors = Sensor.query.all()
-    result = []
-    for s in sensors:
-        device = Device.query.get(s.device_id)
-        result.append({
-            "id": s.id,
-            "name": s.name,
-            "friendly_name": s.friendly_name,
-            "device_id": s.device_id,
-            "device_name": device.name if device else None
-        })
+    try:
+        result, next_cursor = keyset_page(
+            Sensor, SENSOR_COLUMNS, request.args, SENSOR_DEFAULT_FIELDS, window=LIVE_WINDOW,
+        )
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
 
     log_info(f"📡 Retrieved {len(result)} sensors from database")
-    return jsonify(result), 200
+    return with_next_cursor(jsonify(result), next_cursor), 200
 
 
 # ==========================================================
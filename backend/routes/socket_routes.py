@@ -0,0 +1,68 @@
+# ==========================================================
+# backend/routes/socket_routes.py — Socket.IO room subscriptions
+# ==========================================================
+# Client usage:
+#   socket.emit("subscribe",   {type: "device", id: 3})
+#   socket.emit("subscribe",   {type: "dashboard", id: 7})
+#   socket.emit("subscribe",   {type: "global"})
+#   socket.emit("unsubscribe", {type: "device", id: 3})
+# Sockets that never subscribe stay in the `legacy` room and keep
+# receiving the old broadcast-style events.
+# ==========================================================
+from flask import request
+from flask_socketio import join_room, leave_room
+from backend.extensions import socketio
+from backend.emit_service import (
+    LEGACY_ROOM,
+    resolve_room,
+    track_join,
+    track_leave,
+    track_disconnect,
+)
+from backend.utils.audit import log_info
+
+
+@socketio.on("connect")
+def handle_connect(auth=None):
+    join_room(LEGACY_ROOM)
+    track_join(request.sid, LEGACY_ROOM)
+
+
+@socketio.on("disconnect")
+def handle_disconnect(*args):
+    track_disconnect(request.sid)
+
+
+# ==========================================================
+# ➕ Subscribe to a device / dashboard / global room
+# ==========================================================
+@socketio.on("subscribe")
+def handle_subscribe(data):
+    data = data or {}
+    room = resolve_room(data.get("type"), data.get("id"))
+    if not room:
+        return {"status": "error", "message": "type must be device|dashboard|global (with id)"}
+
+    # an explicit subscriber no longer needs the broadcast-style legacy stream
+    leave_room(LEGACY_ROOM)
+    track_leave(request.sid, LEGACY_ROOM)
+
+    join_room(room)
+    track_join(request.sid, room)
+    log_info(f"[SOCKET] ➕ {request.sid} subscribed to {room}")
+    return {"status": "subscribed", "room": room}
+
+
+# ==========================================================
+# ➖ Unsubscribe
+# ==========================================================
+@socketio.on("unsubscribe")
+def handle_unsubscribe(data):
+    data = data or {}
+    room = resolve_room(data.get("type"), data.get("id"))
+    if not room:
+        return {"status": "error", "message": "type must be device|dashboard|global (with id)"}
+
+    leave_room(room)
+    track_leave(request.sid, room)
+    return {"status": "unsubscribed", "room": room}
@@ -0,0 +1,225 @@
+# =================================================================================================
+# Franc Automation - Schema Registry (per-device metric channels)
+# Handles:
+#   • In-process cache of each device's channels (name, unit, type, scale / offset, aliases)
+#   • apply(): parsed payload → typed, scaled channel values (no SQL after the first load)
+#   • Payload aliases pushed into payload_parser's per-device key maps
+#   • Unknown numeric channels registered by the ingest writer (SCHEMA_AUTO_REGISTER),
+#     so new sensor types (vibration, current, …) need no schema change
+# =================================================================================================
+import os
+import threading
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from backend.extensions import db
+from backend.models import DeviceMetric, METRIC_TYPES
+from backend import payload_parser
+
+SCHEMA_AUTO_REGISTER = os.environ.get("SCHEMA_AUTO_REGISTER", "true").lower() in ("1", "true", "yes")
+
+_schemas = {}   # device_id → {name: MetricDef}
+_lock = threading.RLock()
+_loaded = False
+
+
+# ==========================================================
+# State
+# ==========================================================
+class MetricDef:
+    __slots__ = ("id", "device_id", "name", "unit", "type", "scale", "offset", "aliases")
+
+    def __init__(self, metric_id, device_id, name, unit=None, type="float", scale=1.0, offset=0.0, aliases=None):
+        self.id = metric_id
+        self.device_id = device_id
+        self.name = name
+        self.unit = unit
+        self.type = type or "float"
+        self.scale = 1.0 if scale is None else scale
+        self.offset = 0.0 if offset is None else offset
+        self.aliases = list(aliases or [])
+
+    def convert(self, value):
+        if value is None:
+            return None
+        value = value * self.scale + self.offset
+        if self.type == "int":
+            return float(round(value))
+        if self.type == "bool":
+            return 1.0 if value else 0.0
+        return value
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "device_id": self.device_id,
+            "name": self.name,
+            "unit": self.unit,
+            "type": self.type,
+            "scale": self.scale,
+            "offset": self.offset,
+            "aliases": self.aliases,
+        }
+
+
+def _push_aliases(device_id):
+    aliases = {m.name: [m.name, *m.aliases] for m in _schemas.get(device_id, {}).values() if m.aliases}
+    payload_parser.set_device_aliases(device_id, aliases or None)
+
+
+# ==========================================================
+# Loading
+# ==========================================================
+def load_schemas():
+    """(Re)load every device's channels from SQLite. Needs an app context."""
+    global _loaded
+    rows = DeviceMetric.query.all()
+    with _lock:
+        for device_id in list(_schemas):
+            payload_parser.set_device_aliases(device_id, None)
+        _schemas.clear()
+        for m in rows:
+            _schemas.setdefault(m.device_id, {})[m.name] = MetricDef(
+                m.id, m.device_id, m.name, m.unit, m.type, m.scale, m.offset, m.aliases,
+            )
+        for device_id in _schemas:
+            _push_aliases(device_id)
+        _loaded = True
+
+
+def is_loaded():
+    return _loaded
+
+
+def _ensure_loaded():
+    if not _loaded:
+        load_schemas()
+
+
+# ==========================================================
+# Readers
+# ==========================================================
+def get_schema(device_id):
+    _ensure_loaded()
+    return list(_schemas.get(device_id, {}).values())
+
+
+def apply(device_id, values):
+    """
+    Parsed payload {name: number} → {name: stored value}. Known channels are scaled and
+    typed; unknown ones pass through unchanged (the writer registers them as floats).
+    """
+    _ensure_loaded()
+    schema = _schemas.get(device_id)
+    if not schema:
+        return values
+    out = {}
+    for name, value in values.items():
+        metric = schema.get(name)
+        out[name] = metric.convert(value) if metric is not None else value
+    return out
+
+
+# ==========================================================
+# Writers
+# ==========================================================
+def metric_ids(session, pairs):
+    """
+    {(device_id, name): metric_id} for every pair, inserting missing channels first
+    (INSERT … ON CONFLICT DO NOTHING) when SCHEMA_AUTO_REGISTER is on. Called by the
+    ingest writer; commits the new channels in their own short transaction so a failed
+    reading batch never leaves the cache pointing at rolled-back ids.
+    """
+    _ensure_loaded()
+    ids = {}
+    missing = []
+    for device_id, name in pairs:
+        metric = _schemas.get(device_id, {}).get(name)
+        if metric is not None:
+            ids[(device_id, name)] = metric.id
+        else:
+            missing.append((device_id, name))
+    if not missing or not SCHEMA_AUTO_REGISTER:
+        return ids
+
+    session.execute(
+        sqlite_insert(DeviceMetric.__table__).on_conflict_do_nothing(),
+        [{"device_id": d, "name": n, "type": "float", "scale": 1.0, "value_offset": 0.0} for d, n in missing],
+    )
+    session.commit()
+
+    rows = session.query(DeviceMetric).filter(
+        DeviceMetric.device_id.in_(sorted({d for d, _ in missing})),
+        DeviceMetric.name.in_(sorted({n for _, n in missing})),
+    ).all()
+    with _lock:
+        for m in rows:
+            if (m.device_id, m.name) not in ids:
+                _schemas.setdefault(m.device_id, {})[m.name] = MetricDef(
+                    m.id, m.device_id, m.name, m.unit, m.type, m.scale, m.offset, m.aliases,
+                )
+                ids[(m.device_id, m.name)] = m.id
+    return ids
+
+
+def set_schema(device_id, metrics):
+    """
+    Upsert channel definitions for a device from dicts with name and optional unit,
+    type, scale, offset, aliases. Channels not listed are left alone (readings keep
+    pointing at them). Raises ValueError on bad input. Needs an app context.
+    """
+    _ensure_loaded()
+    cleaned = []
+    for m in metrics:
+        name = str(m.get("name") or "").strip().lower()
+        if not name:
+            raise ValueError("every metric needs a name")
+        mtype = m.get("type", "float")
+        if mtype not in METRIC_TYPES:
+            raise ValueError(f"type must be one of {METRIC_TYPES}")
+        aliases = m.get("aliases") or []
+        if not isinstance(aliases, list):
+            raise ValueError("aliases must be a list")
+        try:
+            scale = float(m.get("scale", 1.0))
+            offset = float(m.get("offset", 0.0))
+        except (TypeError, ValueError):
+            raise ValueError("scale and offset must be numbers")
+        cleaned.append((name, m.get("unit"), mtype, scale, offset, [str(a).lower() for a in aliases]))
+
+    existing = {m.name: m for m in DeviceMetric.query.filter_by(device_id=device_id).all()}
+    for name, unit, mtype, scale, offset, aliases in cleaned:
+        row = existing.get(name) or DeviceMetric(device_id=device_id, name=name)
+        row.unit, row.type, row.scale, row.offset, row.aliases = unit, mtype, scale, offset, aliases
+        db.session.add(row)
+        existing[name] = row
+    db.session.commit()
+
+    with _lock:
+        _schemas[device_id] = {
+            m.name: MetricDef(m.id, m.device_id, m.name, m.unit, m.type, m.scale, m.offset, m.aliases)
+            for m in existing.values()
+        }
+        _push_aliases(device_id)
+    return get_schema(device_id)
+
+
+def forget_device(device_id):
+    with _lock:
+        _schemas.pop(device_id, None)
+        payload_parser.set_device_aliases(device_id, None)
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "MetricDef",
+    "load_schemas",
+    "is_loaded",
+    "get_schema",
+    "apply",
+    "metric_ids",
+    "set_schema",
+    "forget_device",
+]
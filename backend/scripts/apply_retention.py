@@ -0,0 +1,38 @@
+# backend/scripts/apply_retention.py
+"""
+Run one retention pass now (same policies as the backend's background job):
+
+    python -m backend.scripts.apply_retention
+    RETENTION_HISTORY=14d RETENTION_READINGS=7d python -m backend.scripts.apply_retention
+
+Databases created before auto_vacuum=INCREMENTAL need a one-time conversion
+(rewrites the file; stop the backend first):
+
+    python -m backend.scripts.apply_retention --convert-vacuum
+"""
+import sys
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.retention_service import apply_retention
+
+
+def convert_vacuum():
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+    print("✅ Database rebuilt with auto_vacuum=INCREMENTAL")
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        if "--convert-vacuum" in sys.argv:
+            convert_vacuum()
+        report = apply_retention()
+    print(f"🧹 Removed {report['rows_removed']} rows, {report['segments_removed']} archive segments")
+    print(f"💾 Reclaimed {report['bytes_reclaimed']} bytes (db now {report['db_bytes']} bytes)")
+
+
+if __name__ == "__main__":
+    main()
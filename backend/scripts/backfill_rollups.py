@@ -0,0 +1,32 @@
+# backend/scripts/backfill_rollups.py
+"""
+Rebuild minute / hour / day rollups from the history table.
+Stop the backend (ingest writer) first, then run from the repo root:
+
+    python -m backend.scripts.backfill_rollups
+    python -m backend.scripts.backfill_rollups --since 2025-11-01 --device-id 3
+"""
+import argparse
+from datetime import datetime
+
+from backend.app import create_app
+from backend.rollup_service import backfill_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill rollups from history")
+    parser.add_argument("--since", help="YYYY-MM-DD (default: all history)")
+    parser.add_argument("--device-id", type=int, help="only this device")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+
+    app = create_app()
+    with app.app_context():
+        folded = backfill_rollups(since=since, device_id=args.device_id, chunk_size=args.chunk_size)
+    print(f"✅ Rollups rebuilt from {folded} history rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# backend/scripts/bench_payload_parser.py
+"""
+Micro-benchmark: per-message cost of turning an MQTT payload into metrics plus the
+Sensor.payload string. Compares the old json.loads + chained-compare + json.dumps path
+with backend.payload_parser. No app or database needed. Run from the repo root:
+
+    python -m backend.scripts.bench_payload_parser
+    python -m backend.scripts.bench_payload_parser --number 200000
+"""
+import argparse
+import json
+import re
+import timeit
+
+from backend import payload_parser
+
+PAYLOADS = {
+    "canonical": b'{"temperature": 24.31, "humidity": 51.2, "pressure": 1009.7}',
+    "aliases": b'{"Temp": 24.31, "HUM": 51.2, "p": 1009.7, "rssi": -61, "battery": 3.71}',
+    "bare keys": b'{temp: 24.31, hum: 51.2, press: 1009.7}',
+}
+
+
+def _num(value):
+    try:
+        return float(value or 0.0)
+    except Exception:
+        return 0.0
+
+
+def legacy_parse(payload):
+    """The pre-parser mqtt_service path, kept verbatim for comparison."""
+    payload_text = payload.decode(errors="ignore")
+    try:
+        data = json.loads(payload_text)
+    except Exception:
+        try:
+            fixed = re.sub(r'(\w+)\s*:', r'"\1":', payload_text)
+            data = json.loads(fixed)
+        except Exception:
+            data = {"raw": payload_text}
+
+    norm = {}
+    for k, v in data.items():
+        k = str(k).lower()
+        if k in ("temperature", "temp", "t"):
+            norm["temperature"] = _num(v)
+        elif k in ("humidity", "hum", "h"):
+            norm["humidity"] = _num(v)
+        elif k in ("pressure", "press", "p"):
+            norm["pressure"] = _num(v)
+
+    norm.setdefault("temperature", 0.0)
+    norm.setdefault("humidity", 0.0)
+    norm.setdefault("pressure", 0.0)
+    return norm, json.dumps(norm)
+
+
+def fast_parse(payload):
+    data = payload_parser.parse(payload)
+    return data, payload_parser.dumps(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=100000, help="messages per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="measurements (best one is reported)")
+    args = parser.parse_args()
+
+    backend = "orjson" if payload_parser.orjson is not None else "stdlib json"
+    print(f"payload_parser backend: {backend}, {args.number} messages x {args.repeat} runs\n")
+    print(f"{'payload':<12} {'legacy µs':>10} {'parser µs':>10} {'speed-up':>9}")
+    for name, payload in PAYLOADS.items():
+        legacy = min(timeit.repeat(lambda: legacy_parse(payload), number=args.number, repeat=args.repeat))
+        fast = min(timeit.repeat(lambda: fast_parse(payload), number=args.number, repeat=args.repeat))
+        per_legacy = legacy / args.number * 1e6
+        per_fast = fast / args.number * 1e6
+        print(f"{name:<12} {per_legacy:>10.2f} {per_fast:>10.2f} {per_legacy / per_fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
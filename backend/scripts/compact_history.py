@@ -0,0 +1,25 @@
+# backend/scripts/compact_history.py
+"""
+Archive closed days of `history` into per-device / per-day NumPy segments now,
+instead of waiting for the backend's hourly archiver. Run from the repo root:
+
+    python -m backend.scripts.compact_history
+    HISTORY_HOT_DAYS=2 python -m backend.scripts.compact_history
+"""
+from backend.app import create_app
+from backend.archive_service import compact_closed_days, hot_cutoff, get_archive_stats
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        archived = compact_closed_days()
+    stats = get_archive_stats()
+    print(
+        f"✅ Archived {archived} rows older than {hot_cutoff().date()} "
+        f"({stats['segments']} segments, {stats['bytes']} bytes)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# backend/scripts/load_test.py
+"""
+Offline load test: thousands of virtual devices through the real ingest path, no internet broker.
+Uses a throw-away SQLite file + journal under a temp dir unless --database is given. Run from the repo root:
+
+    python -m backend.scripts.load_test --devices 2000 --interval 1 --duration 30
+    python -m backend.scripts.load_test --target broker --shape extended --redelivery 0.05
+    python -m backend.scripts.load_test --devices 500 --subscribers 50 --room device
+
+--target pipeline hands payloads to the pipeline worker exactly like the MQTT io loop;
+--target broker publishes on an in-process MQTT stand-in routed to handle_message.
+Socket.IO fan-out is measured with in-process test clients (--subscribers).
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=1000, help="virtual devices")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between readings per device")
+    parser.add_argument("--jitter", type=float, default=0.1, help="± fraction of the interval")
+    parser.add_argument("--shape", default="core", help="payload shape, one of load_simulator.SHAPES")
+    parser.add_argument("--extra-channels", type=int, default=4, help="channels beyond the core three (extended)")
+    parser.add_argument("--target", default="pipeline", help="one of load_simulator.TARGETS")
+    parser.add_argument("--redelivery", type=float, default=0.0, help="share of messages sent twice (QoS 1)")
+    parser.add_argument("--no-device-ts", action="store_true", help="omit device timestamps from payloads")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--subscribers", type=int, default=0, help="Socket.IO test clients")
+    parser.add_argument("--room", choices=("global", "device"), default="global", help="what subscribers join")
+    parser.add_argument("--database", help="SQLAlchemy URL (default: temp SQLite file)")
+    parser.add_argument("--keep", action="store_true", help="keep the temp dir (DB + journal)")
+    return parser
+
+
+def _ensure_devices(db, Device, count):
+    """Sim-00001 … Sim-NNNNN, created once; → [(id, name), ...]."""
+    names = [f"Sim-{i:05d}" for i in range(1, count + 1)]
+    existing = {name for (name,) in db.session.query(Device.name).filter(Device.name.like("Sim-%"))}
+    db.session.add_all(Device(name=n, host="sim.local", status="offline") for n in names if n not in existing)
+    db.session.commit()
+    rows = db.session.query(Device.id, Device.name).filter(Device.name.in_(names)).order_by(Device.id).all()
+    return [(device_id, name) for device_id, name in rows]
+
+
+def main():
+    parser = _parser()
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="francauto-load-")
+    # config is read at import time: point DB, journal and spill file at the temp dir first
+    os.environ["DATABASE_URL"] = args.database or f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    os.environ["INGEST_JOURNAL_DIR"] = os.path.join(workdir, "journal")
+    os.environ["MQTT_INBOX_SPILL_PATH"] = os.path.join(workdir, "inbox.spill")
+
+    import eventlet
+    from backend.app import create_app
+    from backend.extensions import db, socketio
+    from backend.models import Device
+    from backend import device_registry, emit_service, ingest_service, message_pipeline, mqtt_service
+    from backend import reading_guard
+    from backend.load_simulator import SHAPES, TARGETS
+
+    # checked only now: importing load_simulator reads the config the env above points at
+    if args.shape not in SHAPES or args.target not in TARGETS:
+        shutil.rmtree(workdir, ignore_errors=True)
+        parser.error(f"--shape must be one of {SHAPES}, --target one of {TARGETS}")
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        devices = _ensure_devices(db, Device, args.devices)
+        device_registry.load_registry()
+
+    clients = []
+    for i in range(args.subscribers):
+        client = socketio.test_client(app)
+        room = {"type": "global"} if args.room == "global" else {"type": "device", "id": devices[i % len(devices)][0]}
+        client.emit("subscribe", room)
+        clients.append(client)
+
+    print(f"🎮 {len(devices)} devices every {args.interval}s ±{args.jitter:.0%}, shape={args.shape}, "
+          f"target={args.target}, subscribers={len(clients)} ({args.room}), {args.duration:.0f}s\n")
+    with app.app_context():
+        sim = mqtt_service.start_load_simulation(
+            devices, target=args.target, interval=args.interval, shape=args.shape, jitter=args.jitter,
+            extra_channels=args.extra_channels, redelivery=args.redelivery,
+            device_timestamps=not args.no_device_ts,
+        )
+
+    started = time.monotonic()
+    rows_before = ingest_service.get_ingest_stats()["rows_written"]
+    print(f"{'t':>4} {'sent/s':>8} {'done/s':>8} {'inbox':>7} {'rows/s':>8} {'journal':>8} {'lag ms':>8}")
+    last = (0, 0, rows_before)
+    while time.monotonic() - started < args.duration:
+        eventlet.sleep(1.0)
+        sent = sim.stats()["published"]
+        pipe = message_pipeline.get_pipeline_stats()
+        ingest = ingest_service.get_ingest_stats()
+        now_counts = (sent, pipe["processed"], ingest["rows_written"])
+        rates = [b - a for a, b in zip(last, now_counts)]
+        last = now_counts
+        journal = ingest["journal"]["pending"] if ingest["journal"] else ingest["queue_depth"]
+        print(f"{time.monotonic() - started:>4.0f} {rates[0]:>8} {rates[1]:>8} {pipe['queue_depth']:>7} "
+              f"{rates[2]:>8} {journal:>8} {pipe['last_lag_ms']:>8.1f}")
+
+    sim.stop()
+    elapsed = time.monotonic() - started
+    message_pipeline.drain()
+    ingest_service.flush_pending()
+    eventlet.sleep(emit_service.EMIT_TICK * 2)  # last coalesced frames
+
+    sim_stats = sim.stats()
+    pipe = message_pipeline.get_pipeline_stats()
+    ingest = ingest_service.get_ingest_stats()
+    guard = reading_guard.get_guard_stats()
+    emit = emit_service.get_emit_stats()
+    received = sum(len(c.get_received()) for c in clients)
+
+    print("\n📊 Results")
+    print(f"  offered        {sim_stats['offered_rate']:.0f} msg/s, published {sim_stats['published']} "
+          f"({sim_stats['published'] / elapsed:.0f} msg/s, +{sim_stats['redelivered']} redelivered), "
+          f"scheduler lag max {sim_stats['max_lag_ms']:.1f} ms")
+    print(f"  pipeline       processed {pipe['processed']}, dropped {pipe['dropped_oldest'] + pipe['dropped_blocked']}, "
+          f"spilled {pipe['spilled']}, max lag {pipe['max_lag_ms']:.1f} ms")
+    print(f"  ingest         {ingest['rows_written'] - rows_before} rows ({(ingest['rows_written'] - rows_before) / elapsed:.0f}/s), "
+          f"{ingest['batches']} batches, flush avg {ingest['avg_flush_ms']:.1f} / max {ingest['max_flush_ms']:.1f} ms, "
+          f"dropped {ingest['dropped']}")
+    print(f"  guard          duplicates {guard['duplicates']}, late {guard['late']}, clock skew {guard['clock_skew']}")
+    print(f"  socket.io      {emit['ticks']} ticks, {emit['frames_out']} frames, tick max {emit['max_tick_ms']:.1f} ms, "
+          f"{received} packets received by {len(clients)} subscribers")
+
+    for client in clients:
+        client.disconnect()
+    if args.keep:
+        print(f"\n💾 Kept {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
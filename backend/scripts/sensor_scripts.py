@@ -10,13 +10,11 @@ import sys
 import random
 import time
 from datetime import datetime
-from faker import Faker
 
 from app import create_app
 from backend.extensions import db
-from backend.models import Device, Sensor  # ✅ unified model name
+from backend.models import Device, Sensor  # ✅ unified model name (rows live in `history`)
 
-fake = Faker()
 app = create_app()
 
 
@@ -34,8 +32,6 @@ def seed_sensors(count=10):
             device = random.choice(devices)
             data = Sensor(
                 device_id=device.id,
-                topic=f"devices/{device.id}/sensor",
-                payload=fake.json(data_columns={"status": "active", "voltage": random.uniform(3.0, 4.2)}),
                 temperature=round(random.uniform(20.0, 35.0), 2),
                 humidity=round(random.uniform(30.0, 90.0), 2),
                 pressure=round(random.uniform(950.0, 1050.0), 2),
@@ -71,8 +67,6 @@ def simulate_mqtt(device_name=None, interval=5):
                 for device in devices:
                     new_data = Sensor(
                         device_id=device.id,
-                        topic=f"devices/{device.id}/sensor",
-                        payload=fake.json(data_columns={"status": "ok", "signal_strength": random.randint(50, 100)}),
                         temperature=round(random.uniform(18.0, 36.0), 2),
                         humidity=round(random.uniform(40.0, 85.0), 2),
                         pressure=round(random.uniform(960.0, 1040.0), 2),
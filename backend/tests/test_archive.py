@@ -0,0 +1,132 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History, Rollup
+from backend import archive_service, rollup_service, timeseries
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        """One device with 24 hourly readings on an old day and 3 readings today."""
+        self.app = create_app()
+        self.client = self.app.test_client()
+        self.archive_dir = tempfile.mkdtemp()
+        self._original_dir = archive_service.ARCHIVE_DIR
+        archive_service.ARCHIVE_DIR = self.archive_dir
+
+        self.now = datetime(2025, 3, 20, 12, 0, 0)
+        self.old_day = datetime(2025, 3, 1)
+
+        with self.app.app_context():
+            db.create_all()
+            device = Device(name="Archive-1", host="localhost")
+            db.session.add(device)
+            db.session.commit()
+            self.device_id = device.id
+            rows = [
+                {"device_id": device.id, "temperature": float(i), "humidity": None, "pressure": 1000.0,
+                 "timestamp": self.old_day + timedelta(hours=i)}
+                for i in range(24)
+            ] + [
+                {"device_id": device.id, "temperature": 50.0 + i, "humidity": 40.0, "pressure": 1000.0,
+                 "timestamp": self.now - timedelta(hours=i)}
+                for i in range(3)
+            ]
+            db.session.execute(History.__table__.insert(), rows)
+            db.session.commit()
+
+    def tearDown(self):
+        archive_service.ARCHIVE_DIR = self._original_dir
+        shutil.rmtree(self.archive_dir, ignore_errors=True)
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    # ---------------------------------------
+    # ✅ Test 1: Closed days move to a memory-mapped segment
+    # ---------------------------------------
+    def test_compaction_moves_closed_days(self):
+        with self.app.app_context():
+            self.assertEqual(archive_service.compact_closed_days(self.now), 24)
+            self.assertEqual(History.query.count(), 3)
+
+        segment = archive_service.read_segment(self.device_id, self.old_day.date())
+        self.assertIsInstance(segment, np.memmap)
+        self.assertEqual(len(segment), 24)
+        self.assertTrue(np.isnan(segment["humidity"]).all())
+
+        part, = archive_service.read_range(self.device_id, self.old_day + timedelta(hours=5), self.old_day + timedelta(hours=8))
+        self.assertEqual(part["temperature"].tolist(), [5.0, 6.0, 7.0])
+
+    # ---------------------------------------
+    # ✅ Test 2: Late rows merge; re-runs never duplicate
+    # ---------------------------------------
+    def test_late_rows_merge_without_duplicates(self):
+        with self.app.app_context():
+            archive_service.compact_closed_days(self.now)
+            db.session.add(History(device_id=self.device_id, temperature=-1.0, timestamp=self.old_day + timedelta(minutes=30)))
+            db.session.commit()
+            self.assertEqual(archive_service.compact_closed_days(self.now), 1)
+            self.assertEqual(archive_service.compact_closed_days(self.now), 0)
+
+        segment = archive_service.read_segment(self.device_id, self.old_day.date())
+        self.assertEqual(len(segment), 25)
+        self.assertEqual(segment["temperature"][1], -1.0)
+        self.assertTrue(np.all(np.diff(segment["ts"]) >= np.timedelta64(0)))
+
+    # ---------------------------------------
+    # ✅ Test 3: Exports and rollup backfill read both tiers
+    # ---------------------------------------
+    def test_export_and_backfill_span_both_tiers(self):
+        with self.app.app_context():
+            archive_service.compact_closed_days(self.now)
+
+        response = self.client.get("/api/history/export/json?from=2025-03-01&to=2025-03-20")
+        records = json.loads(response.get_data(as_text=True))
+        self.assertEqual(len(records), 27)
+        self.assertEqual(records[0]["timestamp"], "2025-03-01T00:00:00")
+        self.assertIsNone(records[0]["humidity"])
+        self.assertEqual([r["timestamp"] for r in records], sorted(r["timestamp"] for r in records))
+
+        with self.app.app_context():
+            self.assertEqual(rollup_service.backfill_rollups(), 27)
+            day = Rollup.query.filter_by(resolution="day", bucket_start=self.old_day).one()
+            self.assertEqual(day.count, 24)
+            self.assertEqual(day.humidity_count, 0)
+
+    # ---------------------------------------
+    # ✅ Test 4: Row listings and raw series page across both tiers
+    # ---------------------------------------
+    def test_rows_and_raw_series_span_both_tiers(self):
+        with self.app.app_context():
+            archive_service.compact_closed_days(self.now)
+
+        first = self.client.get("/api/history/rows?from=2025-03-01&to=2025-03-20&limit=20").get_json()
+        self.assertEqual(len(first["data"]), 20)
+        self.assertEqual(first["data"][2]["temperature"], 52.0)   # hot rows first (newest first) …
+        self.assertEqual(first["data"][3]["temperature"], 23.0)   # … then the archived day
+        second = self.client.get(f"/api/history/rows?from=2025-03-01&to=2025-03-20&cursor={first['next_cursor']}").get_json()
+        self.assertEqual(len(second["data"]), 7)
+        self.assertIsNone(second["next_cursor"])
+        self.assertEqual(len({r["id"] for r in first["data"] + second["data"]}), 27)
+
+        with self.app.app_context():
+            series = timeseries.query(start=self.old_day, end=self.now + timedelta(hours=1), source="raw")
+            self.assertEqual(len(series), 27)
+            head = timeseries.query(start=self.old_day, source="raw", limit=5, with_names=True)
+            self.assertEqual([r[2] for r in head.rows], [0.0, 1.0, 2.0, 3.0, 4.0])
+            self.assertEqual(head.rows[0][-1], "Archive-1")
+
+
+if __name__ == "__main__":
+    unittest.main()
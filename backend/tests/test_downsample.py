@@ -0,0 +1,76 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History
+from backend.utils.downsample import lttb_indices, minmax_indices
+from backend.models import INDIA_TZ
+
+
+class DownsampleTestCase(unittest.TestCase):
+    # ---------------------------------------
+    # ✅ Test 1: LTTB keeps endpoints and the spike
+    # ---------------------------------------
+    def test_lttb_keeps_shape(self):
+        x = np.arange(10000, dtype=float)
+        y = np.sin(x / 500.0)
+        y[4321] = 25.0
+
+        idx = lttb_indices(x, y, 200)
+        self.assertEqual(len(idx), 200)
+        self.assertEqual((idx[0], idx[-1]), (0, 9999))
+        self.assertIn(4321, idx)
+        self.assertTrue(np.all(np.diff(idx) > 0))
+
+    # ---------------------------------------
+    # ✅ Test 2: Min-max keeps every bucket extreme, skips NaN
+    # ---------------------------------------
+    def test_minmax_keeps_extremes(self):
+        y = np.random.default_rng(7).normal(size=5000)
+        y[100] = np.nan
+        idx = minmax_indices(y, 100)
+        self.assertLessEqual(len(idx), 100)
+        self.assertIn(int(np.nanargmax(y)), idx)
+        self.assertIn(int(np.nanargmin(y)), idx)
+        self.assertNotIn(100, idx)
+
+    # ---------------------------------------
+    # ✅ Test 3: Chart endpoint bounds the payload by ?points=
+    # ---------------------------------------
+    def test_chart_points_bound_payload(self):
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            device = Device(name="Down-1", host="localhost")
+            db.session.add(device)
+            db.session.commit()
+            start = datetime.now(INDIA_TZ).replace(tzinfo=None) - timedelta(minutes=50)  # stored wall-clock
+            db.session.execute(History.__table__.insert(), [
+                {"device_id": device.id, "temperature": float(i % 37), "humidity": 1.0, "pressure": 2.0,
+                 "timestamp": start + timedelta(seconds=i)}
+                for i in range(3000)
+            ])
+            db.session.commit()
+
+        try:
+            client = app.test_client()
+            for method in ("lttb", "minmax"):
+                response = client.get(f"/api/dashboard/chart?range=1h&points=100&method={method}")
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(response.json), 100)
+                self.assertGreater(len(response.json), 50)
+            self.assertEqual(client.get("/api/dashboard/chart?points=10&method=avg").status_code, 400)
+        finally:
+            with app.app_context():
+                db.session.remove()
+                db.drop_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
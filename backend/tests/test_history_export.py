@@ -0,0 +1,90 @@
+import os
+import csv
+import json
+import unittest
+from io import StringIO
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History
+from backend.routes import history_routes
+
+
+class HistoryExportTestCase(unittest.TestCase):
+    def setUp(self):
+        """Two devices, 30 readings each, one per hour from 2025-01-01 00:00."""
+        self.app = create_app()
+        self.client = self.app.test_client()
+        self.start = datetime(2025, 1, 1)
+
+        with self.app.app_context():
+            db.create_all()
+            ids = []
+            for n in range(2):
+                device = Device(name=f"Export-{n}", host="localhost")
+                db.session.add(device)
+                db.session.flush()
+                ids.append(device.id)
+            db.session.execute(History.__table__.insert(), [
+                {"device_id": dev_id, "temperature": float(i), "humidity": 40.0, "pressure": 1000.0,
+                 "timestamp": self.start + timedelta(hours=i)}
+                for dev_id in ids for i in range(30)
+            ])
+            db.session.commit()
+        self.device_ids = ids
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    # ---------------------------------------
+    # ✅ Test 1: CSV streams in chunks for a single day
+    # ---------------------------------------
+    def test_csv_day_export_is_streamed(self):
+        original = history_routes.EXPORT_CHUNK
+        history_routes.EXPORT_CHUNK = 7
+        try:
+            response = self.client.get("/api/history/export/csv?date=2025-01-01")
+            self.assertTrue(response.is_streamed)
+            rows = list(csv.reader(StringIO(response.get_data(as_text=True))))
+        finally:
+            history_routes.EXPORT_CHUNK = original
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("history_2025-01-01.csv", response.headers["Content-Disposition"])
+        self.assertEqual(rows[0], ["device_id", "temperature", "humidity", "pressure", "timestamp"])
+        self.assertEqual(len(rows) - 1, 2 * 24)
+
+    # ---------------------------------------
+    # ✅ Test 2: JSON range + device filter
+    # ---------------------------------------
+    def test_json_range_and_device(self):
+        url = (
+            "/api/history/export/json?from=2025-01-01T12:00:00&to=2025-01-02"
+            f"&device_id={self.device_ids[1]}"
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        records = json.loads(response.get_data(as_text=True))
+        self.assertEqual(len(records), 30 - 12)  # date-only `to` includes the whole 2nd day
+        self.assertTrue(all(r["device_id"] == self.device_ids[1] for r in records))
+        self.assertEqual(records[0]["timestamp"], "2025-01-01T12:00:00")
+
+        empty = self.client.get("/api/history/export/json?date=2024-01-01")
+        self.assertEqual(json.loads(empty.get_data(as_text=True)), [])
+
+    # ---------------------------------------
+    # ✅ Test 3: Bad input
+    # ---------------------------------------
+    def test_invalid_range(self):
+        self.assertEqual(self.client.get("/api/history/export/csv").status_code, 400)
+        self.assertEqual(self.client.get("/api/history/export/csv?date=nope").status_code, 400)
+        self.assertEqual(self.client.get("/api/history/export/json?from=2025-01-02&to=2025-01-01T00:00:00").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
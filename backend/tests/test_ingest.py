@@ -0,0 +1,93 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, Sensor, History
+from backend import ingest_service, device_registry
+
+
+class IngestWriterTestCase(unittest.TestCase):
+    def setUp(self):
+        """Create an in-memory app and one device."""
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            device = Device(name="Ingest-1", host="localhost", status="offline")
+            db.session.add(device)
+            db.session.commit()
+            self.device_id = device.id
+            device_registry.load_registry()
+
+        ingest_service._flask_app = self.app
+
+    def tearDown(self):
+        ingest_service.flush_pending()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    # ---------------------------------------
+    # ✅ Test 1: Queued readings land in one batch
+    # ---------------------------------------
+    def test_batch_flush_writes_history_and_device(self):
+        start = datetime(2025, 1, 1, 12, 0, 0)
+        for i in range(25):
+            ts = start + timedelta(seconds=i)
+            device_registry.record_reading(self.device_id, "Ingest-1", {"temperature": 20.0 + i}, ts)
+            ingest_service.enqueue_reading(
+                self.device_id, 20.0 + i, 50.0, 1000.0, ts,
+            )
+
+        batches_before = ingest_service.get_ingest_stats()["batches"]
+        self.assertEqual(ingest_service.flush_pending(), 25)
+
+        stats = ingest_service.get_ingest_stats()
+        self.assertEqual(stats["batches"], batches_before + 1)
+        self.assertEqual(stats["last_batch_size"], 25)
+        self.assertEqual(stats["queue_depth"], 0)
+
+        with self.app.app_context():
+            self.assertEqual(History.query.count(), 25)  # one canonical row per reading
+            newest = Sensor.query.order_by(Sensor.timestamp.desc()).first()  # compatibility view
+            self.assertEqual((newest.topic, newest.temperature), ("francauto/devices/Ingest-1", 44.0))
+            device = db.session.get(Device, self.device_id)
+            self.assertEqual(device.status, "online")
+            self.assertEqual(device.last_seen, start + timedelta(seconds=24))
+
+    # ---------------------------------------
+    # ✅ Test 2: Heartbeats are debounced, shutdown flush is exact
+    # ---------------------------------------
+    def test_heartbeat_debounced_until_forced(self):
+        first = datetime(2025, 1, 1, 12, 0, 0)
+        device_registry.record_reading(self.device_id, "Ingest-1", {}, first)
+        with self.app.app_context():
+            self.assertEqual(device_registry.persist_due(), 1)  # status changed → immediate
+
+        later = first + timedelta(seconds=5)
+        device_registry.record_reading(self.device_id, "Ingest-1", {}, later)
+        with self.app.app_context():
+            self.assertEqual(device_registry.persist_due(), 0)  # same status, within interval
+            self.assertEqual(db.session.get(Device, self.device_id).last_seen, first)
+
+            self.assertEqual(device_registry.persist_due(force=True), 1)
+            db.session.expire_all()
+            self.assertEqual(db.session.get(Device, self.device_id).last_seen, later)
+
+    # ---------------------------------------
+    # ✅ Test 3: Stats endpoint
+    # ---------------------------------------
+    def test_ingest_metrics_route(self):
+        response = self.client.get("/api/metrics/ingest")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("queue_depth", response.json)
+        self.assertIn("avg_flush_ms", response.json)
+
+
+if __name__ == "__main__":
+    unittest.main()
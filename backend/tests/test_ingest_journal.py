@@ -0,0 +1,192 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History, Reading
+from backend.ingest_journal import Journal, JournalLockedError
+from backend import ingest_service, device_registry
+
+
+class JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    # ---------------------------------------
+    # ✅ Test 1: Appended records come back in order; commit moves the checkpoint
+    # ---------------------------------------
+    def test_append_read_commit(self):
+        journal = Journal(self.tmp)
+        for i in range(10):
+            self.assertTrue(journal.append(b"r%d" % i))
+
+        first, position = journal.read(4)
+        self.assertEqual(first, [b"r0", b"r1", b"r2", b"r3"])
+        journal.commit(position, len(first))
+        self.assertEqual(journal.pending, 6)
+
+        rest, _ = journal.read(100)
+        self.assertEqual(rest, [b"r%d" % i for i in range(4, 10)])
+        journal.close()
+
+    # ---------------------------------------
+    # ✅ Test 2: A failed DB write rewinds; a restart resumes after the last commit
+    # ---------------------------------------
+    def test_rewind_and_restart(self):
+        journal = Journal(self.tmp)
+        for i in range(6):
+            journal.append(b"r%d" % i)
+        batch, position = journal.read(3)
+        journal.commit(position, len(batch))
+        journal.read(3)
+        journal.rewind()
+        self.assertEqual(journal.read(1)[0], [b"r3"])
+        journal.close()  # "crash" with r3..r5 never committed
+
+        reopened = Journal(self.tmp)
+        self.assertEqual(reopened.recovered, 3)
+        self.assertEqual(reopened.read(100)[0], [b"r3", b"r4", b"r5"])
+        reopened.append(b"r6")
+        self.assertEqual(reopened.read(100)[0], [b"r6"])
+        reopened.close()
+
+    # ---------------------------------------
+    # ✅ Test 3: Segments roll over, replayed ones are deleted, the size cap rejects
+    # ---------------------------------------
+    def test_segments_roll_and_cap(self):
+        journal = Journal(self.tmp, segment_bytes=4096, max_bytes=3 * 4096)
+        payload = b"x" * 500
+        accepted = sum(journal.append(payload) for _ in range(40))
+        self.assertLess(accepted, 40)
+        self.assertEqual(journal.rejected, 40 - accepted)
+        self.assertEqual(len([f for f in os.listdir(self.tmp) if f.endswith(".seg")]), 3)
+
+        batch, position = journal.read(1000)
+        self.assertEqual(len(batch), accepted)
+        journal.commit(position, len(batch))
+        self.assertEqual(len([f for f in os.listdir(self.tmp) if f.endswith(".seg")]), 1)
+        self.assertTrue(journal.append(payload))
+        journal.close()
+
+    # ---------------------------------------
+    # ✅ Test 4: A torn tail after a crash ends the log instead of corrupting it
+    # ---------------------------------------
+    def test_torn_tail_is_ignored(self):
+        journal = Journal(self.tmp)
+        journal.append(b"good")
+        journal.append(b"torn")
+        journal._write_map[journal._write_pos - 2] ^= 0xFF  # flip a byte of the last record
+        journal.close()
+
+        reopened = Journal(self.tmp)
+        self.assertEqual(reopened.read(10)[0], [b"good"])
+        reopened.append(b"next")
+        self.assertEqual(reopened.read(10)[0], [b"next"])
+        reopened.close()
+
+    # ---------------------------------------
+    # ✅ Test 5: A second owner of the directory is refused until the first closes
+    # ---------------------------------------
+    def test_directory_is_locked(self):
+        journal = Journal(self.tmp)
+        journal.append(b"mine")
+        with self.assertRaises(JournalLockedError):
+            Journal(self.tmp)
+        journal.close()
+
+        reopened = Journal(self.tmp)
+        self.assertEqual(reopened.read(10)[0], [b"mine"])
+        reopened.close()
+
+
+class JournaledIngestTestCase(unittest.TestCase):
+    def setUp(self):
+        """File-backed DB (the journal stays off for in-memory ones) and a temp journal dir."""
+        self.tmp = tempfile.mkdtemp()
+        self._env = os.environ.get("DATABASE_URL")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(self.tmp, 'journal.db')}"
+        self._saved = (ingest_service.INGEST_JOURNAL_DIR, ingest_service._journal,
+                       ingest_service._journal_app, ingest_service._flask_app)
+        ingest_service.INGEST_JOURNAL_DIR = os.path.join(self.tmp, "journal")
+        ingest_service._journal = None
+
+        self.app = create_app()
+        with self.app.app_context():
+            db.create_all()
+            device = Device(name="Journal-1", host="localhost")
+            db.session.add(device)
+            db.session.commit()
+            self.device_id = device.id
+            device_registry.load_registry()
+        ingest_service._flask_app = self.app
+
+    def tearDown(self):
+        if ingest_service._journal is not None:
+            ingest_service._journal.close()
+        (ingest_service.INGEST_JOURNAL_DIR, ingest_service._journal,
+         ingest_service._journal_app, ingest_service._flask_app) = self._saved
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        if self._env is None:
+            del os.environ["DATABASE_URL"]
+        else:
+            os.environ["DATABASE_URL"] = self._env
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _enqueue(self, count):
+        start = datetime(2025, 1, 1, 12, 0, 0)
+        for i in range(count):
+            ingest_service.enqueue_reading(self.device_id, 20.0 + i, 50.0, None, start + timedelta(seconds=i),
+                                          metrics={"co2": 400 + i})
+
+    # ---------------------------------------
+    # ✅ Test 6: Readings go through the journal and reach history + readings
+    # ---------------------------------------
+    def test_readings_are_journaled(self):
+        self._enqueue(30)
+        stats = ingest_service.get_ingest_stats()
+        self.assertEqual(stats["journal"]["pending"], 30)
+        self.assertEqual(stats["queue_depth"], 0)  # nothing held in memory
+
+        self.assertEqual(ingest_service.flush_pending(), 30)
+        self.assertEqual(ingest_service.get_ingest_stats()["journal"]["pending"], 0)
+        with self.app.app_context():
+            self.assertEqual(History.query.count(), 30)
+            self.assertEqual(Reading.query.count(), 30)
+            self.assertIsNone(History.query.first().pressure)
+
+    # ---------------------------------------
+    # ✅ Test 7: Replaying past the checkpoint (crash after commit) stores nothing twice
+    # ---------------------------------------
+    def test_replay_is_idempotent(self):
+        self._enqueue(20)
+        self.assertEqual(ingest_service.flush_pending(), 20)
+
+        # crash between the DB commit and the checkpoint: the next run replays from the start
+        journal = ingest_service._journal
+        journal.close()
+        os.remove(os.path.join(ingest_service.INGEST_JOURNAL_DIR, "checkpoint"))
+        ingest_service._journal, ingest_service._journal_app = None, None
+
+        duplicates_before = ingest_service.get_ingest_stats()["replayed_duplicates"]
+        self._enqueue(25)  # reopens the journal: 20 replayed + 25 new (5 of them fresh)
+        self.assertEqual(ingest_service._journal.recovered, 20)
+        ingest_service.flush_pending()
+
+        self.assertEqual(ingest_service.get_ingest_stats()["replayed_duplicates"] - duplicates_before, 40)
+        with self.app.app_context():
+            self.assertEqual(History.query.count(), 25)
+            self.assertEqual(Reading.query.count(), 25)
+
+
+if __name__ == "__main__":
+    unittest.main()
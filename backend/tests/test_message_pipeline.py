@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from eventlet.queue import LightQueue
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History
+from backend import ingest_service, device_registry, message_pipeline, mqtt_service
+from backend.utils.clock import now
+
+
+class MessagePipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        """Small inbox, spill file in a temp dir, a recording processor."""
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (message_pipeline._inbox, message_pipeline.INBOX_POLICY, message_pipeline.SPILL_PATH,
+                       message_pipeline._processor, message_pipeline._after_batch, dict(message_pipeline._stats))
+        message_pipeline._inbox = LightQueue(3)
+        message_pipeline.SPILL_PATH = os.path.join(self.tmp, "inbox.spill")
+        message_pipeline._spilling = False
+        message_pipeline._spill_offset = 0
+        for key in message_pipeline._stats:
+            message_pipeline._stats[key] = 0
+
+        self.seen = []
+        message_pipeline._processor = lambda m: self.seen.append(m.payload)
+        message_pipeline._after_batch = None
+
+    def tearDown(self):
+        (message_pipeline._inbox, message_pipeline.INBOX_POLICY, message_pipeline.SPILL_PATH,
+         message_pipeline._processor, message_pipeline._after_batch, stats) = self._saved
+        message_pipeline._stats.update(stats)
+        message_pipeline._spilling = False
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _submit(self, count):
+        return [message_pipeline.submit(1, "Pipe-1", b"%d" % i, now()) for i in range(count)]
+
+    # ---------------------------------------
+    # ✅ Test 1: drop_oldest keeps the newest messages and counts the rest
+    # ---------------------------------------
+    def test_drop_oldest(self):
+        message_pipeline.INBOX_POLICY = "drop_oldest"
+        self.assertTrue(all(self._submit(5)))
+        self.assertEqual(self.seen, [])  # submit never processes
+        self.assertEqual(message_pipeline.drain(), 3)
+        self.assertEqual(self.seen, [b"2", b"3", b"4"])
+        self.assertEqual(message_pipeline.get_pipeline_stats()["dropped_oldest"], 2)
+
+    # ---------------------------------------
+    # ✅ Test 2: spill overflows to disk and replays in arrival order
+    # ---------------------------------------
+    def test_spill_replays_in_order(self):
+        message_pipeline.INBOX_POLICY = "spill"
+        self._submit(7)
+        stats = message_pipeline.get_pipeline_stats()
+        self.assertEqual((stats["spilled"], stats["spill_pending"]), (4, True))
+
+        self.assertEqual(message_pipeline.drain(), 7)
+        self.assertEqual(self.seen, [b"%d" % i for i in range(7)])
+        self.assertFalse(os.path.exists(message_pipeline.SPILL_PATH))
+        self.assertEqual(message_pipeline.get_pipeline_stats()["replayed"], 4)
+
+    # ---------------------------------------
+    # ✅ Test 3: the MQTT callback only queues; the worker stage stores the reading
+    # ---------------------------------------
+    def test_handle_message_defers_work(self):
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            device = Device(name="Pipe-1", host="localhost", status="online")
+            db.session.add(device)
+            db.session.commit()
+            device_id = device.id
+            device_registry.load_registry()
+        ingest_service._flask_app = app
+        mqtt_service._flask_app = app
+        message_pipeline._inbox = LightQueue(10)
+        try:
+            conn = SimpleNamespace(id=device_id, name="Pipe-1")
+            mqtt_service.handle_message(conn, SimpleNamespace(payload=b'{"temp": 21.5}'))
+            self.assertEqual(message_pipeline.get_pipeline_stats()["queue_depth"], 1)
+            self.assertIsNone(device_registry.get(device_id).latest)
+
+            self.assertEqual(message_pipeline.drain(), 1)
+            ingest_service.flush_pending()
+            with app.app_context():
+                row = History.query.one()
+                self.assertEqual(row.temperature, 21.5)
+                self.assertLess(abs(row.timestamp - now().replace(tzinfo=None)), timedelta(minutes=1))
+        finally:
+            with app.app_context():
+                db.session.remove()
+                db.drop_all()
+
+    # ---------------------------------------
+    # ✅ Test 4: messages still queued when a device is stopped do not bring it back online
+    # ---------------------------------------
+    def test_stop_drops_queued_messages(self):
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            device = Device(name="Pipe-2", host="localhost", status="online")
+            db.session.add(device)
+            db.session.commit()
+            device_id = device.id
+            device_registry.load_registry()
+        ingest_service._flask_app = app
+        mqtt_service._flask_app = app
+        message_pipeline._inbox = LightQueue(10)
+        try:
+            conn = SimpleNamespace(id=device_id, name="Pipe-2")
+            for temp in (20, 21):
+                mqtt_service.handle_message(conn, SimpleNamespace(payload=b'{"temp": %d}' % temp))
+            mqtt_service.stop_mqtt_client(conn)
+
+            self.assertEqual(message_pipeline.drain(), 2)
+            ingest_service.flush_pending()
+            self.assertEqual(device_registry.get(device_id).status, "offline")
+            with app.app_context():
+                self.assertEqual(History.query.count(), 0)
+        finally:
+            mqtt_service._stopped_ids.discard(device_id)
+            with app.app_context():
+                db.session.remove()
+                db.drop_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History
+
+
+class KeysetPaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        """Two devices, 25 readings each, one per minute from 2025-01-01 00:00."""
+        self.app = create_app()
+        self.client = self.app.test_client()
+        self.start = datetime(2025, 1, 1)
+
+        with self.app.app_context():
+            db.create_all()
+            ids = []
+            for n in range(2):
+                device = Device(name=f"Page-{n}", host="localhost")
+                db.session.add(device)
+                db.session.flush()
+                ids.append(device.id)
+            rows = [
+                {"device_id": dev_id, "temperature": float(i), "humidity": 40.0, "pressure": 1000.0,
+                 "timestamp": self.start + timedelta(minutes=i)}
+                for dev_id in ids for i in range(25)
+            ]
+            db.session.execute(History.__table__.insert(), rows)
+            db.session.commit()
+        self.device_ids = ids
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _walk_history(self, query):
+        pages, cursor = [], None
+        while True:
+            url = f"/api/history/rows?{query}" + (f"&cursor={cursor}" if cursor else "")
+            body = self.client.get(url).get_json()
+            pages.append(body["data"])
+            cursor = body["next_cursor"]
+            if not cursor:
+                return pages
+
+    # ✅ Test 1: walking the cursor visits every row exactly once, newest first
+    def test_history_cursor_walk(self):
+        pages = self._walk_history("limit=7")
+        rows = [r for page in pages for r in page]
+        self.assertEqual(len(pages), 8)
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(len({r["id"] for r in rows}), 50)
+        keys = [(r["timestamp"], r["id"]) for r in rows]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    # ✅ Test 2: device/time filters and field projection
+    def test_history_filters_and_fields(self):
+        query = (f"device_id={self.device_ids[1]}&from=2025-01-01T00:05:00&to=2025-01-01T00:15:00"
+                 "&fields=temperature,timestamp&order=asc&limit=4")
+        rows = [r for page in self._walk_history(query) for r in page]
+        self.assertEqual([r["temperature"] for r in rows], [float(i) for i in range(5, 15)])
+        self.assertEqual(set(rows[0]), {"temperature", "timestamp"})
+
+    # ✅ Test 3: list endpoints keep an array body and return the cursor in a header
+    def test_sensor_listing_cursor_header(self):
+        self.assertEqual(self.client.get("/api/sensors").get_json(), [])  # older than LIVE_WINDOW
+        first = self.client.get("/api/sensors?from=2025-01-01&limit=30&fields=id,name,device_name")
+        self.assertEqual(len(first.get_json()), 30)
+        self.assertEqual(first.get_json()[0]["name"], f"francauto/devices/{first.get_json()[0]['device_name']}")
+        cursor = first.headers["X-Next-Cursor"]
+        second = self.client.get(f"/api/sensors?from=2025-01-01&limit=30&fields=id,device_name&cursor={cursor}")
+        self.assertEqual(len(second.get_json()), 20)
+        self.assertNotIn("X-Next-Cursor", second.headers)
+        ids = {r["id"] for r in first.get_json()} | {r["id"] for r in second.get_json()}
+        self.assertEqual(len(ids), 50)
+
+    # ✅ Test 4: bad cursor / unknown field → 400
+    def test_invalid_arguments(self):
+        self.assertEqual(self.client.get("/api/data/all?cursor=not-a-cursor").status_code, 400)
+        self.assertEqual(self.client.get("/api/history/rows?fields=secret").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
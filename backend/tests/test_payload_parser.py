@@ -0,0 +1,70 @@
+import unittest
+from datetime import datetime, timezone
+
+from backend import payload_parser
+
+
+class PayloadParserTestCase(unittest.TestCase):
+    def tearDown(self):
+        payload_parser.set_device_aliases(42, None)
+
+    # ---------------------------------------
+    # ✅ Test 1: bytes, aliases and case are handled on the fast path
+    # ---------------------------------------
+    def test_aliases_from_bytes(self):
+        data = payload_parser.parse(b'{"Temp": "24.5", "HUM": 51, "p": null}')
+        self.assertEqual(data, {"temperature": 24.5, "humidity": 51.0})  # missing ≠ 0.0
+
+    # ---------------------------------------
+    # ✅ Test 2: bare-key payloads and garbage still parse
+    # ---------------------------------------
+    def test_lenient_fallback(self):
+        self.assertEqual(payload_parser.parse("{t: 20, h: 40, press: 1000}")["pressure"], 1000.0)
+        self.assertEqual(payload_parser.parse(b"not json"), {})
+        self.assertEqual(payload_parser.parse(b"[1, 2]"), {})
+        self.assertNotIn("humidity", payload_parser.parse(b'{"h": "n/a"}'))
+
+    # ---------------------------------------
+    # ✅ Test 3: extra numeric channels are kept, non-numeric ones dropped
+    # ---------------------------------------
+    def test_extra_metrics(self):
+        data = payload_parser.parse(b'{"temperature": 20, "RSSI": -61, "ok": true, "fw": "1.2"}')
+        self.assertEqual(data["rssi"], -61.0)
+        self.assertNotIn("ok", data)
+        self.assertNotIn("fw", data)
+
+    # ---------------------------------------
+    # ✅ Test 4: per-device alias tables override the defaults for that device only
+    # ---------------------------------------
+    def test_device_aliases(self):
+        payload_parser.set_device_aliases(42, {"temperature": ["tc"], "voltage": ["v", "volt"]})
+        data = payload_parser.parse(b'{"tc": 30, "volt": 3.3, "temp": 99}', device_id=42)
+        self.assertEqual(data["temperature"], 30.0)
+        self.assertEqual(data["voltage"], 3.3)
+        self.assertEqual(data["temp"], 99.0)  # no longer an alias here → extra metric
+        self.assertEqual(payload_parser.parse(b'{"temp": 99}')["temperature"], 99.0)
+
+    # ---------------------------------------
+    # ✅ Test 5: dumps round-trips through loads
+    # ---------------------------------------
+    def test_dumps_round_trip(self):
+        data = {"temperature": 1.5, "humidity": 2.0, "pressure": 3.0}
+        self.assertEqual(payload_parser.loads(payload_parser.dumps(data)), data)
+
+    # ---------------------------------------
+    # ✅ Test 6: device timestamps come back beside the metrics, never as a channel
+    # ---------------------------------------
+    def test_device_timestamp(self):
+        data, ts = payload_parser.parse_message(b'{"temp": 21, "ts": 1735732800}')
+        self.assertEqual(data, {"temperature": 21.0})
+        self.assertEqual(ts, datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc))
+
+        self.assertEqual(payload_parser.parse_message(b'{"ts": 1735732800500}')[1].microsecond, 500000)
+        self.assertEqual(payload_parser.parse_message(b'{"time": "2025-01-01T12:00:00Z"}')[1],
+                         datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc))
+        self.assertIsNone(payload_parser.parse_message(b'{"timestamp": "soon"}')[1])
+        self.assertNotIn("ts", payload_parser.parse(b'{"temp": 21, "ts": 1735732800}'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from pytz import timezone
+from sqlalchemy import event
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History
+
+INDIA_TZ = timezone("Asia/Kolkata")
+
+
+class QueryCountTestCase(unittest.TestCase):
+    """Listing routes must issue a constant number of queries, however many rows they return."""
+
+    def setUp(self):
+        self.app = create_app()
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _seed(self, devices, readings):
+        with self.app.app_context():
+            now = datetime.now(INDIA_TZ).replace(tzinfo=None)
+            for n in range(devices):
+                device = Device(name=f"Count-{n}", host="localhost", status="offline")
+                db.session.add(device)
+                db.session.flush()
+                db.session.add_all([
+                    History(device_id=device.id, temperature=20.0 + i,
+                            humidity=50.0, pressure=1000.0, timestamp=now - timedelta(seconds=i))
+                    for i in range(readings)
+                ])
+            db.session.commit()
+
+    @contextmanager
+    def count_queries(self):
+        """Collect every statement sent to the engine inside the block."""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with self.app.app_context():
+            event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+            try:
+                yield statements
+            finally:
+                event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    def assertMaxQueries(self, limit, url):
+        with self.count_queries() as statements:
+            response = self.client.get(url)
+            response.get_data()
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(statements), limit,
+            f"{url} issued {len(statements)} queries:\n" + "\n".join(statements),
+        )
+        return response
+
+    # ✅ Test 1: /api/data/recent joins device names instead of one lookup per row
+    def test_recent_is_one_query(self):
+        self._seed(devices=5, readings=20)
+        response = self.assertMaxQueries(1, "/api/data/recent")
+        rows = response.get_json()
+        self.assertEqual(len(rows), 50)
+        self.assertTrue(all(r["device_name"].startswith("Count-") for r in rows))
+
+    # ✅ Test 2: /api/sensors stays at one query for the whole table
+    def test_sensor_listing_is_one_query(self):
+        self._seed(devices=10, readings=50)
+        response = self.assertMaxQueries(1, "/api/sensors")
+        rows = response.get_json()
+        self.assertEqual(len(rows), 500)
+        self.assertEqual({r["device_name"] for r in rows}, {f"Count-{n}" for n in range(10)})
+        self.assertNotIn("X-Next-Cursor", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
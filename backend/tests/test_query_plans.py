@@ -0,0 +1,109 @@
+import os
+import re
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import event
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History
+from backend import device_registry
+
+# "SCAN sensors" is a full table scan; "SCAN sensors USING [COVERING] INDEX ..." is fine
+FULL_SCAN = re.compile(r"\bSCAN (sensors|history|rollups)\b(?! USING)")
+
+
+class QueryPlanTestCase(unittest.TestCase):
+    def setUp(self):
+        """Create an in-memory app with a few readings per device."""
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            now = datetime.now()
+            for n in range(2):
+                device = Device(name=f"Plan-{n}", host="localhost", status="offline")
+                db.session.add(device)
+                db.session.flush()
+                for i in range(5):
+                    ts = now - timedelta(minutes=i)
+                    db.session.add(History(device_id=device.id, temperature=20.0, humidity=50.0, pressure=1000.0, timestamp=ts))
+            db.session.commit()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _capture(self, action):
+        """Run `action` and return every SELECT it sent to SQLite."""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append((statement, parameters))
+
+        with self.app.app_context():
+            event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+            try:
+                action()
+            finally:
+                event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        return statements
+
+    def _full_scans(self, statements):
+        scans = []
+        with self.app.app_context():
+            raw = db.engine.raw_connection()
+            try:
+                for statement, parameters in statements:
+                    for row in raw.execute(f"EXPLAIN QUERY PLAN {statement}", parameters):
+                        if FULL_SCAN.search(row[-1]):
+                            scans.append(f"{row[-1]} <- {statement}")
+            finally:
+                raw.close()
+        return scans
+
+    def _get(self, url):
+        response = self.client.get(url)
+        response.get_data()  # exports are streamed — consume the body so the query runs
+        self.assertEqual(response.status_code, 200)
+
+    def assertNoFullScan(self, action):
+        statements = self._capture(action)
+        self.assertTrue(statements, "no SELECT captured")
+        scans = self._full_scans(statements)
+        self.assertEqual(scans, [], "\n".join(scans))
+
+    # ---------------------------------------
+    # ✅ Time-series read routes use the indexes
+    # ---------------------------------------
+    def test_routes_use_timestamp_indexes(self):
+        today = datetime.now().strftime("%Y-%m-%d")
+        for url in (
+            "/api/data/recent",
+            "/api/data/history",
+            "/api/dashboard/chart",
+            "/api/dashboard/chart?range=1h&points=100",
+            "/api/dashboard/chart?range=24h",
+            "/api/history/",
+            f"/api/history/export/json?date={today}",
+            f"/api/history/export/csv?date={today}",
+            f"/api/history/export/csv?from={today}&to={today}&device_id=1",
+        ):
+            with self.subTest(url=url):
+                self.assertNoFullScan(lambda: self._get(url))
+
+    # ---------------------------------------
+    # ✅ Latest reading per device (registry seed behind /data/latest + dashboard_update)
+    # ---------------------------------------
+    def test_latest_per_device_uses_device_timestamp_index(self):
+        self.assertNoFullScan(device_registry.load_registry)
+
+
+if __name__ == "__main__":
+    unittest.main()
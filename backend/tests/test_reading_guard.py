@@ -0,0 +1,135 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History, Rollup
+from backend import ingest_service, device_registry, mqtt_service, reading_guard
+from backend.message_pipeline import Message
+from backend.utils.clock import aware, now
+
+
+class ReadingGuardTestCase(unittest.TestCase):
+    def setUp(self):
+        reading_guard.forget()
+        self.stats = dict(reading_guard.get_guard_stats())
+        self.received = aware(datetime(2025, 1, 1, 12, 0, 30))
+
+    def tearDown(self):
+        reading_guard.forget()
+
+    def _delta(self, key):
+        return reading_guard.get_guard_stats()[key] - self.stats[key]
+
+    # ---------------------------------------
+    # ✅ Test 1: the same device timestamp twice is a duplicate; other devices are separate
+    # ---------------------------------------
+    def test_duplicates_dropped(self):
+        ts = aware(datetime(2025, 1, 1, 12, 0, 0))
+        self.assertEqual(reading_guard.check(1, ts, self.received), (reading_guard.FRESH, ts))
+        self.assertEqual(reading_guard.check(1, ts, self.received)[0], reading_guard.DUPLICATE)
+        self.assertEqual(reading_guard.check(2, ts, self.received)[0], reading_guard.FRESH)
+        self.assertEqual(self._delta("duplicates"), 1)
+
+        # no device timestamp → the receive time is used and nothing is deduplicated
+        self.assertEqual(reading_guard.check(3, None, self.received), (reading_guard.FRESH, self.received))
+        self.assertEqual(reading_guard.check(3, None, self.received)[0], reading_guard.FRESH)
+
+    # ---------------------------------------
+    # ✅ Test 2: older-than-newest readings are late; the window evicts the oldest key
+    # ---------------------------------------
+    def test_late_and_window(self):
+        base = aware(datetime(2025, 1, 1, 11, 0, 0))
+        window = reading_guard.READING_DEDUPE_WINDOW
+        reading_guard.READING_DEDUPE_WINDOW = 3
+        try:
+            for i in (0, 10, 20, 30):
+                reading_guard.check(1, base + timedelta(seconds=i), self.received)
+            verdict, _ = reading_guard.check(1, base + timedelta(seconds=5), self.received)
+            self.assertEqual(verdict, reading_guard.LATE)
+            self.assertEqual(reading_guard.get_guard_stats()["last_late_ms"], 25000.0)
+            # t+0 fell out of the 3-key window: a redelivery of it is only "late" now
+            self.assertEqual(reading_guard.check(1, base, self.received)[0], reading_guard.LATE)
+        finally:
+            reading_guard.READING_DEDUPE_WINDOW = window
+        self.assertEqual(self._delta("late"), 2)
+
+    # ---------------------------------------
+    # ✅ Test 3: device clocks far ahead fall back to the receive time; ancient readings are refused
+    # ---------------------------------------
+    def test_clock_bounds(self):
+        ahead = self.received + timedelta(hours=1)
+        self.assertEqual(reading_guard.check(1, ahead, self.received), (reading_guard.FRESH, self.received))
+        self.assertEqual(self._delta("clock_skew"), 1)
+
+        ancient = self.received - timedelta(days=30)
+        self.assertEqual(reading_guard.check(1, ancient, self.received)[0], reading_guard.TOO_OLD)
+        self.assertEqual(self._delta("too_old"), 1)
+
+
+class GuardedIngestTestCase(unittest.TestCase):
+    def setUp(self):
+        """In-memory app and one device, messages fed straight to the pipeline worker stage."""
+        reading_guard.forget()
+        self.app = create_app()
+        with self.app.app_context():
+            db.create_all()
+            device = Device(name="Guard-1", host="localhost")
+            db.session.add(device)
+            db.session.commit()
+            self.device_id = device.id
+            device_registry.load_registry()
+        ingest_service._flask_app = self.app
+        mqtt_service._flask_app = self.app
+
+    def tearDown(self):
+        ingest_service.flush_pending()
+        reading_guard.forget()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _process(self, payload, received_at):
+        mqtt_service._process_message(Message(self.device_id, "Guard-1", payload, received_at))
+
+    # ---------------------------------------
+    # ✅ Test 4: a redelivered message is stored once, at the device's timestamp
+    # ---------------------------------------
+    def test_redelivery_stored_once(self):
+        received = now().replace(microsecond=0)
+        stamp = int(received.timestamp()) - 10
+        for _ in range(3):
+            self._process(b'{"temp": 21.5, "ts": %d}' % stamp, received)
+        ingest_service.flush_pending()
+
+        with self.app.app_context():
+            rows = History.query.all()
+            self.assertEqual(len(rows), 1)
+            self.assertEqual(rows[0].timestamp, (received - timedelta(seconds=10)).replace(tzinfo=None))
+
+    # ---------------------------------------
+    # ✅ Test 5: a late reading lands in its own rollup bucket and does not replace the live value
+    # ---------------------------------------
+    def test_late_reading_routed_to_its_bucket(self):
+        received = now().replace(second=30, microsecond=0)
+        now_stamp = int(received.timestamp())
+        self._process(b'{"temp": 30, "ts": %d}' % now_stamp, received)
+        self._process(b'{"temp": 10, "ts": %d}' % (now_stamp - 120), received)  # two minutes late
+        ingest_service.flush_pending()
+
+        self.assertEqual(device_registry.get(self.device_id).latest["temperature"], 30.0)
+        with self.app.app_context():
+            self.assertEqual(History.query.count(), 2)
+            late_bucket = (received - timedelta(minutes=2)).replace(second=0, tzinfo=None)
+            bucket = Rollup.query.filter_by(resolution="minute", bucket_start=late_bucket).one()
+            self.assertEqual((bucket.count, bucket.temperature_last), (1, 10.0))
+            fresh_bucket = received.replace(second=0, tzinfo=None)
+            bucket = Rollup.query.filter_by(resolution="minute", bucket_start=fresh_bucket).one()
+            self.assertEqual((bucket.count, bucket.temperature_last), (1, 30.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
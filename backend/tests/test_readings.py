@@ -0,0 +1,103 @@
+import os
+import unittest
+from datetime import timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, DeviceMetric, History, Reading
+from backend import ingest_service, device_registry, payload_parser, schema_registry, timeseries
+from backend.utils.clock import now, wall_clock
+
+
+class ReadingsTestCase(unittest.TestCase):
+    def setUp(self):
+        """One device; schema registry loaded empty."""
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            device = Device(name="Motor-1", host="localhost", status="online")
+            db.session.add(device)
+            db.session.commit()
+            self.device_id = device.id
+            device_registry.load_registry()
+            schema_registry.load_schemas()
+
+        ingest_service._flask_app = self.app
+        self.start = wall_clock(now()).replace(microsecond=0) - timedelta(minutes=30)
+
+    def tearDown(self):
+        ingest_service.flush_pending()
+        schema_registry.forget_device(self.device_id)
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _ingest(self, raw, i):
+        data = schema_registry.apply(self.device_id, payload_parser.parse(raw, self.device_id))
+        ingest_service.enqueue_reading(
+            self.device_id, data.get("temperature"), data.get("humidity"), data.get("pressure"),
+            self.start + timedelta(seconds=i), metrics=data,
+        )
+
+    # ---------------------------------------
+    # ✅ Test 1: each value is stored once — core channels in history, new ones in readings
+    # ---------------------------------------
+    def test_unknown_channels_are_registered(self):
+        self._ingest(b'{"temp": 40.0, "vibration": 2.5, "current": 11.0}', 0)
+        ingest_service.flush_pending()
+
+        with self.app.app_context():
+            names = {m.name for m in DeviceMetric.query.filter_by(device_id=self.device_id)}
+            self.assertEqual(names, {"vibration", "current"})
+            self.assertEqual(Reading.query.count(), 2)
+            row = History.query.one()
+            self.assertEqual(row.temperature, 40.0)
+            self.assertIsNone(row.humidity)  # not sent → NULL, not 0.0
+
+            mixed = timeseries.query(span="1h", metrics=("temperature", "vibration"))
+            self.assertEqual(mixed.rows[0][2:], (40.0, 2.5))
+
+    # ---------------------------------------
+    # ✅ Test 2: schema scaling / aliases drive ingest, queries read any channel
+    # ---------------------------------------
+    def test_schema_scaling_and_query(self):
+        with self.app.app_context():
+            schema_registry.set_schema(self.device_id, [
+                {"name": "vibration", "unit": "mm/s", "scale": 0.1, "aliases": ["vib"]},
+                {"name": "running", "type": "bool"},
+            ])
+        for i in range(10):
+            self._ingest(b'{"vib": %d, "running": %d}' % (10 * i, i % 2), i)
+        ingest_service.flush_pending()
+
+        with self.app.app_context():
+            series = timeseries.query(span="1h", devices=self.device_id, metrics=("vibration", "running"))
+            self.assertEqual(series.source, "readings")
+            self.assertEqual(History.query.count(), 0)  # no core channel → no history row
+            self.assertEqual([r[2] for r in series.rows], [float(i) for i in range(10)])
+            self.assertEqual([r[3] for r in series.rows][:2], [0.0, 1.0])
+
+            hourly = timeseries.query(span="1h", bucket="hour", agg="max", metrics=("vibration",))
+            self.assertEqual(max(r[2] for r in hourly.rows), 9.0)
+
+        response = self.client.get(f"/api/devices/{self.device_id}/schema")
+        self.assertEqual({m["name"]: m["unit"] for m in response.get_json()}["vibration"], "mm/s")
+        response = self.client.get(f"/api/data/series?metrics=vibration&range=1h&device_id={self.device_id}")
+        self.assertEqual(len(response.get_json()["data"]), 10)
+
+    # ---------------------------------------
+    # ✅ Test 3: invalid schema input → 400
+    # ---------------------------------------
+    def test_invalid_schema(self):
+        response = self.client.put(
+            f"/api/devices/{self.device_id}/schema", json={"metrics": [{"name": "x", "type": "complex"}]},
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
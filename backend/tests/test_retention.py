@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History, Rollup
+from backend import retention_service, archive_service
+
+
+class RetentionTestCase(unittest.TestCase):
+    def setUp(self):
+        """File-backed DB (so vacuum is measurable) with old and fresh rows."""
+        self.tmp = tempfile.mkdtemp()
+        self._env = os.environ.get("DATABASE_URL")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(self.tmp, 'retention.db')}"
+        self._archive_dir = archive_service.ARCHIVE_DIR
+        archive_service.ARCHIVE_DIR = os.path.join(self.tmp, "archive")
+        self._batch = retention_service.RETENTION_BATCH_SIZE
+        retention_service.RETENTION_BATCH_SIZE = 500
+
+        self.app = create_app()
+        self.now = datetime(2025, 6, 1, 12, 0, 0)
+
+        with self.app.app_context():
+            db.create_all()
+            device = Device(name="Retention-1", host="localhost")
+            db.session.add(device)
+            db.session.commit()
+            self.device_id = device.id
+
+            old, fresh = self.now - timedelta(days=40), self.now - timedelta(hours=1)
+            reading = {"device_id": device.id, "temperature": 1.0, "humidity": 2.0, "pressure": 3.0}
+            db.session.execute(History.__table__.insert(), [
+                {**reading, "timestamp": ts + timedelta(seconds=i)} for ts in (old, fresh) for i in range(2000)
+            ])
+            ancient = self.now - timedelta(days=100)
+            db.session.add(Rollup(device_id=device.id, resolution="minute", bucket_start=ancient))
+            db.session.add(Rollup(device_id=device.id, resolution="day", bucket_start=ancient))
+            db.session.commit()
+
+    def tearDown(self):
+        retention_service.RETENTION_BATCH_SIZE = self._batch
+        archive_service.ARCHIVE_DIR = self._archive_dir
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        if self._env is None:
+            del os.environ["DATABASE_URL"]
+        else:
+            os.environ["DATABASE_URL"] = self._env
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    # ---------------------------------------
+    # ✅ Test 1: Old rows go in batches, fresh rows and coarse rollups stay
+    # ---------------------------------------
+    def test_policies_delete_in_batches(self):
+        batches_before = retention_service.get_retention_stats()["batches"]
+        with self.app.app_context():
+            report = retention_service.apply_retention(self.now)
+
+            self.assertEqual(report["rows_removed"], {"history": 2000, "readings": 0, "rollups_minute": 1})
+            self.assertEqual(History.query.count(), 2000)
+            self.assertEqual(Rollup.query.filter_by(resolution="day").count(), 1)
+        # 2000 history rows at 500 per batch → 5 statements (last one empty), + readings + rollups_minute
+        self.assertEqual(retention_service.get_retention_stats()["batches"] - batches_before, 5 + 1 + 1)
+
+    # ---------------------------------------
+    # ✅ Test 2: Incremental vacuum hands pages back
+    # ---------------------------------------
+    def test_incremental_vacuum_reclaims_bytes(self):
+        with self.app.app_context():
+            self.assertEqual(db.session.execute(db.text("PRAGMA auto_vacuum")).scalar(), 2)
+            report = retention_service.apply_retention(self.now)
+        self.assertGreater(report["bytes_reclaimed"], 0)
+        self.assertEqual(report["free_bytes"], 0)
+
+    # ---------------------------------------
+    # ✅ Test 3: Archived history older than the window is dropped too
+    # ---------------------------------------
+    def test_archive_segments_pruned(self):
+        with self.app.app_context():
+            archive_service.compact_closed_days(self.now)
+            self.assertEqual(len(list(archive_service.iter_segments())), 1)
+            report = retention_service.apply_retention(self.now)
+        self.assertEqual(report["segments_removed"], 1)
+        self.assertEqual(list(archive_service.iter_segments()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device, History, Rollup
+from backend import ingest_service, device_registry, rollup_service
+from backend.utils.clock import now, wall_clock
+
+
+class RollupTestCase(unittest.TestCase):
+    def setUp(self):
+        """Create an in-memory app and one device."""
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            device = Device(name="Rollup-1", host="localhost", status="offline")
+            db.session.add(device)
+            db.session.commit()
+            self.device_id = device.id
+            device_registry.load_registry()
+
+        ingest_service._flask_app = self.app
+
+    def tearDown(self):
+        ingest_service.flush_pending()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _ingest(self, start, count):
+        for i in range(count):
+            ingest_service.enqueue_reading(
+                self.device_id, float(i), 50.0, None, start + timedelta(seconds=i),
+            )
+        ingest_service.flush_pending()
+
+    def _snapshot(self):
+        with self.app.app_context():
+            return sorted(
+                (r.resolution, r.bucket_start, r.count, r.temperature_min, r.temperature_max,
+                 r.temperature_sum, r.temperature_last, r.pressure_count)
+                for r in Rollup.query.all()
+            )
+
+    # ---------------------------------------
+    # ✅ Test 1: Batches merge into the same buckets
+    # ---------------------------------------
+    def test_ingest_batches_upsert_buckets(self):
+        start = datetime(2025, 1, 1, 12, 0, 0)
+        self._ingest(start, 90)                          # 12:00:00 … 12:01:29
+        self._ingest(start + timedelta(seconds=90), 30)  # 12:01:30 … 12:01:59 (values restart at 0)
+
+        with self.app.app_context():
+            minute = Rollup.query.filter_by(resolution="minute", bucket_start=start + timedelta(minutes=1)).one()
+            self.assertEqual(minute.count, 60)
+            self.assertEqual(minute.temperature_min, 0.0)
+            self.assertEqual(minute.temperature_max, 89.0)
+            self.assertEqual(minute.temperature_last, 29.0)
+            self.assertEqual(minute.pressure_count, 0)
+
+            hour = Rollup.query.filter_by(resolution="hour").one()
+            self.assertEqual(hour.count, 120)
+            self.assertAlmostEqual(hour.to_dict()["temperature"], (sum(range(90)) + sum(range(30))) / 120)
+            self.assertEqual(Rollup.query.filter_by(resolution="day").count(), 1)
+
+    # ---------------------------------------
+    # ✅ Test 2: Backfill rebuilds the same rollups from history
+    # ---------------------------------------
+    def test_backfill_matches_incremental(self):
+        start = datetime(2025, 1, 1, 12, 0, 0)
+        self._ingest(start, 150)
+        incremental = self._snapshot()
+
+        with self.app.app_context():
+            self.assertEqual(rollup_service.backfill_rollups(), History.query.count())
+        self.assertEqual(self._snapshot(), incremental)
+
+    # ---------------------------------------
+    # ✅ Test 3: History endpoint reads hourly buckets for 7 days
+    # ---------------------------------------
+    def test_history_route_uses_rollups(self):
+        self._ingest(datetime(2025, 1, 1, 12, 0, 0), 10)
+        response = self.client.get("/api/history/?from=2024-12-26&to=2025-01-01")  # 7 days
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["resolution"], "hour")
+        self.assertEqual(list(response.json["data"]), ["2025-01-01"])
+        self.assertEqual(response.json["data"]["2025-01-01"][0]["count"], 10)
+
+        # the chart only takes ranges relative to now: ten readings inside one recent minute
+        self._ingest(wall_clock(now()).replace(second=0, microsecond=0) - timedelta(hours=3), 10)
+        response = self.client.get("/api/dashboard/chart?range=2d")  # beyond the raw span → minute rollups
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
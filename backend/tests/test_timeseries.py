@@ -0,0 +1,109 @@
+import os
+import unittest
+from datetime import timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.app import create_app
+from backend.extensions import db
+from backend.models import Device
+from backend import ingest_service, device_registry, timeseries
+from backend.utils.clock import now, wall_clock
+
+
+class TimeseriesTestCase(unittest.TestCase):
+    def setUp(self):
+        """One device with 3 hours of readings, one every 30 s, ending 1 minute ago."""
+        self.app = create_app()
+
+        with self.app.app_context():
+            db.create_all()
+            device = Device(name="Series-1", host="localhost", status="online")
+            db.session.add(device)
+            db.session.commit()
+            self.device_id = device.id
+
+        ingest_service._flask_app = self.app
+        self.end = wall_clock(now()).replace(second=0, microsecond=0) - timedelta(minutes=1)
+        start = self.end - timedelta(hours=3)
+        for i in range(360):
+            ingest_service.enqueue_reading(
+                self.device_id, float(i), 50.0, 1000.0, start + timedelta(seconds=30 * i),
+            )
+        ingest_service.flush_pending()
+        with self.app.app_context():
+            device_registry.load_registry()  # seeds the latest-value cache from the stored rows
+
+    def tearDown(self):
+        ingest_service.flush_pending()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    # ---------------------------------------
+    # ✅ Test 1: source selection — no range → cache, short span → raw, long span → rollups
+    # ---------------------------------------
+    def test_auto_source_selection(self):
+        with self.app.app_context():
+            latest = timeseries.query()
+            self.assertEqual(latest.source, "latest")
+            self.assertEqual(latest.rows[0][2], 359.0)
+
+            raw = timeseries.query(span="1h", devices=self.device_id)
+            self.assertEqual(raw.source, "raw")
+            self.assertEqual(raw.columns, ["device_id", "timestamp", "temperature", "humidity", "pressure"])
+
+            week = timeseries.query(span="7d")
+            self.assertEqual((week.source, week.resolution), ("rollup", "hour"))
+
+    # ---------------------------------------
+    # ✅ Test 2: bucket + aggregation read the matching rollup columns
+    # ---------------------------------------
+    def test_bucket_and_aggregation(self):
+        with self.app.app_context():
+            series = timeseries.query(span="4h", bucket="minute", metrics=("temperature",), agg="max")
+            self.assertEqual(series.columns, ["device_id", "timestamp", "temperature"])
+            self.assertEqual(len(series), 180)
+            self.assertEqual(series.rows[0][2], 1.0)  # readings 0 and 1 share the first minute
+
+            grouped = timeseries.query(span="4h", bucket="hour", agg="all").by_day()
+            record = next(iter(grouped.values()))[0]
+            self.assertEqual(record["resolution"], "hour")
+            self.assertIn("temperature_min", record)
+
+    # ---------------------------------------
+    # ✅ Test 3: downsampling and argument checks
+    # ---------------------------------------
+    def test_downsample_and_validation(self):
+        with self.app.app_context():
+            series = timeseries.query(span="4h", points=50, method="minmax", by="temperature")
+            self.assertLessEqual(len(series), 50)
+            with self.assertRaises(ValueError):
+                timeseries.query(span="1h", method="cubic")
+            with self.assertRaises(ValueError):
+                timeseries.query(span="1h", metrics=("voltage",), source="raw")
+            with self.assertRaises(ValueError):
+                timeseries.query(span="1h", metrics=("temperature",), by="humidity")
+
+    # ---------------------------------------
+    # ✅ Test 4: latest-value ETags change with the newest reading and with every restart
+    # ---------------------------------------
+    def test_latest_etag(self):
+        client = self.app.test_client()
+        first = client.get("/api/dashboard/current")
+        etag = first.headers["ETag"]
+        self.assertIn(f"{self.device_id}.", etag)
+        self.assertEqual(client.get("/api/dashboard/current", headers={"If-None-Match": etag}).status_code, 304)
+
+        boot_id = device_registry._boot_id
+        device_registry._boot_id = "restarted"  # a fresh process: old tags must not match
+        try:
+            again = client.get("/api/dashboard/current", headers={"If-None-Match": etag})
+            self.assertEqual(again.status_code, 200)
+            self.assertNotEqual(again.headers["ETag"], etag)
+        finally:
+            device_registry._boot_id = boot_id
+
+
+if __name__ == "__main__":
+    unittest.main()
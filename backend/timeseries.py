@@ -0,0 +1,389 @@
+# =================================================================================================
+# Franc Automation - Time-series query engine (every read endpoint goes through here)
+# Handles:
+#   • One API: range, devices, metrics, aggregation, bucket size, output resolution
+#   • Source selection: latest-value cache (no SQL) → raw `history` rows (+ archived days)
+#     → rollup buckets;
+#     any other channel (vibration, current, …) from the narrow readings store
+#   • LIVE_WINDOW: the recent slice of `history` served by the Sensor-shaped listings
+#   • Timezone handling on the shared India clock (backend/utils/clock.py)
+#   • Per-device downsampling (LTTB / min-max) and by-day grouping of the result
+# =================================================================================================
+import heapq
+import os
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import func
+
+from backend.extensions import db
+from backend.models import Device, DeviceMetric, History, Reading, Rollup, ROLLUP_METRICS
+from backend import archive_service, device_registry
+from backend.rollup_service import RESOLUTIONS, ROLLUP_MAX_POINTS, bucket_start, pick_resolution
+from backend.utils.clock import INDIA_TZ, aware, now, parse_range, wall_clock
+from backend.utils.downsample import METHODS, downsample
+
+# ==========================================================
+# Globals / Config
+# ==========================================================
+SERIES_RAW_SPAN = timedelta(hours=float(os.environ.get("ROLLUP_RAW_RANGE_HOURS", 6)))
+SERIES_SOURCE_POINTS = int(os.environ.get("ROLLUP_SOURCE_POINTS", 20000))  # rows per device fed to the downsampler
+LIVE_WINDOW = parse_range(os.environ.get("LIVE_WINDOW", "24h"))  # what /api/sensors & /api/data/all list
+
+METRICS = ROLLUP_METRICS
+SOURCES = ("auto", "latest", "raw", "rollup", "readings")
+# avg/min/max/last/count read the matching rollup columns; "all" returns every one
+# of them (the keys of Rollup.to_dict). Raw and latest rows carry plain values.
+# Bucketed readings support avg/min/max/count (GROUP BY in SQLite).
+AGGREGATIONS = ("avg", "min", "max", "last", "count", "all")
+
+
+class Series:
+    """
+    Query result: `rows` are tuples shaped like `columns`, always starting with
+    (device_id, timestamp) — naive India wall-clock — oldest first unless asked otherwise.
+    """
+    __slots__ = ("source", "resolution", "columns", "rows")
+
+    def __init__(self, source, resolution, columns, rows):
+        self.source = source
+        self.resolution = resolution
+        self.columns = columns
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def records(self):
+        out = []
+        for row in self.rows:
+            record = dict(zip(self.columns, row))
+            ts = record["timestamp"]
+            record["timestamp"] = ts.isoformat() if ts else None
+            if self.resolution:
+                record["resolution"] = self.resolution
+            out.append(record)
+        return out
+
+    def by_day(self):
+        """{"YYYY-MM-DD": [records]} with the newest day and newest record first."""
+        grouped = {}
+        for row, record in zip(reversed(self.rows), reversed(self.records())):
+            grouped.setdefault(row[1].strftime("%Y-%m-%d"), []).append(record)
+        return grouped
+
+
+# ==========================================================
+# Column selection
+# ==========================================================
+def _rollup_columns(metrics, agg):
+    names, cols = ["device_id", "timestamp"], [Rollup.device_id, Rollup.bucket_start]
+    if agg == "all":
+        names.append("count")
+        cols.append(Rollup.count)
+    for m in metrics:
+        average = getattr(Rollup, f"{m}_sum") / func.nullif(getattr(Rollup, f"{m}_count"), 0)
+        if agg in ("avg", "all"):
+            names.append(m)
+            cols.append(average)
+        if agg == "all":
+            for part in ("min", "max", "last"):
+                names.append(f"{m}_{part}")
+                cols.append(getattr(Rollup, f"{m}_{part}"))
+        elif agg != "avg":
+            names.append(m)
+            cols.append(getattr(Rollup, f"{m}_{agg}"))
+    return names, cols
+
+
+_BUCKET_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+_READING_AGGREGATES = {"avg": func.avg, "min": func.min, "max": func.max, "count": func.count}
+
+
+def _check(source, metrics, agg, method, by):
+    if source not in SOURCES:
+        raise ValueError(f"source must be one of {SOURCES}")
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"agg must be one of {AGGREGATIONS}")
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    if not metrics or any(not isinstance(m, str) or not m for m in metrics):
+        raise ValueError("metrics must be non-empty names")
+    if by is not None and by not in metrics:
+        raise ValueError("`by` must be one of the requested metrics")
+    if source in ("raw", "rollup") and any(m not in METRICS for m in metrics):
+        raise ValueError(f"{source} reads only serve {METRICS}; other channels come from readings")
+
+
+# ==========================================================
+# Sources
+# ==========================================================
+def _from_cache(devices, metrics):
+    if devices:
+        states = [s for s in (device_registry.get(d) for d in devices) if s is not None]
+    else:
+        states = device_registry.all_states()
+    rows = [
+        (s.id, wall_clock(s.latest_ts), *(s.latest.get(m) for m in metrics))
+        for s in states if s.latest is not None
+    ]
+    rows.sort(key=lambda r: r[1])
+    return Series("latest", None, ["device_id", "timestamp", *metrics], rows)
+
+
+def _from_raw(start, end, devices, metrics, limit, newest_first, with_names):
+    names = ["device_id", "timestamp", *metrics]
+    cols = [History.device_id, History.timestamp, *(getattr(History, m) for m in metrics)]
+    query = db.session.query(*cols)
+    if with_names:
+        names.append("device_name")
+        query = query.add_columns(Device.name).outerjoin(Device, Device.id == History.device_id)
+    if start is not None:
+        query = query.filter(History.timestamp >= start)
+    if end is not None:
+        query = query.filter(History.timestamp < end)
+    if devices:
+        query = query.filter(History.device_id.in_(devices))
+    query = query.order_by(History.timestamp.desc() if newest_first else History.timestamp)
+    if limit:
+        query = query.limit(limit)
+    rows = _merge_archived([tuple(r) for r in query.all()], start, end, devices, metrics, limit, newest_first, with_names)
+    return Series("raw", None, names, rows)
+
+
+_ARCHIVE_POSITIONS = {"device_id": 1, "temperature": 2, "humidity": 3, "pressure": 4, "timestamp": 5}  # iter_rows
+
+
+def _merge_archived(rows, start, end, devices, metrics, limit, newest_first, with_names):
+    """Raw rows with the archived days (compacted out of `history`) merged in, same order."""
+    if limit and len(rows) >= limit:  # a full page: only cold rows ahead of its last row can make it in
+        edge = rows[-1][1]
+        if newest_first:
+            start = edge if start is None else max(start, edge)
+        else:
+            end = edge + timedelta(microseconds=1) if end is None else min(end, edge + timedelta(microseconds=1))
+    cold = archive_service.iter_rows(start, end, devices or None, descending=newest_first)
+    if limit:
+        cold = islice(cold, limit)
+    picks = [_ARCHIVE_POSITIONS[c] for c in ("device_id", "timestamp", *metrics)]
+    cold = [tuple(r[i] for i in picks) for r in cold]
+    if not cold:
+        return rows
+    if with_names:
+        ids = {r[0] for r in cold}
+        names = dict(db.session.query(Device.id, Device.name).filter(Device.id.in_(ids)).all())
+        cold = [(*r, names.get(r[0])) for r in cold]
+    merged = list(heapq.merge(rows, cold, key=lambda r: r[1], reverse=newest_first))
+    return merged[:limit] if limit else merged
+
+
+def _from_rollups(start, end, resolution, devices, metrics, agg):
+    names, cols = _rollup_columns(metrics, agg)
+    query = db.session.query(*cols).filter(
+        Rollup.resolution == resolution,
+        Rollup.bucket_start >= bucket_start(start, resolution),
+        Rollup.bucket_start < end,
+    )
+    if devices:
+        query = query.filter(Rollup.device_id.in_(devices))
+    rows = [tuple(r) for r in query.order_by(Rollup.bucket_start).all()]
+    return Series("rollup", resolution, names, rows)
+
+
+def _narrow_rows(start, end, devices, metrics, bucket, agg, limit, newest_first):
+    """(device_id, ts, metric, value) for extra channels from the narrow readings table."""
+    query_cols = [Reading.device_id]
+    if bucket:
+        ts_col = func.strftime(_BUCKET_FORMATS[bucket], Reading.timestamp)
+        query_cols += [ts_col, DeviceMetric.name, _READING_AGGREGATES[agg](Reading.value)]
+    else:
+        ts_col = Reading.timestamp
+        query_cols += [ts_col, DeviceMetric.name, Reading.value]
+
+    query = db.session.query(*query_cols).join(DeviceMetric, DeviceMetric.id == Reading.metric_id)
+    query = query.filter(DeviceMetric.name.in_(metrics))
+    if start is not None:
+        query = query.filter(Reading.timestamp >= start)
+    if end is not None:
+        query = query.filter(Reading.timestamp < end)
+    if devices:
+        query = query.filter(Reading.device_id.in_(devices))
+    if bucket:
+        query = query.group_by(Reading.device_id, ts_col, DeviceMetric.name)
+    query = query.order_by(ts_col.desc() if newest_first else ts_col)
+    if limit:
+        query = query.limit(limit * len(metrics))
+    return query.all()
+
+
+def _wide_rows(start, end, devices, metrics, bucket, agg, limit, newest_first):
+    """Same shape for core channels, read from the canonical history columns."""
+    if bucket:
+        ts_col = func.strftime(_BUCKET_FORMATS[bucket], History.timestamp)
+        values = [_READING_AGGREGATES[agg](getattr(History, m)) for m in metrics]
+    else:
+        ts_col = History.timestamp
+        values = [getattr(History, m) for m in metrics]
+
+    query = db.session.query(History.device_id, ts_col, *values)
+    if start is not None:
+        query = query.filter(History.timestamp >= start)
+    if end is not None:
+        query = query.filter(History.timestamp < end)
+    if devices:
+        query = query.filter(History.device_id.in_(devices))
+    if bucket:
+        query = query.group_by(History.device_id, ts_col)
+    query = query.order_by(ts_col.desc() if newest_first else ts_col)
+    if limit:
+        query = query.limit(limit)
+    return [(row[0], row[1], m, v) for row in query.all() for m, v in zip(metrics, row[2:])]
+
+
+def _from_readings(start, end, devices, metrics, bucket, agg, limit, newest_first):
+    """
+    Narrow (device, metric, ts, value) rows pivoted back to (device_id, timestamp, *metrics).
+    Core channels requested alongside extra ones come from history. With a bucket,
+    SQLite groups per (device, metric, bucket) using `agg`.
+    """
+    if bucket:
+        if agg not in _READING_AGGREGATES:
+            raise ValueError(f"bucketed readings support agg in {tuple(_READING_AGGREGATES)}")
+        if start is not None:
+            start = bucket_start(start, bucket)
+    core = [m for m in metrics if m in METRICS]
+    extra = [m for m in metrics if m not in METRICS]
+
+    found = []
+    if extra:
+        found += _narrow_rows(start, end, devices, extra, bucket, agg, limit, newest_first)
+    if core:
+        found += _wide_rows(start, end, devices, core, bucket, agg, limit, newest_first)
+
+    position = {m: i for i, m in enumerate(metrics)}
+    pivot = {}
+    for device_id, ts, name, value in found:
+        if bucket:
+            ts = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
+        row = pivot.get((device_id, ts))
+        if row is None:
+            row = pivot[(device_id, ts)] = [device_id, ts] + [None] * len(metrics)
+        row[2 + position[name]] = value
+
+    rows = sorted((tuple(r) for r in pivot.values()), key=lambda r: r[1], reverse=newest_first)
+    if limit:
+        rows = rows[:limit]
+    return Series("readings", bucket, ["device_id", "timestamp", *metrics], rows)
+
+
+# ==========================================================
+# Query
+# ==========================================================
+def query(span=None, start=None, end=None, devices=None, metrics=METRICS, agg="avg",
+          bucket=None, points=None, method="lttb", by=None, source="auto",
+          limit=None, newest_first=False, with_names=False):
+    """
+    Read a time series.
+
+      span / start / end   range; `span` ("24h", "7d" or a timedelta) counts back from `end`
+                           (default now). No range at all with source="auto" → latest cache.
+      devices              device id or iterable of ids (None = all)
+      metrics              channel names; anything outside METRICS is read from readings
+      agg, bucket          rollup aggregation and bucket size ("minute" | "hour" | "day")
+      points, method, by   downsample each device to `points` with lttb | minmax, selecting
+                           on metric `by` (default: first metric)
+      source               auto | latest | raw | rollup | readings
+      limit, newest_first, with_names   raw rows only (with_names adds Device.name)
+
+    source="auto" picks: non-core channels → readings (bucketed in SQL past SERIES_RAW_SPAN);
+    explicit bucket → rollups; span within SERIES_RAW_SPAN → raw rows;
+    longer spans → rollups at the finest resolution within ROLLUP_MAX_POINTS buckets per
+    device (SERIES_SOURCE_POINTS when downsampling, so the downsampler has detail to keep).
+    Raises ValueError on bad arguments.
+    """
+    metrics = tuple(metrics)
+    _check(source, metrics, agg, method, by)
+    if bucket is not None and bucket not in RESOLUTIONS:
+        raise ValueError(f"bucket must be one of {tuple(RESOLUTIONS)}")
+    if isinstance(devices, int):
+        devices = [devices]
+
+    if source == "auto" and span is None and start is None and not limit:
+        source = "latest"
+    if source == "latest":
+        return _from_cache(devices, metrics)
+
+    upper = wall_clock(end) if end is not None else None  # raw reads stay open-ended by default
+    end = upper or wall_clock(now())
+    if isinstance(span, str):
+        span = parse_range(span)
+    if start is None and span is not None:
+        start = end - span
+    start = wall_clock(start)
+
+    if source == "auto":
+        if any(m not in METRICS for m in metrics):
+            source = "readings"
+        elif bucket is None and (start is None or end - start <= SERIES_RAW_SPAN):
+            source = "raw"
+        else:
+            source = "rollup"
+
+    if source == "raw":
+        series = _from_raw(start, upper, devices, metrics, limit, newest_first, with_names)
+    elif source == "readings":
+        if bucket is None and start is not None and end - start > SERIES_RAW_SPAN:
+            bucket = pick_resolution(end - start, SERIES_SOURCE_POINTS if points else ROLLUP_MAX_POINTS)
+        series = _from_readings(start, upper, devices, metrics, bucket, agg, limit, newest_first)
+    else:
+        if start is None:
+            raise ValueError("rollup reads need a range")
+        resolution = bucket or pick_resolution(end - start, SERIES_SOURCE_POINTS if points else ROLLUP_MAX_POINTS)
+        series = _from_rollups(start, end, resolution, devices, metrics, agg)
+
+    if points:
+        _downsample(series, max(points, 2), method, by or metrics[0])
+    return series
+
+
+def _downsample(series, points, method, metric):
+    value_at = series.columns.index(metric)
+    per_device = {}
+    for row in series.rows:
+        per_device.setdefault(row[0], []).append(row)
+
+    selected = []
+    for rows in per_device.values():
+        selected.extend(downsample(rows, points, x=lambda r: r[1].timestamp(), y=lambda r: r[value_at], method=method))
+    selected.sort(key=lambda r: r[1])
+    series.rows = selected
+
+
+def latest_state(device_id=None):
+    """Latest-value cache entry (DeviceState) for one device, or the newest overall."""
+    if device_id is not None:
+        return device_registry.get(device_id)
+    return device_registry.latest_state()
+
+
+# ==========================================================
+# Exports
+# ==========================================================
+__all__ = [
+    "INDIA_TZ",
+    "METRICS",
+    "SOURCES",
+    "AGGREGATIONS",
+    "LIVE_WINDOW",
+    "Series",
+    "aware",
+    "now",
+    "wall_clock",
+    "parse_range",
+    "query",
+    "latest_state",
+]
@@ -20,15 +20,16 @@ def log_info(msg, **kwargs):
         pass
 
 
-def emit_event(event_name: str, payload: dict):
+def emit_event(event_name: str, payload: dict, room: str = None):
     """
     Emit over SocketIO if initialized; log regardless.
     Avoids 'NoneType' error when SocketIO is not ready.
+    With `room`, only sockets subscribed to that room receive it.
     """
     try:
         from backend.extensions import socketio  # import inside function
         if socketio:
-            socketio.emit(event_name, payload)
+            socketio.emit(event_name, payload, to=room)
             log_info(f"[SOCKETIO] EMIT {event_name}: {payload}")
         else:
             log_info(f"[SOCKETIO] Skipped emit {event_name}: socketio not initialized")
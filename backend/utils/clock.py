@@ -0,0 +1,45 @@
+# ==========================================================
+# backend/utils/clock.py — the one India clock every module shares
+# Timestamps in sensors / history / rollups are naive India wall-clock;
+# the ingest path and the latest-value cache use aware datetimes.
+# ==========================================================
+import re
+from datetime import datetime, timedelta
+
+from pytz import timezone
+
+INDIA_TZ = timezone("Asia/Kolkata")
+
+_RANGE_RE = re.compile(r"^(\d+)\s*([smhd]?)$")
+_RANGE_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def now():
+    """Aware 'now' on the India clock."""
+    return datetime.now(INDIA_TZ)
+
+
+def aware(dt):
+    """Aware India datetime; naive values are taken to be India wall-clock (as stored)."""
+    if isinstance(dt, datetime):
+        if dt.tzinfo is None:
+            return INDIA_TZ.localize(dt)
+        return dt.astimezone(INDIA_TZ)
+    return dt
+
+
+def wall_clock(dt):
+    """Naive India wall-clock datetime, comparable with stored timestamps."""
+    if isinstance(dt, datetime) and dt.tzinfo is not None:
+        return dt.astimezone(INDIA_TZ).replace(tzinfo=None)
+    return dt
+
+
+def parse_range(value, default=None):
+    """'90', '15m', '24h', '7d' → timedelta (default for empty / invalid input)."""
+    if not value:
+        return default
+    match = _RANGE_RE.match(str(value).strip().lower())
+    if not match:
+        return default
+    return timedelta(seconds=int(match.group(1)) * _RANGE_UNITS[match.group(2)])
@@ -1,55 +1,42 @@
 # ==========================================================
 # backend/utils/dashboard.py — Enhanced live dashboard emitter (India Time)
 # ==========================================================
-from backend.models import Sensor, Device
+from backend import device_registry, timeseries
 from backend.extensions import socketio
-from datetime import datetime
-from pytz import timezone
-
-# ✅ Indian timezone constant
-INDIA_TZ = timezone("Asia/Kolkata")
+from backend.emit_service import GLOBAL_ROOM, LEGACY_ROOM, device_room, has_members
+from backend.utils.clock import now
 
 
 def emit_dashboard_update(device_id=None):
     """
-    Emit real-time dashboard data to all connected clients.
-    If device_id is given, only that device’s latest data is used.
-    Otherwise, aggregates across all online devices.
-    The dashboard will correctly show 'offline' when no devices are active.
+    Emit a `dashboard_update` to the rooms that have members.
+    With device_id it carries that device's latest reading and goes to its device
+    room; without, it carries the newest reading of any online device and goes to
+    the global room. Unsubscribed (legacy) sockets receive it either way.
+    Status reads 'offline' when no devices are active.
     """
 
     # ----------------------------------------------------------
-    # Get device(s)
+    # Latest reading — from the latest-value cache, not SQL
     # ----------------------------------------------------------
     if device_id:
-        device = Device.query.get(device_id)
-        devices = [device] if device else []
+        devices = [device_id]
     else:
-        devices = Device.query.filter_by(status="online").all()
+        devices = [state.id for state in device_registry.online_states()]
 
-    # ----------------------------------------------------------
-    # Collect latest readings
-    # ----------------------------------------------------------
     temperature = None
     humidity = None
     pressure = None
 
-    for dev in devices:
-        latest_sensor = (
-            Sensor.query.filter_by(device_id=dev.id)
-            .order_by(Sensor.timestamp.desc())
-            .first()
-        )
-        if latest_sensor:
-            temperature = latest_sensor.temperature
-            humidity = latest_sensor.humidity
-            pressure = latest_sensor.pressure
-            break  # ✅ Use latest available reading
+    if devices:
+        series = timeseries.query(devices=devices, source="latest")
+        if series.rows:
+            _id, _ts, temperature, humidity, pressure = series.rows[-1]  # ✅ newest reading
 
     # ----------------------------------------------------------
     # Devices count
     # ----------------------------------------------------------
-    devices_online = Device.query.filter_by(status="online").count()
+    devices_online = device_registry.online_count()
 
     # ----------------------------------------------------------
     # Build payload
@@ -60,12 +47,14 @@ def emit_dashboard_update(device_id=None):
         "pressure": round(pressure, 1) if pressure is not None else None,
         "devices_online": devices_online,
         "status": "online" if devices_online > 0 else "offline",
-        "timestamp": datetime.now(INDIA_TZ).isoformat(),  # ✅ India local time
+        "timestamp": now().isoformat(),  # ✅ India local time
     }
 
     # ----------------------------------------------------------
     # Emit via Socket.IO
     # ----------------------------------------------------------
-    socketio.emit("dashboard_update", data)
+    for room in (LEGACY_ROOM, device_room(device_id) if device_id else GLOBAL_ROOM):
+        if has_members(room):
+            socketio.emit("dashboard_update", data, to=room)
     print(f"[DASHBOARD] 📤 Emitted dashboard_update: {data}")
 
@@ -0,0 +1,106 @@
+# ==========================================================
+# backend/utils/downsample.py — Shape-preserving downsampling (NumPy)
+#   lttb    Largest-Triangle-Three-Buckets: keeps the visually significant points
+#   minmax  per-bucket min + max: keeps every spike, fully vectorized
+# Both return INDICES into the input so callers keep their own row objects.
+# ==========================================================
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def _as_float(values):
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+def lttb_indices(x, y, n):
+    """
+    Indices of `n` points chosen by LTTB. First and last points are always kept;
+    each bucket in between keeps the point forming the largest triangle with the
+    previously kept point and the average of the next bucket.
+    """
+    size = len(x)
+    if n >= size or size <= 2:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1])
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n - 2 buckets between the fixed first and last point
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    # next-bucket averages, computed once for all buckets (last one is the final point)
+    next_lo = np.append(edges[1:-1], size - 1)
+    next_hi = np.append(edges[2:], size)
+    csum_x = np.concatenate(([0.0], np.cumsum(x)))
+    y_filled = np.where(np.isnan(y), 0.0, y)
+    csum_y = np.concatenate(([0.0], np.cumsum(y_filled)))
+    csum_n = np.concatenate(([0], np.cumsum(~np.isnan(y))))
+    counts = next_hi - next_lo
+    avg_x = (csum_x[next_hi] - csum_x[next_lo]) / counts
+    valid = csum_n[next_hi] - csum_n[next_lo]
+    avg_y = np.divide(
+        csum_y[next_hi] - csum_y[next_lo], valid,
+        out=np.full(len(valid), np.nan), where=valid > 0,
+    )
+
+    selected = np.empty(n, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - avg_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (avg_y[i] - y[a])
+        )
+        area = np.where(np.isnan(area), -1.0, area)
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, n):
+    """Indices of the min and max of each of n // 2 equal-count buckets, in input order."""
+    size = len(y)
+    if n >= size:
+        return np.arange(size)
+    buckets = max(n // 2, 1)
+
+    y = np.asarray(y, dtype=np.float64)
+    bucket_of = (np.arange(size) * buckets) // size
+    starts = np.searchsorted(bucket_of, np.arange(buckets))
+
+    lo = np.where(np.isnan(y), np.inf, y)
+    hi = np.where(np.isnan(y), -np.inf, y)
+    mins = np.minimum.reduceat(lo, starts)
+    maxs = np.maximum.reduceat(hi, starts)
+
+    # first position in each bucket that equals the bucket's min / max
+    min_hits = np.flatnonzero(lo == mins[bucket_of])
+    max_hits = np.flatnonzero(hi == maxs[bucket_of])
+    _, first_min = np.unique(bucket_of[min_hits], return_index=True)
+    _, first_max = np.unique(bucket_of[max_hits], return_index=True)
+    return np.unique(np.concatenate((min_hits[first_min], max_hits[first_max])))
+
+
+def downsample_indices(x, y, n, method="lttb"):
+    x = _as_float(x)
+    y = _as_float(y)
+    if method == "minmax":
+        return minmax_indices(y, n)
+    return lttb_indices(x, y, n)
+
+
+def downsample(rows, n, x, y, method="lttb"):
+    """
+    Reduce `rows` (ordered by time) to at most ~n rows.
+    `x` / `y` are callables returning the time (seconds) and the value that drives selection.
+    """
+    if n is None or len(rows) <= n:
+        return rows
+    idx = downsample_indices([x(r) for r in rows], [y(r) for r in rows], n, method)
+    return [rows[i] for i in idx]
+
+
+__all__ = ["METHODS", "lttb_indices", "minmax_indices", "downsample_indices", "downsample"]
@@ -0,0 +1,19 @@
+# ==========================================================
+# backend/utils/http_cache.py — ETag / If-None-Match helpers for polled endpoints
+# ==========================================================
+from flask import request, make_response
+
+
+def not_modified(etag):
+    """Return a ready 304 response when the client already holds `etag`, else None."""
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    """Attach the ETag; `no-cache` makes browsers revalidate instead of reusing blindly."""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
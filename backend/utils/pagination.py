@@ -0,0 +1,174 @@
+# ==========================================================
+# backend/utils/pagination.py — keyset (timestamp, id) paging for listing endpoints
+# ==========================================================
+import base64
+import heapq
+import json
+from itertools import islice
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+from backend.extensions import db
+from backend.models import Device
+from backend.utils.clock import INDIA_TZ, now, wall_clock
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+class PageError(ValueError):
+    """Bad paging/filter arguments; routes turn it into a 400."""
+
+
+def parse_bound(value):
+    """'YYYY-MM-DD' or ISO datetime → (datetime, is_date_only)."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d"), True
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(INDIA_TZ).replace(tzinfo=None)  # stored as India wall-clock
+    return parsed, False
+
+
+def encode_cursor(ts, row_id):
+    raw = json.dumps([ts.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        ts, row_id = json.loads(raw)
+        return datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, TypeError):
+        raise PageError("Invalid cursor")
+
+
+def _fields(arg, columns, default):
+    if not arg:
+        return list(default)
+    fields = [f.strip() for f in arg.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in columns]
+    if unknown:
+        raise PageError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def keyset_page(model, columns, args, default_fields=None, default_limit=DEFAULT_LIMIT, window=None,
+                archive=None):
+    """
+    One page of `model` rows ordered by (timestamp, id), newest first unless ?order=asc.
+
+    `columns` maps output names to column expressions; "device_name" pulls Device.name
+    through an outer join. Query args: device_id, from, to (date or ISO datetime; a
+    date-only `to` includes that day), fields=a,b,c, limit, order, cursor.
+    `window` (timedelta) bounds the listing to that recent slice when ?from= is absent.
+    `archive(start, end, device_id, descending)` yields {column: value} dicts (with "id" and
+    "timestamp") from a cold tier in that order; they are merged into the page.
+    Returns (rows as dicts, next cursor or None). Each page is a single indexed range scan
+    — the cursor replaces OFFSET, so page 10 000 costs the same as page 1.
+    """
+    fields = _fields(args.get("fields"), columns, default_fields or columns)
+    limit = min(max(args.get("limit", default_limit, type=int) or default_limit, 1), MAX_LIMIT)
+    descending = args.get("order", "desc") != "asc"
+
+    ts_col, id_col = model.timestamp, model.id
+    query = db.session.query(id_col.label("_id"), ts_col.label("_ts"), *(columns[f] for f in fields))
+    if "device_name" in fields:
+        query = query.outerjoin(Device, Device.id == model.device_id)
+
+    device_id = args.get("device_id", type=int)
+    if device_id is not None:
+        query = query.filter(model.device_id == device_id)
+    start = end = None
+    try:
+        if args.get("from"):
+            start = parse_bound(args["from"])[0]
+        elif window:
+            start = wall_clock(now()) - window
+        if args.get("to"):
+            end, date_only = parse_bound(args["to"])
+            if date_only:
+                end += timedelta(days=1)
+    except ValueError:
+        raise PageError("Invalid from/to")
+    if start is not None:
+        query = query.filter(ts_col >= start)
+    if end is not None:
+        query = query.filter(ts_col < end)
+
+    cursor = args.get("cursor")
+    c_key = None
+    if cursor:
+        c_ts, c_id = decode_cursor(cursor)
+        c_key = (c_ts, c_id)
+        if descending:
+            query = query.filter(or_(ts_col < c_ts, and_(ts_col == c_ts, id_col < c_id)))
+        else:
+            query = query.filter(or_(ts_col > c_ts, and_(ts_col == c_ts, id_col > c_id)))
+
+    order = (ts_col.desc(), id_col.desc()) if descending else (ts_col.asc(), id_col.asc())
+    hot = query.filter(ts_col.isnot(None)).order_by(*order).limit(limit + 1).all()
+    rows = [(r._ts, r._id, dict(zip(fields, r[2:]))) for r in hot]
+    if archive is not None:
+        rows = _merge_archive(rows, archive, fields, limit, start, end, device_id, descending, c_key)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+
+    result = []
+    for _ts, _id, record in rows:
+        if isinstance(record.get("timestamp"), datetime):
+            record["timestamp"] = record["timestamp"].isoformat()
+        result.append(record)
+    return result, next_cursor
+
+
+def _earlier(a, b):
+    return b if a is None else min(a, b)
+
+
+def _later(a, b):
+    return b if a is None else max(a, b)
+
+
+def _merge_archive(rows, archive, fields, limit, start, end, device_id, descending, c_key):
+    """Merge up to limit + 1 cold rows past the cursor into the hot page, deduped on (ts, id)."""
+    step = timedelta(microseconds=1)
+    if len(rows) > limit:  # a full hot page: only cold rows ahead of its last row can make it in
+        if descending:
+            start = _later(start, rows[-1][0])
+        else:
+            end = _earlier(end, rows[-1][0] + step)
+    if c_key is not None:
+        if descending:
+            end = _earlier(end, c_key[0] + step)
+        else:
+            start = _later(start, c_key[0])
+
+    def keyed(records):
+        for record in records:
+            key = (record["timestamp"], record["id"])
+            if c_key is None or (key < c_key if descending else key > c_key):
+                yield key[0], key[1], {f: record[f] for f in fields}
+
+    cold = islice(keyed(archive(start, end, device_id, descending)), limit + 1)
+    merged, last = [], None
+    for row in heapq.merge(rows, cold, key=lambda r: r[:2], reverse=descending):
+        if row[:2] != last:  # a day caught between "segment written" and "rows deleted"
+            merged.append(row)
+            last = row[:2]
+        if len(merged) > limit:
+            break
+    return merged
+
+
+def with_next_cursor(response, next_cursor):
+    """List-shaped endpoints keep their JSON array body and carry the cursor in headers."""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
@@ -0,0 +1,99 @@
+# ==========================================================
+# backend/utils/sqlite_tuning.py — SQLite performance profile
+# Applied on EVERY pooled connection (engine "connect" event):
+#   journal_mode=WAL      readers no longer block on the ingest writer
+#   synchronous=NORMAL    no fsync per commit in WAL (durable at checkpoint)
+#   cache_size / mmap_size / temp_store=MEMORY / busy_timeout
+#   auto_vacuum=INCREMENTAL  lets retention hand freed pages back (new DBs, or after one VACUUM)
+# All values are overridable through env vars; SQLITE_TUNING=false disables it.
+# ==========================================================
+import os
+
+from sqlalchemy import event
+
+from backend.utils.audit import log_info
+
+SQLITE_TUNING = os.environ.get("SQLITE_TUNING", "true").lower() in ("1", "true", "yes")
+
+SQLITE_PRAGMAS = {
+    # must come first: only takes effect before the first table is created
+    "auto_vacuum": os.environ.get("SQLITE_AUTO_VACUUM", "INCREMENTAL"),
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # negative cache_size = KiB instead of pages
+    "cache_size": -int(os.environ.get("SQLITE_CACHE_SIZE_KB", 65536)),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 268435456)),  # bytes
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "temp_store": os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# what PRAGMA <name> reads back as, for the startup check
+_SYNCHRONOUS_LEVELS = {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}
+_TEMP_STORE_LEVELS = {"DEFAULT": 0, "FILE": 1, "MEMORY": 2}
+_AUTO_VACUUM_LEVELS = {"NONE": 0, "FULL": 1, "INCREMENTAL": 2}
+
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def install_sqlite_pragmas(engine):
+    """Register the pragma hook on a SQLite engine (no-op for other backends / when disabled)."""
+    if not SQLITE_TUNING or engine.dialect.name != "sqlite":
+        return False
+    if not event.contains(engine, "connect", _apply_pragmas):
+        event.listen(engine, "connect", _apply_pragmas)
+    return True
+
+
+def _expected(name, value):
+    if name == "synchronous":
+        return _SYNCHRONOUS_LEVELS.get(str(value).upper(), value)
+    if name == "temp_store":
+        return _TEMP_STORE_LEVELS.get(str(value).upper(), value)
+    if name == "auto_vacuum":
+        return _AUTO_VACUUM_LEVELS.get(str(value).upper(), value)
+    if name == "journal_mode":
+        return str(value).lower()
+    return value
+
+
+def read_sqlite_settings(engine):
+    """Pragmas actually in effect on a fresh pooled connection."""
+    if engine.dialect.name != "sqlite":
+        return {}
+    with engine.connect() as conn:
+        return {
+            name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in SQLITE_PRAGMAS
+        }
+
+
+def report_sqlite_settings(engine):
+    """Log the effective profile and any pragma SQLite refused (e.g. WAL on :memory:)."""
+    settings = read_sqlite_settings(engine)
+    if not settings:
+        return settings
+
+    mismatched = {
+        name: settings[name]
+        for name, value in SQLITE_PRAGMAS.items()
+        if SQLITE_TUNING and settings.get(name) != _expected(name, value)
+    }
+    log_info(f"[DB] 🗄️ SQLite profile in effect: {settings}")
+    if mismatched:
+        log_info(f"[DB] ⚠️ SQLite did not accept: {mismatched}")
+    return {**settings, "tuning_enabled": SQLITE_TUNING, "not_applied": sorted(mismatched)}
+
+
+__all__ = [
+    "SQLITE_PRAGMAS",
+    "install_sqlite_pragmas",
+    "read_sqlite_settings",
+    "report_sqlite_settings",
+]